@@ -0,0 +1,42 @@
+"""
+Benchmark specializing every feature of a large manifest.
+
+usage: python scripts/benchmark_context.py [sections] [options]
+
+Every option of every section is read through its feature config, the
+way formulas and fingerprints read them, and the total time is printed.
+"""
+from __future__ import print_function, unicode_literals
+import sys
+import time
+from io import StringIO
+
+from sprinter.manifest import Manifest
+
+
+def build_manifest(sections, options):
+    lines = ["[config]", "namespace = benchmark", "root = /tmp/benchmark", ""]
+    for s in range(sections):
+        lines.append("[feature%s]" % s)
+        lines.append("formula = sprinter.formula.command")
+        for o in range(options):
+            lines.append("option%s = %%(config:root)s/feature%s/%s" % (o, s, o))
+        lines.append("")
+    return Manifest(StringIO("\n".join(lines)))
+
+
+def main(sections=500, options=10):
+    start = time.time()
+    manifest = build_manifest(sections, options)
+    built = time.time()
+    for section in manifest.formula_sections():
+        feature_config = manifest.get_feature_config(section)
+        feature_config.to_dict()
+        feature_config.get('formula')
+    done = time.time()
+    print("%s sections of %s options: loaded in %.3fs, specialized in %.3fs"
+          % (sections, options, built - start, done - built))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
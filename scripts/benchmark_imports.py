@@ -0,0 +1,117 @@
+"""
+Benchmark the time each sprinter subcommand spends importing modules.
+
+usage: python scripts/benchmark_imports.py [scale] [--verbose]
+
+Every subcommand is run in a fresh interpreter with python -X importtime
+(python 3.7+), with HOME pointing at a temporary directory. The self
+time of every imported module, except the ones a bare interpreter
+imports on startup (site and its .pth files), is summed and compared to
+the budget of the subcommand multiplied by scale (1 by default), to
+allow for slower machines. The script exits with an error if a budget
+is exceeded. With --verbose, the slowest imports of each subcommand are
+printed.
+
+Before every run, the benchmark namespace is created again, with the
+fixture manifest as its installed manifest, and the namespace made by
+the install command is removed.
+"""
+from __future__ import print_function, unicode_literals
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# the import budget of each subcommand, in milliseconds. Importing
+# requests, pip or virtualenv on startup exceeds every one of them.
+BUDGETS = [
+    (['environments'], 60),
+    (['--help'], 60),
+    (['cache'], 120),
+    (['validate', '%(manifest)s'], 120),
+    (['plan', '%(manifest)s'], 120),
+    (['install', '%(manifest)s', '-n', 'fresh'], 120),
+    (['update', 'benchmark'], 120),
+    (['activate', 'benchmark'], 120),
+    (['deactivate', 'benchmark'], 120),
+    (['remove', 'benchmark'], 120),
+]
+
+MANIFEST = """
+[config]
+namespace = benchmark
+
+[sub]
+formula = sprinter.formula.command
+install = echo installed
+"""
+
+RUNS = 3  # each subcommand is run several times, and its fastest run is kept
+
+RUN = "import sys; from sprinter.install import main; sys.argv = ['sprinter'] + sys.argv[1:]; main()"
+
+
+def import_times(script, args, home):
+    """ Return a list of (self time in microseconds, module) of the modules imported by running script """
+    env = dict(os.environ, HOME=home)
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', script] + args,
+                               env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, stderr = process.communicate()
+    times = []
+    for line in stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, _, module = line[len('import time:'):].split('|')
+        times.append((int(self_time), module.strip()))
+    return times
+
+
+def prepare(home, manifest_path):
+    """ create the benchmark namespace from the fixture manifest, and remove the fresh namespace """
+    root = os.path.join(home, '.sprinter')
+    for namespace in ('benchmark', 'fresh'):
+        if os.path.exists(os.path.join(root, namespace)):
+            shutil.rmtree(os.path.join(root, namespace))
+    os.makedirs(os.path.join(root, 'benchmark'))
+    with open(os.path.join(root, 'benchmark', 'manifest.cfg'), 'w+') as fh:
+        fh.write(MANIFEST.replace("namespace = benchmark\n",
+                                  "namespace = benchmark\nsource = %s\n" % manifest_path))
+
+
+def main(scale=1.0, verbose=False):
+    if sys.version_info < (3, 7):
+        sys.exit("python -X importtime requires python 3.7 or later!")
+    home = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(home, '.sprinter', '.global'))
+        manifest_path = os.path.join(home, 'manifest.cfg')
+        with open(manifest_path, 'w+') as fh:
+            fh.write(MANIFEST)
+        startup = set(module for _, module in import_times('pass', [], home))
+        failed = False
+        for args, budget in BUDGETS:
+            args = [arg % {'manifest': manifest_path} for arg in args]
+            runs = []
+            for _ in range(RUNS):
+                prepare(home, manifest_path)
+                times = [(t, module) for t, module in import_times(RUN, args, home) if module not in startup]
+                runs.append((sum(t for t, _ in times) / 1000.0, times))
+            total, times = min(runs)
+            allowed = budget * scale
+            status = "ok" if total <= allowed else "OVER BUDGET"
+            failed = failed or total > allowed
+            print("sprinter %-24s %7.1fms of %7.1fms, %4d modules  %s"
+                  % (args[0], total, allowed, len(times), status))
+            if verbose:
+                for self_time, module in sorted(times, reverse=True)[:10]:
+                    print("    %7.1fms  %s" % (self_time / 1000.0, module))
+    finally:
+        shutil.rmtree(home)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    verbose = '--verbose' in sys.argv[1:]
+    main(*[float(arg) for arg in sys.argv[1:] if arg != '--verbose'], verbose=verbose)
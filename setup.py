@@ -14,7 +14,7 @@ setup(name='sprinter',
       url='http://toumorokoshi.github.io/sprinter',
       packages=['sprinter', 'sprinter.formula'],
       install_requires=[
-          'requests>=1.2.3',
+          'requests>=2.4.0',
           'pip>=1.3.1',
           'docopt>=0.6.1',
           'six>=1.4.1'
@@ -2,6 +2,7 @@
 dependencytree.py handles the dependency tree of sprinter formulas. It attempts to validate a dependency tree
 """
 from __future__ import unicode_literals
+from collections import deque
 
 
 class DependencyTreeException(Exception):
@@ -14,38 +15,117 @@ class DependencyTreeException(Exception):
 class DependencyTree(object):
     """
     DependencyTree takes a dictionary of nodes and their dependencies (also need to be included in the dependencies)
+
+    If the levels of the tree are already known (from a manifest snapshot), they can be passed, and
+    are not calculated again.
     """
 
     order = []  # a valid ordering of the dependency tree
+    levels = []  # groups of nodes, each only depending on nodes in previous groups
 
-    def __init__(self, node_dict):
-        self.order = self.__calculate_order(node_dict)
+    def __init__(self, node_dict, levels=None):
+        self.node_dict = dict((node, list(dependencies)) for node, dependencies in node_dict.items())
+        self.dependent_dict = self.__calculate_dependents(self.node_dict)
+        if levels is None:
+            levels = self.__calculate_levels(self.node_dict, self.dependent_dict)
+        self.levels = [list(level) for level in levels]
+        self.order = [node for level in self.levels for node in level]
 
-    def __calculate_order(self, node_dict):
-        """
-        Determine a valid ordering of the nodes in which a node is not called before all of it's dependencies.
+    def dependencies(self, node):
+        """ Return the nodes that node depends on """
+        return self.node_dict[node]
+
+    def dependents(self, node):
+        """ Return the nodes that depend on node """
+        return self.dependent_dict[node]
 
-        Raise an error if there is a cycle, or nodes are missing.
+    def __calculate_dependents(self, node_dict):
         """
-        if len(node_dict.keys()) != len(set(node_dict.keys())):
-            raise DependencyTreeException("Duplicate Keys Exist in node dictionary!")
-        valid_order = [node for node, dependencies in node_dict.items() if len(dependencies) == 0]
-        remaining_nodes = [node for node in node_dict.keys() if node not in valid_order]
-        while len(remaining_nodes) > 0:
-            node_added = False
-            for node in remaining_nodes:
-                dependencies = [d for d in node_dict[node] if d not in valid_order]
-                if len(dependencies) == 0:
-                    valid_order.append(node)
-                    remaining_nodes.remove(node)
-                    node_added = True
-            if not node_added:
-                # the tree must be invalid, as it was not possible to remove a node.
-                # it's hard to find all the errors, so just spit out the first one you can find.
-                invalid_node = remaining_nodes[0]
-                invalid_dependency = node_dict[invalid_node][0]
-                if invalid_dependency not in remaining_nodes:
-                    raise DependencyTreeException("The dependency list for %s is missing" % invalid_dependency)
+        Build the reverse lookup of dependencies. Raise an error if a
+        dependency is missing from the node dictionary.
+        """
+        dependent_dict = dict((node, []) for node in node_dict)
+        missing = []
+        for node, dependencies in node_dict.items():
+            for dependency in set(dependencies):
+                if dependency not in dependent_dict:
+                    missing.append(dependency)
                 else:
-                    raise DependencyTreeException("The dependency %s is cyclic or dependent on a cyclic dependency" % invalid_dependency)
-        return valid_order
+                    dependent_dict[dependency].append(node)
+        if missing:
+            raise DependencyTreeException("The dependency list for %s is missing"
+                                          % ", ".join(sorted(set(missing))))
+        return dependent_dict
+
+    def __calculate_levels(self, node_dict, dependent_dict):
+        """
+        Group the nodes with Kahn's algorithm: the first level holds the
+        nodes without dependencies, and every following level the nodes
+        whose dependencies are all in earlier levels.
+
+        Raise an error listing every cycle if the tree is not a DAG.
+        """
+        remaining = dict((node, len(set(dependencies))) for node, dependencies in node_dict.items())
+        level = [node for node in node_dict if remaining[node] == 0]
+        levels = []
+        visited = 0
+        while level:
+            levels.append(level)
+            visited += len(level)
+            next_level = []
+            for node in level:
+                for dependent in dependent_dict[node]:
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0:
+                        next_level.append(dependent)
+            level = next_level
+        if visited != len(node_dict):
+            cycles = self.__find_cycles(dict((node, node_dict[node]) for node in remaining
+                                              if remaining[node] > 0))
+            raise DependencyTreeException(
+                "The dependency tree contains the cycle(s): %s" %
+                "; ".join(" -> ".join(cycle + [cycle[0]]) for cycle in cycles))
+        return levels
+
+    def __find_cycles(self, node_dict):
+        """
+        Return the strongly connected components of the subgraph that
+        contain a cycle (Tarjan's algorithm, run iteratively). Nodes
+        that only depend on a cycle are not a part of it, and are
+        not returned.
+        """
+        index_dict, lowlink, on_stack = {}, {}, set()
+        stack, cycles = [], []
+        for root in node_dict:
+            if root in index_dict:
+                continue
+            work = deque([(root, 0)])
+            while work:
+                node, child_index = work.pop()
+                if child_index == 0:
+                    index_dict[node] = lowlink[node] = len(index_dict)
+                    stack.append(node)
+                    on_stack.add(node)
+                children = [d for d in node_dict[node] if d in node_dict]
+                if child_index < len(children):
+                    work.append((node, child_index + 1))
+                    child = children[child_index]
+                    if child not in index_dict:
+                        work.append((child, 0))
+                    elif child in on_stack:
+                        lowlink[node] = min(lowlink[node], index_dict[child])
+                    continue
+                if lowlink[node] == index_dict[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in node_dict[node]:
+                        cycles.append(list(reversed(component)))
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+        return cycles
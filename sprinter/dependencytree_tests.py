@@ -1,3 +1,7 @@
+import sys
+
+from nose import tools
+
 from sprinter.dependencytree import DependencyTree, DependencyTreeException
 
 LEGAL_TREE = {
@@ -20,6 +24,14 @@ CYCLIC_TREE = {
     'd': ['a']
 }
 
+LONG_CYCLIC_TREE = {
+    'a': ['b'],
+    'b': ['c'],
+    'c': ['d'],
+    'd': ['a'],
+    'e': ['a']
+}
+
 LEGAL_ORDER = []
 
 
@@ -52,3 +64,35 @@ class TestDependencyTree(object):
         except DependencyTreeException:
             return
         raise("Cyclic tree did not raise an error!")
+
+    def test_levels(self):
+        """ Levels should group nodes that only depend on previous levels """
+        dt = DependencyTree(LEGAL_TREE)
+        tools.eq_([sorted(level) for level in dt.levels], [['c', 'd', 'e'], ['b'], ['a']])
+        tools.eq_(dt.order, [node for level in dt.levels for node in level])
+
+    def test_dependents(self):
+        """ Dependents should return the reverse lookup of dependencies """
+        dt = DependencyTree(LEGAL_TREE)
+        tools.eq_(sorted(dt.dependents('d')), ['a', 'b'])
+        tools.eq_(dt.dependents('a'), [])
+        tools.eq_(sorted(dt.dependencies('a')), ['b', 'c', 'd'])
+
+    def test_cyclic_tree_reports_every_node(self):
+        """ The error for a cycle should list every node in it, and nothing else """
+        try:
+            DependencyTree(LONG_CYCLIC_TREE)
+        except DependencyTreeException:
+            message = str(sys.exc_info()[1])
+            cycle = message.split(":", 1)[1].strip().split(" -> ")
+            tools.eq_(sorted(set(cycle)), ['a', 'b', 'c', 'd'])
+            tools.eq_(cycle[0], cycle[-1])
+            return
+        raise Exception("Cyclic tree did not raise an error!")
+
+    def test_large_chain(self):
+        """ A long chain of dependencies should be ordered without skipping nodes """
+        chain = dict(("node%d" % i, ["node%d" % (i - 1)] if i else []) for i in range(5000))
+        dt = DependencyTree(chain)
+        tools.eq_(dt.order, ["node%d" % i for i in range(5000)])
+        tools.eq_(len(dt.levels), 5000)
@@ -6,10 +6,16 @@ packages to different locations.
 from __future__ import unicode_literals
 import logging
 import os
+import re
 import shutil
 import stat
+import threading
 
-from sprinter.templates import source_template
+from sprinter.structures import FeatureRecorder
+from sprinter.templates import lazy_rc_stub_template, lazy_rc_template, source_template
+
+INACTIVE_MARKER = ".inactive"  # present in the directory of a deactivated namespace
+COMMAND_REGEX = re.compile("^[A-Za-z_][A-Za-z0-9_-]*$")  # the commands a lazy rc can be loaded by
 
 
 class DirectoryException(Exception):
@@ -20,6 +26,11 @@ class Directory(object):
 
     root_dir = None  # path to the root directory
     manifest_path = None  # path to the manifest file
+    remote_manifest_path = None  # path to the cached copy of the manifest's source url
+    snapshot_path = None  # path to the compiled snapshot of the manifest file
+    fingerprint_path = None  # path to the fingerprints of the installed features
+    journal_path = None  # path to the progress journal of an install
+    inactive_path = None  # path to the marker of a deactivated namespace
     new = False  # determines if the directory is for a new environment or not
     rewrite_config = True  # if set to false, the existing rc and env files will be
                            # preserved, and will not be modifiable
@@ -37,8 +48,15 @@ class Directory(object):
         self.logger = logger
         self.new = not os.path.exists(self.root_dir)
         self.manifest_path = os.path.join(self.root_dir, "manifest.cfg")
+        self.remote_manifest_path = os.path.join(self.root_dir, "manifest.remote.json")
+        self.snapshot_path = os.path.join(self.root_dir, "manifest.snapshot.json")
+        self.fingerprint_path = os.path.join(self.root_dir, "fingerprints.json")
+        self.journal_path = os.path.join(self.root_dir, "journal")
+        self.inactive_path = os.path.join(self.root_dir, INACTIVE_MARKER)
         self.rewrite_config = rewrite_config
         self.shell_util_path = shell_util_path
+        self.recorder = FeatureRecorder()
+        self._lock = threading.Lock()
 
     def __del__(self):
         if self.rc_file:
@@ -109,13 +127,17 @@ class Directory(object):
     def clear_feature_symlinks(self, feature_name):
         """ Clear the symlinks for a feature in the symlinked path """
         self.logger.debug("Clearing feature symlinks for %s" % feature_name)
-        feature_path = self.install_directory(feature_name)
         for d in ('bin', 'lib'):
-            if os.path.exists(os.path.join(self.root_dir, d)):
-                for link in os.listdir(os.path.join(self.root_dir, d)):
-                    path = os.path.join(self.root_dir, d, link)
-                    if feature_path in os.path.realpath(path):
-                        getattr(self, 'remove_from_%s' % d)(link)
+            for link in self.feature_symlinks(feature_name, d):
+                getattr(self, 'remove_from_%s' % d)(link)
+
+    def feature_symlinks(self, feature_name, d='bin'):
+        """ Return the names of the symlinks to a feature in the d folder """
+        feature_path = self.install_directory(feature_name)
+        if not os.path.exists(os.path.join(self.root_dir, d)):
+            return []
+        return [link for link in sorted(os.listdir(os.path.join(self.root_dir, d)))
+                if feature_path in os.path.realpath(os.path.join(self.root_dir, d, link))]
         
     def install_directory(self, feature_name):
         """
@@ -129,19 +151,59 @@ class Directory(object):
         """
         if not self.rewrite_config:
             raise DirectoryException("Error! Directory was not intialized w/ rewrite_config.")
-        if not self.env_file:
-            self.env_path, self.env_file = self.__get_env_handle(self.root_dir)
-        self.env_file.write(content + '\n')
+        self.recorder.record('env', content)
+        if not self.recorder.buffering():
+            self.__write_env(content)
 
-    def add_to_rc(self, content):
+    def add_to_rc(self, content, lazy_commands=None):
         """
-        add content to the rc script.
+        add content to the rc script. If lazy_commands are given, the
+        content is only run on the first use of one of the commands.
         """
         if not self.rewrite_config:
             raise DirectoryException("Error! Directory was not intialized w/ rewrite_config.")
-        if not self.rc_file:
-            self.rc_path, self.rc_file = self.__get_rc_handle(self.root_dir)
-        self.rc_file.write(content + '\n')
+        if lazy_commands:
+            content = self.__lazy_rc(content, lazy_commands)
+        self.recorder.record('rc', content)
+        if not self.recorder.buffering():
+            self.__write_rc(content)
+
+    def flush(self):
+        """ write the content added to the env and rc scripts so far to disk """
+        with self._lock:
+            for fh in (self.env_file, self.rc_file):
+                if fh:
+                    fh.flush()
+
+    def set_active(self, active):
+        """ mark the namespace as active or deactivated """
+        if active and os.path.exists(self.inactive_path):
+            os.unlink(self.inactive_path)
+        elif not active and not os.path.exists(self.inactive_path):
+            open(self.inactive_path, "w+").close()
+
+    def record_feature(self, feature_name, buffer=False):
+        """
+        Record the env and rc content added from this thread as
+        belonging to feature_name. Pass None to stop recording. If
+        buffer is set, the content is only written by write_recorded.
+        """
+        if feature_name is None:
+            self.recorder.stop()
+        else:
+            self.recorder.start(feature_name, buffer=buffer)
+
+    def recorded_content(self, feature_name):
+        """ Return a dictionary of the env and rc content recorded for feature_name """
+        return self.recorder.get(feature_name)
+
+    def write_recorded(self, feature_name):
+        """ write the env and rc content recorded for feature_name """
+        content = self.recorded_content(feature_name)
+        for line in content.get('env', []):
+            self.__write_env(line)
+        for line in content.get('rc', []):
+            self.__write_rc(line)
 
     def __remove_path(self, path):
         """ Remove an object """
@@ -157,6 +219,31 @@ class Directory(object):
             self.logger.error("Unable to remove object at path %s" % path)
             raise DirectoryException("Unable to remove object at path %s" % path)
 
+    def __lazy_rc(self, content, commands):
+        """ return the stubs loading content on the first use of one of commands """
+        for command in commands:
+            if not COMMAND_REGEX.match(command):
+                raise DirectoryException("%s is not a valid command name to load an rc from!" % command)
+        loader = "__sprinter_load_%s" % commands[0].replace("-", "_")
+        return lazy_rc_template % {
+            'loader': loader,
+            'commands': " ".join(commands),
+            'content': content.rstrip("\n"),
+            'stubs': "\n".join(lazy_rc_stub_template % {'command': command, 'loader': loader}
+                             for command in commands)}
+
+    def __write_env(self, content):
+        with self._lock:
+            if not self.env_file:
+                self.env_path, self.env_file = self.__get_env_handle(self.root_dir)
+            self.env_file.write(content + '\n')
+
+    def __write_rc(self, content):
+        with self._lock:
+            if not self.rc_file:
+                self.rc_path, self.rc_file = self.__get_rc_handle(self.root_dir)
+            self.rc_file.write(content + '\n')
+
     def __get_env_handle(self, root_dir):
         """ get the filepath and filehandle to the .env file for the environment """
         env_path = os.path.join(root_dir, '.env')
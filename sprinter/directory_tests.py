@@ -4,6 +4,7 @@ Tests for directory class
 from __future__ import unicode_literals
 import os
 import shutil
+import subprocess
 import tempfile
 
 from nose import tools
@@ -168,6 +169,48 @@ class TestDirectory(object):
         assert open(rc_file_path).read().find(test_content) != -1,\
             "test content was not found!"
         
+    def test_add_to_rc_lazy(self):
+        """ A lazy rc should only be run on the first use of one of its commands """
+        self.directory.add_to_rc('echo loaded\ntool() { echo "tool $@"; }', lazy_commands=['tool', 'other-tool'])
+        rc_file_path = os.path.join(self.directory.root_dir, ".rc")
+        del(self.directory)
+        output = subprocess.check_output(["bash", "-c", ". %s; echo started; tool a; tool b" % rc_file_path])
+        tools.eq_(output.decode('utf-8'), "started\nloaded\ntool a\ntool b\n")
+
+    def test_write_recorded(self):
+        """ Buffered content should only be written by write_recorded, in the order it is called in """
+        for name in ('second', 'first'):
+            self.directory.record_feature(name, buffer=True)
+            self.directory.add_to_env("export %s=1" % name)
+            self.directory.add_to_rc("echo %s" % name)
+            self.directory.record_feature(None)
+        self.directory.add_to_env("export unbuffered=1")
+        self.directory.write_recorded('first')
+        self.directory.write_recorded('second')
+        tools.eq_(self.directory.recorded_content('first'), {'env': ["export first=1"], 'rc': ["echo first"]})
+        env_path = os.path.join(self.directory.root_dir, ".env")
+        rc_path = os.path.join(self.directory.root_dir, ".rc")
+        del(self.directory)
+        env = open(env_path).read()
+        assert env.index("unbuffered") < env.index("first") < env.index("second")
+        rc = open(rc_path).read()
+        assert rc.index("echo first") < rc.index("echo second")
+
+    @tools.raises(DirectoryException)
+    def test_add_to_rc_lazy_invalid_command(self):
+        """ A lazy rc should only be loaded by valid command names """
+        self.directory.add_to_rc("echo loaded", lazy_commands=['rm -rf'])
+
+    def test_feature_symlinks(self):
+        """ feature_symlinks should return the symlinks to the install directory of a feature """
+        install_directory = self.directory.install_directory('feature')
+        os.makedirs(install_directory)
+        with open(os.path.join(install_directory, 'tool'), 'w+') as fh:
+            fh.write('echo tool')
+        self.directory.symlink_to_bin('tool', os.path.join(install_directory, 'tool'))
+        tools.eq_(self.directory.feature_symlinks('feature'), ['tool'])
+        tools.eq_(self.directory.feature_symlinks('other'), [])
+
     @tools.raises(DirectoryException)
     def test_add_to_rc_norc_rewrite(self):
         """
@@ -0,0 +1,337 @@
+"""
+downloadcache.py caches downloaded files under the global sprinter
+root, so the same url is only downloaded once by every formula and
+namespace on a machine.
+
+Files are stored by the sha256 of their content, and an index maps
+each url to its file and the validators (ETag and Last-Modified) it
+was served with. A cached url is revalidated with a conditional
+request once per process, while a url with a known sha256 is not
+requested at all once its content is cached. The cache is kept under
+a maximum size by removing the least recently used files.
+"""
+from __future__ import unicode_literals
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from sprinter.core import LOGGER
+from sprinter import transport
+from sprinter.exceptions import SprinterException
+from sprinter.tracing import span
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 1024 * 1024  # uncached downloads larger than this are spooled to disk
+DEFAULT_MAX_SIZE = 2048 * 1024 * 1024  # 2 GB
+
+
+class DownloadCacheException(SprinterException):
+    """ Returned if a download failed or did not match its sha256 """
+
+
+class DownloadCache(object):
+    """
+    A cache of downloads in the directory at path. If path is None,
+    downloads are not cached.
+    """
+
+    path = None  # the cache directory
+    max_size = DEFAULT_MAX_SIZE  # the size in bytes the cache is pruned to
+
+    def __init__(self, path=None, max_size=DEFAULT_MAX_SIZE, logger=LOGGER):
+        self.path = path
+        self.max_size = max_size
+        self.logger = logger
+        self._fresh = set()  # the urls downloaded or revalidated by this process
+        self._lock = threading.RLock()
+
+    def open(self, url, sha256=None):
+        """
+        Return a binary file object with the content at url. If sha256
+        is set, the content must match it.
+        """
+        if self.path:
+            return io.open(self.fetch(url, sha256=sha256), 'rb')
+        # downloads that are not cached are only kept in memory if they are small
+        fh = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        with self.__download(url, _request(url), sha256=sha256) as reader:
+            shutil.copyfileobj(reader, fh, CHUNK_SIZE)
+        fh.seek(0)
+        return fh
+
+    def fetch(self, url, sha256=None):
+        """ Return the path to the cached content at url, downloading it if necessary """
+        if sha256 and os.path.exists(self.__blob_path(sha256)):
+            self.__touch(url, sha256)
+            return self.__blob_path(sha256)
+        path, response = self.__lookup(url)
+        if path and (not sha256 or os.path.basename(path) == sha256.lower()):
+            return path
+        with self.__download(url, response or _request(url), sha256=sha256) as reader:
+            pass
+        return reader.path
+
+    @contextmanager
+    def stream(self, url, sha256=None):
+        """
+        Yield a file object to read the content at url from, while it
+        is downloaded. Once the block exits, the rest of the content is
+        downloaded and added to the cache.
+
+        If sha256 is set, the content is downloaded and verified
+        before it is yielded, so nothing unverified is read.
+        """
+        if sha256:
+            with self.open(url, sha256=sha256) as fh:
+                yield fh
+            return
+        path, response = self.__lookup(url)
+        if path:
+            with io.open(path, 'rb') as fh:
+                yield fh
+            return
+        with self.__download(url, response) as reader:
+            yield reader
+
+    def __lookup(self, url):
+        """
+        Return the path to the cached content at url if it is still
+        valid, or the response to download it from.
+        """
+        if not self.path:
+            return None, _request(url)
+        import requests
+        entry = self.__read_index().get(url)
+        cached = entry is not None and os.path.exists(self.__blob_path(entry['sha256']))
+        if cached and url in self._fresh:
+            self.__touch(url, entry['sha256'])
+            return self.__blob_path(entry['sha256']), None
+        headers = {}
+        if cached:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            response = _request(url, headers)
+        except requests.exceptions.RequestException:
+            if not cached:
+                raise
+            self.logger.warn("Unable to reach %s! Using the cached copy..." % url)
+            self.__touch(url, entry['sha256'])
+            return self.__blob_path(entry['sha256']), None
+        if cached and response.status_code == 304:
+            response.close()
+            self._fresh.add(url)
+            self.__touch(url, entry['sha256'])
+            return self.__blob_path(entry['sha256']), None
+        return None, response
+
+    def entries(self):
+        """ Return a list of the cached urls and their entries, most recently used first """
+        index = self.__read_index()
+        return sorted(index.items(), key=lambda item: item[1]['accessed'], reverse=True)
+
+    def size(self):
+        """ Return the total size of the cached files """
+        return sum(os.path.getsize(self.__blob_path(sha256)) for sha256 in self.__blobs())
+
+    def prune(self, max_size=None, keep=None):
+        """
+        Remove the least recently used files until the cache is no
+        larger than max_size, as well as files without a url and urls
+        without a file.
+        """
+        if not self.path:
+            return
+        max_size = self.max_size if max_size is None else max_size
+        with self._lock:
+            index = self.__read_index()
+            blobs = self.__blobs()
+            for url in [url for url, entry in index.items() if entry['sha256'] not in blobs]:
+                del index[url]
+            accessed = dict((sha256, 0) for sha256 in blobs)
+            for entry in index.values():
+                accessed[entry['sha256']] = max(accessed[entry['sha256']], entry['accessed'])
+            total = sum(os.path.getsize(self.__blob_path(sha256)) for sha256 in blobs)
+            for sha256 in sorted(blobs, key=lambda s: accessed[s]):
+                if sha256 == keep or (total <= max_size and accessed[sha256]):
+                    continue
+                total -= os.path.getsize(self.__blob_path(sha256))
+                os.unlink(self.__blob_path(sha256))
+                for url in [url for url, entry in index.items() if entry['sha256'] == sha256]:
+                    del index[url]
+            self.__write_index(index)
+
+    def clear(self):
+        """ Remove every cached file """
+        if self.path and os.path.exists(self.path):
+            with self._lock:
+                shutil.rmtree(self.path)
+                self._fresh = set()
+
+    @contextmanager
+    def __download(self, url, response, sha256=None):
+        """
+        Yield a reader of the response. Once the block exits, the rest
+        of the response is read, verified against sha256 if it is set,
+        and added to the cache, with the path to it set on the reader.
+        """
+        try:
+            with span('download', category='http', url=url) as args:
+                if response.status_code >= 400:
+                    raise DownloadCacheException("Unable to download %s! Status code %s"
+                                                 % (url, response.status_code))
+                if not self.path:
+                    reader = _TeeReader(response)
+                    yield reader
+                    reader.drain()
+                    args['bytes'] = reader.size
+                    self.__verify(url, reader, sha256)
+                    return
+                blob_dir = os.path.join(self.path, 'blobs')
+                if not os.path.exists(blob_dir):
+                    os.makedirs(blob_dir)
+                fd, temp_path = tempfile.mkstemp(dir=blob_dir, suffix='.part')
+                try:
+                    with os.fdopen(fd, 'wb') as fh:
+                        reader = _TeeReader(response, fh)
+                        yield reader
+                        reader.drain()
+                    args['bytes'] = reader.size
+                    self.__verify(url, reader, sha256)
+                    os.rename(temp_path, self.__blob_path(reader.digest.hexdigest()))
+                except Exception:
+                    os.unlink(temp_path)
+                    raise
+        finally:
+            response.close()
+        digest = reader.digest.hexdigest()
+        with self._lock:
+            index = self.__read_index()
+            index[url] = {'sha256': digest,
+                          'size': reader.size,
+                          'etag': response.headers.get('ETag'),
+                          'last_modified': response.headers.get('Last-Modified'),
+                          'accessed': time.time()}
+            self.__write_index(index)
+            self._fresh.add(url)
+            self.prune(keep=digest)
+        reader.path = self.__blob_path(digest)
+
+    def __verify(self, url, reader, sha256):
+        """ Raise an exception if sha256 is set, and the content read does not match it """
+        if sha256 and reader.digest.hexdigest() != sha256.lower():
+            raise DownloadCacheException("The sha256 of %s is %s, but %s was expected!"
+                                         % (url, reader.digest.hexdigest(), sha256))
+
+    def __touch(self, url, sha256):
+        """ mark the url as recently used """
+        with self._lock:
+            index = self.__read_index()
+            entry = index.setdefault(url, {'sha256': sha256,
+                                           'size': os.path.getsize(self.__blob_path(sha256))})
+            entry['accessed'] = time.time()
+            self.__write_index(index)
+
+    def __blob_path(self, sha256):
+        return os.path.join(self.path, 'blobs', sha256.lower())
+
+    def __blobs(self):
+        blob_dir = os.path.join(self.path, 'blobs')
+        if not os.path.exists(blob_dir):
+            return []
+        return [f for f in os.listdir(blob_dir) if not f.endswith('.part')]
+
+    def __read_index(self):
+        index_path = os.path.join(self.path, 'index.json')
+        if not os.path.exists(index_path):
+            return {}
+        try:
+            with open(index_path) as fh:
+                return json.load(fh)
+        except ValueError:
+            return {}
+
+    def __write_index(self, index):
+        """ write the index to a temporary file first, so it is never partially written """
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        fd, temp_path = tempfile.mkstemp(dir=self.path, suffix='.json')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(index, fh, sort_keys=True)
+        os.rename(temp_path, os.path.join(self.path, 'index.json'))
+
+
+class _TeeReader(object):
+    """
+    A file object reading the content of a streamed response, which
+    hashes everything read, and copies it to fh if it is set.
+    """
+
+    path = None  # the path to the cached content, once it is added to the cache
+
+    def __init__(self, response, fh=None):
+        self.fh = fh
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self._chunks = response.iter_content(CHUNK_SIZE)
+        self._buffer = b""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            if self.fh:
+                self.fh.write(chunk)
+            self.digest.update(chunk)
+            self.size += len(chunk)
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def drain(self):
+        """ read the rest of the response """
+        while self.read(CHUNK_SIZE):
+            pass
+
+
+def _request(url, headers={}):
+    """ Perform a streaming get request with the shared transport """
+    return transport.request('get', url, headers=headers, stream=True)
+
+
+CACHE = DownloadCache()
+
+
+def configure(path, max_size=DEFAULT_MAX_SIZE):
+    """ Cache the downloads of every formula in the directory at path """
+    global CACHE
+    CACHE = DownloadCache(path, max_size=max_size)
+    return CACHE
+
+
+def open_url(url, sha256=None):
+    """ Return a binary file object with the content at url, from the download cache """
+    return CACHE.open(url, sha256=sha256)
+
+
+def prefetch(url, sha256=None):
+    """ Download the content at url into the download cache, if downloads are cached """
+    if CACHE.path:
+        CACHE.fetch(url, sha256=sha256)
+
+
+def stream_url(url, sha256=None):
+    """ Return a context manager reading the content at url while it is downloaded into the download cache """
+    return CACHE.stream(url, sha256=sha256)
@@ -0,0 +1,108 @@
+from __future__ import unicode_literals
+import hashlib
+import os
+import shutil
+import tempfile
+
+import httpretty
+from nose import tools
+
+from sprinter.downloadcache import DownloadCache, DownloadCacheException
+
+TEST_URI = "http://testme.com/test.tar.gz"
+TEST_CONTENT = b"test content"
+TEST_SHA256 = hashlib.sha256(TEST_CONTENT).hexdigest()
+
+
+class TestDownloadCache(object):
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = DownloadCache(self.temp_dir)
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _read(self, cache, url, sha256=None):
+        with cache.open(url, sha256=sha256) as fh:
+            return fh.read()
+
+    @httpretty.activate
+    def test_download_is_cached(self):
+        """ A url should only be downloaded once per process """
+        httpretty.register_uri(httpretty.GET, TEST_URI, body=TEST_CONTENT)
+        tools.eq_(self._read(self.cache, TEST_URI), TEST_CONTENT)
+        httpretty.register_uri(httpretty.GET, TEST_URI, body=b"changed")
+        tools.eq_(self._read(self.cache, TEST_URI), TEST_CONTENT)
+        assert os.path.exists(os.path.join(self.temp_dir, 'blobs', TEST_SHA256))
+
+    @httpretty.activate
+    def test_revalidate(self):
+        """ A new process should revalidate a cached url with its validators """
+        httpretty.register_uri(httpretty.GET, TEST_URI, body=TEST_CONTENT,
+                               adding_headers={'ETag': '"abc"'})
+        self._read(self.cache, TEST_URI)
+        httpretty.register_uri(httpretty.GET, TEST_URI, body=b"", status=304)
+        tools.eq_(self._read(DownloadCache(self.temp_dir), TEST_URI), TEST_CONTENT)
+        tools.eq_(httpretty.last_request().headers['If-None-Match'], '"abc"')
+
+    @httpretty.activate
+    def test_sha256_mismatch(self):
+        """ A download that does not match its sha256 should raise an exception, and not be cached """
+        httpretty.register_uri(httpretty.GET, TEST_URI, body=TEST_CONTENT)
+        tools.assert_raises(DownloadCacheException, self.cache.fetch, TEST_URI, sha256="0" * 64)
+        tools.eq_(self.cache.entries(), [])
+
+    @httpretty.activate
+    def test_sha256_is_not_requested(self):
+        """ A url with a cached sha256 should not be requested """
+        httpretty.register_uri(httpretty.GET, TEST_URI, body=TEST_CONTENT)
+        self._read(self.cache, TEST_URI)
+        httpretty.register_uri(httpretty.GET, "http://othertest.com/test.tar.gz", status=500)
+        tools.eq_(self._read(DownloadCache(self.temp_dir), "http://othertest.com/test.tar.gz",
+                             sha256=TEST_SHA256), TEST_CONTENT)
+
+    @httpretty.activate
+    def test_error_status(self):
+        """ An error status should raise an exception """
+        httpretty.register_uri(httpretty.GET, TEST_URI, body=b"not found", status=404)
+        tools.assert_raises(DownloadCacheException, self.cache.fetch, TEST_URI)
+
+    @httpretty.activate
+    def test_prune(self):
+        """ Pruning should remove the least recently used downloads first """
+        for i in range(3):
+            httpretty.register_uri(httpretty.GET, "http://testme.com/%s" % i, body=("content %s" % i).encode("utf-8"))
+            self.cache.fetch("http://testme.com/%s" % i)
+        self.cache.prune(max_size=len(b"content 0") * 2)
+        tools.eq_(sorted(url for url, entry in self.cache.entries()),
+                  ["http://testme.com/1", "http://testme.com/2"])
+
+    @httpretty.activate
+    def test_no_cache(self):
+        """ A cache without a path should still return the downloaded content """
+        httpretty.register_uri(httpretty.GET, TEST_URI, body=TEST_CONTENT)
+        tools.eq_(self._read(DownloadCache(), TEST_URI), TEST_CONTENT)
+
+    @httpretty.activate
+    def test_stream(self):
+        """ A streamed download should be cached completely, even if it is not read completely """
+        httpretty.register_uri(httpretty.GET, TEST_URI, body=TEST_CONTENT)
+        with self.cache.stream(TEST_URI) as fh:
+            tools.eq_(fh.read(4), TEST_CONTENT[:4])
+        tools.eq_(self.cache.entries()[0][1]['sha256'], TEST_SHA256)
+        with self.cache.stream(TEST_URI) as fh:
+            tools.eq_(fh.read(), TEST_CONTENT)
+
+    @httpretty.activate
+    def test_stream_failure(self):
+        """ A streamed download that fails should not be cached """
+        httpretty.register_uri(httpretty.GET, TEST_URI, body=TEST_CONTENT)
+        try:
+            with self.cache.stream(TEST_URI) as fh:
+                fh.read(4)
+                raise ValueError("extraction failed")
+        except ValueError:
+            pass
+        tools.eq_(self.cache.entries(), [])
+        tools.eq_(os.listdir(os.path.join(self.temp_dir, 'blobs')), [])
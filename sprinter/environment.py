@@ -1,8 +1,13 @@
 from __future__ import unicode_literals
+import filecmp
 import logging
 import os
+import shutil
 import sys
+import tempfile
+import threading
 import getpass
+import importlib
 from six import reraise
 from six.moves import configparser
 from io import StringIO
@@ -10,14 +15,21 @@ from functools import wraps
 from sprinter.core import PHASE
 import sprinter.brew as brew
 import sprinter.lib as lib
-from sprinter.formulabase import FormulaBase
+from sprinter import downloadcache, transport
+from sprinter.formulabase import NOOP_METHODS, FormulaBase, overrides
 from sprinter.directory import Directory
 from sprinter.exceptions import SprinterException
+from sprinter.fingerprint import FingerprintStore, fingerprint_feature, fingerprint_manifest
 from sprinter.injections import Injections
+from sprinter.journal import Journal
+from sprinter.loader import LOADER_ENV, LOADER_RC, write_loaders
 from sprinter.manifest import Manifest
+from sprinter.registry import REGISTRY_FILE, FormulaRegistry
+from sprinter.scheduler import FeatureScheduler
+from sprinter.snapshot import load_snapshot, write_snapshot
 from sprinter.system import System
-from sprinter.pippuppet import Pip, PipException
 from sprinter.templates import shell_utils_template, source_template, warning_template
+from sprinter.tracing import span, traced
 
 
 def warmup(f):
@@ -31,6 +43,13 @@ def warmup(f):
     return wrapped
 
 
+def _split_formula(formula):
+    """ Return the formula class and the url of a formula, e.g. myformula:http://... """
+    if ':' in formula:
+        return tuple(formula.split(":", 1))
+    return formula, None
+
+
 def install_required(f):
     """ Return an exception if the namespace is not already installed """
 
@@ -86,9 +105,12 @@ class Environment(object):
     # variables typically populated programatically
     warmed_up = False  # returns true if the environment is ready for environments
     shell_util_path = None  # the path to the shell utils file
+    loader_env_path = None  # the path to the global loader of the env scripts
+    loader_rc_path = None  # the path to the global loader of the rc scripts
     error_occured = False
     # A dictionary for class object instances. Exists Mainly for testability + injection
     formula_dict = {}
+    formula_registry = None  # resolves the formula classes not in the formula dict
     # a dictionary of the feature objects.
     # The key is a tuple of feature name and formula, while the value is an instance.
     _feature_dict = {}
@@ -98,18 +120,34 @@ class Environment(object):
     # The key is a tuple of feature name and formula, while the value is an instance.
     _error_dict = {}
     _errors = []  # list to keep all the errors
-    # a pip puppet used to install eggs and add it to the classpath
+    # a pip puppet used to install eggs, created on the first formula download
     _pip = None
     sandboxes = []  # a list of package managers to sandbox (brew)
     # specifies where to get the global sprinter root
     global_config = None  # configuration file, which defaults to loading from SPRINTER_ROOT/.global/config.cfg
     write_files = True  # write files to the filesystem.
     ignore_errors = False  # ignore errors in features
+    rollback = False  # remove a failed installation, instead of keeping it to resume
+    jobs = 1  # the number of features that can be synced at once
+    fetch_jobs = 4  # the number of features that can be fetched at once, ahead of their sync
+    download_cache = None  # the cache of the files downloaded by formulas
+    fingerprint_store = None  # the fingerprints of the installed features
+    # the fingerprints of the target features for this run, keyed like the feature dict
+    _fingerprints = {}
+    # the features whose sync is skipped, as they are unchanged or were synced by an
+    # interrupted install, and the env, rc, and injection content to add for them instead
+    _unchanged_features = {}
+    journal = None  # the progress journal of an install
+    _manifest_fingerprint = None  # the fingerprint of the target manifest, before specialization
+    _planning = False  # true while planning: nothing may be installed or written
+    _missing_formulas = {}  # formulas that would be downloaded, keyed by formula class
+    _failed_formulas = set()  # formulas that failed to download, which are not downloaded again
+    _fetches = {}  # the features being fetched, and an event set once each fetch is done
 
     def __init__(self, logger=None, logging_level=logging.INFO,
                  root=None, sprinter_namespace='sprinter',
                  global_config=None, write_files=True,
-                 ignore_errors=False):
+                 ignore_errors=False, jobs=1):
         self.system = System()
         if not logger:
             logger = self._build_logger(level=logging_level)
@@ -117,56 +155,114 @@ class Environment(object):
         self.sprinter_namespace = sprinter_namespace
         self.root = root or os.path.expanduser(os.path.join("~", ".%s" % sprinter_namespace))
         self.global_path = os.path.join(self.root, ".global")
-        self._pip = Pip(self.global_path)
+        # eggs downloaded by earlier runs are importable without loading pip
+        egg_path = os.path.join(self.global_path, "lib", "python")
+        if egg_path not in sys.path:
+            sys.path.append(egg_path)
         if logging_level == logging.DEBUG:
             self.logger.info("Starting in debug mode...")
         self.formula_dict = {}
+        self.formula_registry = FormulaRegistry(os.path.join(self.global_path, REGISTRY_FILE)
+                                                if write_files else None)
         self.shell_util_path = os.path.join(self.global_path, "utils.sh")
+        self.loader_env_path = os.path.join(self.global_path, LOADER_ENV)
+        self.loader_rc_path = os.path.join(self.global_path, LOADER_RC)
         self.load_global_config(global_config)
+        transport.configure(**self._transport_options())
+        if write_files:
+            self.download_cache = downloadcache.configure(os.path.join(self.global_path, "cache"),
+                                                          max_size=self._cache_max_size())
         self.write_files = write_files
         self.ignore_errors = ignore_errors
-        
+        self.jobs = jobs
+        self._fingerprints = {}
+        self._unchanged_features = {}
+        self._missing_formulas = {}
+        self._failed_formulas = set()
+        self._fetches = {}
+
     @warmup
-    def install(self):
-        """ Install the environment """
+    def install(self, resume=False):
+        """
+        Install the environment. If resume is set, and a previous
+        install did not complete, the features it synced are not
+        synced again.
+        """
         self.phase = PHASE.INSTALL
         if not self.directory.new:
+            self.journal = self._load_journal()
+            if self.journal.incomplete:
+                if resume:
+                    return self._install(resume=True)
+                # updating a partial install would leave its journal unfinished
+                raise SprinterException("A previous installation of %s did not complete! " % self.namespace +
+                                        "Run sprinter install with --resume to continue the installation, " +
+                                        "or sprinter remove %s to remove it." % self.namespace)
             self.logger.info("Namespace %s already exists!" % self.namespace)
+            self.journal = None
             self.source = Manifest(self.directory.manifest_path)
             return self.update()
+        return self._install()
+
+    def _install(self, resume=False):
         try:
-            self.logger.info("Installing environment %s..." % self.namespace)
+            if resume:
+                self.logger.info("Resuming installation of environment %s..." % self.namespace)
+            else:
+                self.logger.info("Installing environment %s..." % self.namespace)
             self.directory.initialize()
+            self.journal = self.journal if resume else self._load_journal()
+            if not resume:
+                self.journal.start()
+            self.fingerprint_store = self._load_fingerprints()
+            self._manifest_fingerprint = fingerprint_manifest(self.target)
             self.install_sandboxes()
             self.instantiate_features()
             self._specialize()
-            for feature in self._feature_dict_order:
-                self._run_action(feature, 'sync')
+            self._fingerprint_features()
+            self._resume_features()
+            self._sync_features()
             self.inject_environment_config()
             self._finalize()
+            self.journal.finish()
         except Exception:
             self.logger.debug("", exc_info=sys.exc_info())
             self.logger.info("An error occured during installation!")
             if not self.ignore_errors:
-                self.clear_all()
-                self.logger.info("Removing installation %s..." % self.namespace)
-                self.directory.remove()
+                if self.rollback:
+                    self.clear_all()
+                    self.logger.info("Removing installation %s..." % self.namespace)
+                    self.directory.remove()
+                else:
+                    self.logger.info("Run sprinter install with --resume to continue the installation, " +
+                                     "or with --rollback to remove it.")
                 et, ei, tb = sys.exc_info()
                 reraise(et, ei, tb)
-        
+
     @warmup
     @install_required
-    def update(self, reconfigure=False):
-        """ update the environment """
+    def update(self, reconfigure=False, force=False):
+        """
+        update the environment. Features whose fingerprint is unchanged
+        are not synced, unless reconfigure or force is set.
+        """
         try:
             self.phase = PHASE.UPDATE
             self.logger.info("Updating environment %s..." % self.namespace)
+            skip_unchanged = not (reconfigure or force)
+            self.fingerprint_store = self._load_fingerprints()
+            self._manifest_fingerprint = fingerprint_manifest(self.target)
+            if skip_unchanged and self._manifest_fingerprint == self.fingerprint_store.manifest_fingerprint:
+                if self.target.not_modified:
+                    self.logger.debug("The manifest at %s is unchanged." % self.target.source())
+                self.logger.info("Environment %s is already up to date!" % self.namespace)
+                return
             self.install_sandboxes()
             self.instantiate_features()
             self.grab_inputs(reconfigure=reconfigure)
             self._specialize(reconfigure=reconfigure)
-            for feature in self._feature_dict_order:
-                self._run_action(feature, 'sync')
+            self._fingerprint_features(skip_unchanged=skip_unchanged)
+            self._sync_features()
             self.inject_environment_config()
             self._finalize()
         except Exception:
@@ -183,11 +279,12 @@ class Environment(object):
             self.logger.info("Removing environment %s..." % self.namespace)
             self.instantiate_features()
             self._specialize()
-            for feature in self._feature_dict_order:
-                self._run_action(feature, 'sync')
+            self._sync_features()
             self.clear_all()
             self.directory.remove()
             self.injections.commit()
+            if self.write_files:
+                write_loaders(self.root, self.global_path, self.shell_util_path)
         except Exception:
             self.logger.debug("", exc_info=sys.exc_info())
             et, ei, tb = sys.exc_info()
@@ -201,13 +298,11 @@ class Environment(object):
             self.phase = PHASE.DEACTIVATE
             self.logger.info("Deactivating environment %s..." % self.namespace)
             self.directory.rewrite_config = False
-            self.instantiate_features()
-            self._specialize()
-            for feature in self._feature_dict_order:
-                self.logger.info("Deactivating %s..." % feature[0])
-                self._run_action(feature, 'deactivate')
+            self.directory.set_active(False)
+            self._run_toggle('deactivate')
+            # the injections of the namespace are cleared, whether or not its features deactivate
             self.clear_all()
-            self._finalize()
+            self._finalize_toggle()
         except Exception:
             self.logger.debug("", exc_info=sys.exc_info())
             et, ei, tb = sys.exc_info()
@@ -221,13 +316,9 @@ class Environment(object):
             self.phase = PHASE.ACTIVATE
             self.logger.info("Activating environment %s..." % self.namespace)
             self.directory.rewrite_config = False
-            self.instantiate_features()
-            self._specialize()
-            for feature in self._feature_dict_order:
-                self.logger.info("Activating %s..." % feature[0])
-                self._run_action(feature, 'activate')
-            self.inject_environment_config()
-            self._finalize()
+            self.directory.set_active(True)
+            self._run_toggle('activate')
+            self._finalize_toggle()
         except Exception:
             self.logger.debug("", exc_info=sys.exc_info())
             et, ei, tb = sys.exc_info()
@@ -250,17 +341,62 @@ class Environment(object):
             self._run_action(feature, 'validate', run_if_error=True)
 
     @warmup
+    def plan(self):
+        """
+        Return the actions a sync of the environment would take, in
+        the order they would be taken, without modifying the
+        filesystem. Each action is a dictionary of the feature name,
+        the formula, the action ('install', 'update', 'remove',
+        'unchanged' or 'skip'), the urls that would be downloaded, the
+        commands that would be run, and any errors found.
+
+        Inputs are not prompted for, and features are only validated
+        and resolved.
+        """
+        self._planning = True
+        self._missing_formulas = {}
+        try:
+            self.phase = PHASE.INSTALL if self.directory.new else PHASE.UPDATE
+            self.fingerprint_store = self._load_fingerprints()
+            manifest_unchanged = (self.phase == PHASE.UPDATE and
+                                  self.fingerprint_store.manifest_fingerprint == fingerprint_manifest(self.target))
+            self.instantiate_features()
+            self._add_context()
+            self._inherit_config()
+            for feature in self._feature_dict_order:
+                self._run_action(feature, 'validate', run_if_error=True)
+                self._run_action(feature, 'resolve')
+            self._fingerprint_features(skip_unchanged=True)
+            plan = [self._plan_feature(feature, manifest_unchanged)
+                    for feature in self._feature_dict_order]
+            # features that do not run on this system are skipped
+            for key in self.__manifest_feature_keys():
+                if key not in self._feature_dict_order:
+                    plan.append(self._plan_entry(key, 'skip'))
+            return plan
+        finally:
+            self._planning = False
+
+    @warmup
+    @traced('inject_environment_config')
     def inject_environment_config(self):
+        """
+        Inject the sourcing of the global loaders into the shell config
+        files. The namespace's own blocks, injected by earlier versions,
+        are cleared from them.
+        """
+        for config_file in CONFIG_FILES:
+            self.injections.clear(os.path.join("~", config_file))
         for shell in SHELL_CONFIG:
             if shell == 'gui':
                 if self.system.isDebianBased():
-                    self._inject_config_source(".env", SHELL_CONFIG['gui']['debian'])
+                    self._inject_config_source(self.loader_env_path, SHELL_CONFIG['gui']['debian'])
             else:
                 if (self.global_config.has_option('shell', shell)
                    and lib.is_affirmative(self.global_config.get('shell', shell))):
 
-                    rc_file, rc_path = self._inject_config_source(".rc", SHELL_CONFIG[shell]['rc'])
-                    env_file, env_path = self._inject_config_source(".env", SHELL_CONFIG[shell]['env'])
+                    rc_file, rc_path = self._inject_config_source(self.loader_rc_path, SHELL_CONFIG[shell]['rc'])
+                    env_file, env_path = self._inject_config_source(self.loader_env_path, SHELL_CONFIG[shell]['env'])
                     # If an rc file is sourced by an env file, we should alert the user.
                     if (self.phase is PHASE.INSTALL
                        and self.injections.in_noninjected_file(env_path, rc_file)
@@ -325,10 +461,28 @@ class Environment(object):
                             fh.write(error + "\n")
 
     def write_manifest(self):
-        """ Write the manifest to the file """
+        """
+        Write the manifest to the file. The file is left untouched if
+        its content is unchanged, so its snapshot remains valid.
+        """
         if os.path.exists(self.directory.manifest_path) and self.write_files:
             manifest = self.target or self.source
-            manifest.write(open(self.directory.manifest_path, "w+"))
+            fd, temp_path = tempfile.mkstemp(dir=self.directory.root_dir, suffix='.cfg')
+            with os.fdopen(fd, 'w') as fh:
+                manifest.write(fh)
+            if filecmp.cmp(temp_path, self.directory.manifest_path, shallow=False):
+                os.unlink(temp_path)
+            else:
+                # mkstemp creates the file readable by its owner only
+                shutil.copymode(self.directory.manifest_path, temp_path)
+                os.rename(temp_path, self.directory.manifest_path)
+
+    def write_snapshot(self):
+        """ Write a snapshot of the manifest file, if it changed since the last one """
+        manifest_path, snapshot_path = self.directory.manifest_path, self.directory.snapshot_path
+        if self.write_files and os.path.exists(manifest_path) and not load_snapshot(snapshot_path, manifest_path):
+            self.logger.debug("Writing manifest snapshot...")
+            write_snapshot(Manifest(manifest_path), snapshot_path, manifest_path)
 
     def message_failure(self):
         """ return a failure message, if one exists """
@@ -344,6 +498,7 @@ class Environment(object):
         if manifest.has_option('config', 'message_success'):
             return manifest.get('config', 'message_success')
 
+    @traced('warmup')
     def warmup(self):
         """ initialize variables necessary to perform a sprinter action """
         self.logger.debug("Warming up...")
@@ -356,6 +511,10 @@ class Environment(object):
             e = sys.exc_info()[1]
             self.logger.error(str(e))
             raise SprinterException("Fatal error! Bad credentials to grab manifest!")
+        for manifest in (self.source, self.target):
+            if manifest:
+                # the root_dir context is only added once the directory is known
+                manifest.quiet = True
         if self.target:
             self.namespace = self.target.namespace
         if not self.namespace and self.source:
@@ -376,30 +535,38 @@ class Environment(object):
         os.environ['PATH'] = self.directory.bin_path() + ":" + os.environ['PATH']
         self.warmed_up = True
 
-    def instantiate_features(self):
-        """ Create and instantiate the feature dictionary """
+    def instantiate_features(self, action=None):
+        """
+        Create and instantiate the feature dictionary. If action is
+        set, only the features whose formula overrides it are.
+        """
         self._feature_dict = {}
         self._feature_dict_order = []
+        # activating and deactivating only imports the formulas of their features
+        if not self._planning and not action:
+            self._resolve_formulas()
 
         if self.target:
             for feature in self.target.formula_sections():
                 feature_key = self._instantiate_feature(
-                    feature, self.target.get_feature_config(feature), 'target')
+                    feature, self.target.get_feature_config(feature), 'target', action=action)
                 if feature_key:
                     self._feature_dict_order.append(feature_key)
         if self.source:
             for feature in self.source.formula_sections():
                 feature_key = self._instantiate_feature(
-                    feature, self.source.get_feature_config(feature), 'source')
+                    feature, self.source.get_feature_config(feature), 'source', action=action)
                 if feature_key:
                     self._feature_dict_order.insert(0, feature_key)
 
-    def _instantiate_feature(self, feature, feature_config, kind):
+    def _instantiate_feature(self, feature, feature_config, kind, action=None):
         if feature_config.has('formula'):
             key = (feature, feature_config.get('formula'))
             if key not in self._feature_dict:
                 try:
-                    formula_class = self._get_formula_class(feature_config.get('formula'))
+                    formula_class = self._get_formula_class(feature_config.get('formula'), download=not action)
+                    if action and not overrides(formula_class, action):
+                        return None
                     self._feature_dict[key] = formula_class(self, feature, **{kind: feature_config})
                     self._error_dict[key] = []
                     if self._feature_dict[key].should_run():
@@ -415,34 +582,32 @@ class Environment(object):
             self.log_error('feature %s has no formula!' % feature)
         return None
 
-    def _inject_config_source(self, source_filename, files_to_inject):
+    def _inject_config_source(self, source_path, files_to_inject):
         """
-        Inject existing environmental config with namespace sourcing.
+        Inject existing environmental config with the sourcing of a global loader.
         Returns a tuple of the first file name and path found.
         """
-        # src_path = os.path.join(self.directory.root_dir, source_filename)
-        # src_exec = "[ -r %s ] && . %s" % (src_path, src_path)
-        src_exec = "[ -r %s/%s ] && . %s/%s" % (self.directory.root_dir, source_filename,
-                                                self.directory.root_dir, source_filename)
-        # The ridiculous construction above is necessary to avoid failing tests(!)
+        src_exec = "[ -r %s ] && . %s" % (source_path, source_path)
 
         for config_file in files_to_inject:
             config_path = os.path.expanduser(os.path.join("~", config_file))
             if os.path.exists(config_path):
-                self.injections.inject(config_path, src_exec)
+                self.global_injections.inject(config_path, src_exec)
                 break
         else:
             config_file = files_to_inject[0]
             config_path = os.path.expanduser(os.path.join("~", config_file))
-            self.logger.info("No config files found to source %s, creating ~/%s!" % (source_filename, config_file))
-            self.injections.inject(config_path, src_exec)
+            self.logger.info("No config files found to source %s, creating ~/%s!" % (source_path, config_file))
+            self.global_injections.inject(config_path, src_exec)
 
         return (config_file, config_path)
 
+    @traced('finalize')
     def _finalize(self):
         """ command to run at the end of sprinter's run """
         self.logger.info("Finalizing...")
         self.write_manifest()
+        self.write_snapshot()
         if self.directory.rewrite_config:
             # always ensure .rc is written (sourcing .env)
             self.directory.add_to_rc('')
@@ -454,8 +619,8 @@ class Environment(object):
             self.directory.add_to_env('__sprinter_prepend_path "%s" LIBRARY_PATH' % self.directory.lib_path())
             self.directory.add_to_env('__sprinter_prepend_path "%s" C_INCLUDE_PATH' % self.directory.include_path())
         if self.write_files:
-            self.injections.commit()
-            self.global_injections.commit()
+            # the global injections share files with the environment's, so they are committed together
+            self.injections.commit(self.global_injections)
             if not os.path.exists(os.path.join(self.root, ".global")):
                 self.logger.debug("Global directoy doesn't exist! creating...")
                 os.makedirs(os.path.join(self.root, ".global"))
@@ -464,12 +629,59 @@ class Environment(object):
             self.logger.debug("Writing shell util file...")
             with open(self.shell_util_path, 'w+') as fh:
                 fh.write(shell_utils_template)
+            self._write_loaders()
+            if self.phase in (PHASE.INSTALL, PHASE.UPDATE) and self.fingerprint_store:
+                self._write_fingerprints()
+            if self.phase in (PHASE.INSTALL, PHASE.UPDATE) and not self.error_occured:
+                # the cached copy must match the installed state, to skip updates when it is unchanged
+                self.target.write_remote_cache(self.directory.remote_manifest_path)
         if self.error_occured:
             raise SprinterException("Error occured!")
         if self.message_success():
             self.logger.info(self.message_success())
         self.logger.info("NOTE: Please remember to open new shells/terminals to use the modified environment")
 
+    def _run_toggle(self, action):
+        """
+        Run action (activate or deactivate) on the features whose
+        formula overrides it. The other formulas do nothing on it, so
+        they are neither instantiated nor specialized.
+        """
+        self.instantiate_features(action=action)
+        if not self._feature_dict_order:
+            return
+        self._specialize()
+        for feature in self._feature_dict_order:
+            self.logger.info("%s %s..." % (self.phase.verb.capitalize(), feature[0]))
+            self._run_action(feature, action)
+
+    def _needs_loaders(self):
+        """ Return true if the global loaders have not been written yet, by an older version of sprinter """
+        return self.write_files and not os.path.exists(self.loader_rc_path)
+
+    def _finalize_toggle(self):
+        """
+        command to run at the end of an activate or deactivate. The
+        loaders check the marker of the namespace, so only the
+        injections of the features are committed, unless the namespace
+        was installed before the loaders existed.
+        """
+        if self._needs_loaders():
+            self.inject_environment_config()
+            return self._finalize()
+        if self.write_files:
+            self.injections.commit()
+        if self.error_occured:
+            raise SprinterException("Error occured!")
+        self.logger.info("NOTE: Please remember to open new shells/terminals to use the modified environment")
+
+    def _write_loaders(self):
+        """ Mark the namespace as active or deactivated, and regenerate the global loaders """
+        self.directory.set_active(self.phase is not PHASE.DEACTIVATE)
+        self.directory.flush()
+        self.logger.debug("Writing global loaders...")
+        write_loaders(self.root, self.global_path, self.shell_util_path)
+
     def _install_sandbox(self, name, call, kwargs={}):
         if (self.target.is_affirmative('config', name) and
            (not self.source or not self.source.is_affirmative('config', name))):
@@ -492,29 +704,88 @@ class Environment(object):
         logger.setLevel(logging.DEBUG)
         return logger
 
-    def _get_formula_class(self, formula):
+    def _get_formula_class(self, formula, download=True):
         """
         get a formula class object if it exists, else
         create one, add it to the dict, and pass return it.
+        If download is false, a formula that can not be imported is
+        not downloaded, and the base formula is returned for it.
         """
-        formula_class, formula_url = formula, None
-        if ':' in formula:
-            formula_class, formula_url = formula.split(":", 1)
+        formula_class, formula_url = _split_formula(formula)
         if formula_class not in self.formula_dict:
+            if formula_class in self._failed_formulas:
+                raise SprinterException("Error: Unable to download formula %s!" % formula_class)
             try:
-                self.formula_dict[formula_class] = lib.get_subclass_from_module(formula_class, FormulaBase)
+                self.formula_dict[formula_class] = self.formula_registry.resolve(formula_class)
             except (SprinterException, ImportError):
-                self.logger.info("Downloading %s..." % formula_class)
+                if self._planning:
+                    # the formula would be downloaded: plan the feature with the base formula
+                    self._missing_formulas[formula_class] = formula_url or formula_class
+                    return FormulaBase
+                if not download:
+                    return FormulaBase
+                self._download_formulas({formula_class: formula_url or formula_class})
+                if formula_class in self._failed_formulas:
+                    raise SprinterException("Error: Unable to download formula %s!" % formula_class)
                 try:
-                    self._pip.install_egg(formula_url or formula_class)
-                    try:
-                        self.formula_dict[formula_class] = lib.get_subclass_from_module(formula_class, FormulaBase)
-                    except ImportError:
-                        raise SprinterException("Error: Unable to retrieve formula %s!" % formula_class)
-                except PipException:
-                    self.logger.error("ERROR: Unable to download %s!" % formula_class)
+                    self.formula_dict[formula_class] = self.formula_registry.resolve(formula_class)
+                except ImportError:
+                    raise SprinterException("Error: Unable to retrieve formula %s!" % formula_class)
+            if not self._planning:
+                self.formula_registry.write()
         return self.formula_dict[formula_class]
 
+    def _resolve_formulas(self):
+        """
+        Resolve the formulas of every feature of the source and target
+        manifests, downloading the ones that can not be imported together,
+        in a single pip run.
+        """
+        missing = {}
+        for manifest in (self.target, self.source):
+            if not manifest:
+                continue
+            for feature in manifest.formula_sections():
+                feature_config = manifest.get_feature_config(feature)
+                if not feature_config.has('formula'):
+                    continue
+                formula_class, formula_url = _split_formula(feature_config.get('formula'))
+                if (formula_class in self.formula_dict or formula_class in missing
+                   or formula_class in self._failed_formulas):
+                    continue
+                try:
+                    self.formula_dict[formula_class] = self.formula_registry.resolve(formula_class)
+                except (SprinterException, ImportError):
+                    missing[formula_class] = formula_url or formula_class
+        if missing:
+            self._download_formulas(missing)
+        self.formula_registry.write()
+
+    def _download_formulas(self, formulas):
+        """
+        Download formulas, a dictionary of formula class to the egg
+        providing it, with a single pip run. The formulas that fail to
+        download are logged together, and are not downloaded again.
+        """
+        self.logger.info("Downloading %s..." % ", ".join(sorted(formulas)))
+        # pip's internals are slow to import, and only needed to download formulas
+        from sprinter.pippuppet import Pip, PipException
+        if self._pip is None:
+            self._pip = Pip(self.global_path)
+        failed = []
+        with span('download formulas', formulas=sorted(formulas)):
+            try:
+                self._pip.install_eggs([formulas[formula_class] for formula_class in sorted(formulas)])
+            except PipException:
+                failed = sys.exc_info()[1].eggs
+        # the egg directory may not have existed when the import system listed it
+        if hasattr(importlib, 'invalidate_caches'):
+            importlib.invalidate_caches()
+        failed_formulas = sorted(formula_class for formula_class, egg in formulas.items() if egg in failed)
+        if failed_formulas:
+            self._failed_formulas.update(failed_formulas)
+            self.logger.error("ERROR: Unable to download %s!" % ", ".join(failed_formulas))
+
     def log_error(self, error_message):
         self.error_occured = True
         self._errors += [error_message]
@@ -530,8 +801,12 @@ class Environment(object):
         if len(self._error_dict[feature]) > 0 and not run_if_error:
             return
         instance = self._feature_dict[feature]
+        if action in NOOP_METHODS and not overrides(instance, action):
+            return
         try:
-            result = getattr(instance, action)()
+            with span("%s %s" % (action, feature[0]), category='feature',
+                      feature=feature[0], formula=feature[1], action=action):
+                result = getattr(instance, action)()
             if result:
                 if type(result) != list:
                     self.log_feature_error(feature,
@@ -548,9 +823,249 @@ class Environment(object):
             self.logger.debug("Exception", exc_info=sys.exc_info())
             self.log_feature_error(feature, str(e))
 
+    def _sync_features(self):
+        """
+        Sync every feature. Features are run concurrently if jobs is
+        greater than one, with each feature starting once the features
+        it depends on have finished. The content concurrent features
+        add to the environment is then written in feature order, so it
+        matches a sync with a single job.
+        """
+        fetcher = self._start_fetches()
+        try:
+            dependency_dict = self._feature_dependencies() if self.jobs > 1 else {}
+            scheduler = FeatureScheduler(self._feature_dict_order, dependency_dict,
+                                         jobs=self.jobs, logger=self.logger)
+            scheduler.run(self._sync_feature)
+        finally:
+            if fetcher:
+                fetcher.join()
+            if self.jobs > 1:
+                # content is recorded by feature name, which a changed formula appears twice with
+                names = []
+                for name, _ in self._feature_dict_order:
+                    if name not in names:
+                        names.append(name)
+                for name in names:
+                    self.directory.write_recorded(name)
+                    self.injections.stage_recorded(name)
+
+    def _start_fetches(self):
+        """
+        Start fetching every feature that will be synced and has a
+        fetch stage, in a background thread. Fetches have no side
+        effects, so they are run concurrently regardless of
+        dependencies. Return the thread, or None if there is nothing
+        to fetch.
+        """
+        self._fetches = {}
+        for key in self._feature_dict_order:
+            instance = self._feature_dict[key]
+            # formulas without a fetch stage download during their sync, as before
+            if (overrides(type(instance), 'fetch')
+               and key not in self._unchanged_features and not self._error_dict[key]):
+                self._fetches[key] = threading.Event()
+        if not self._fetches:
+            return None
+        order = [key for key in self._feature_dict_order if key in self._fetches]
+        scheduler = FeatureScheduler(order, {}, jobs=self.fetch_jobs, logger=self.logger)
+        fetcher = threading.Thread(target=scheduler.run, args=(self._fetch_feature,))
+        fetcher.daemon = True
+        fetcher.start()
+        return fetcher
+
+    def _fetch_feature(self, feature):
+        """ Fetch a single feature. A failed fetch is only logged, as the sync downloads on its own """
+        try:
+            with span("fetch %s" % feature[0], category='feature',
+                      feature=feature[0], formula=feature[1], action='fetch'):
+                self._feature_dict[feature].fetch()
+        except Exception:
+            self.logger.debug("Unable to fetch %s ahead of its sync: %s" % (feature[0], sys.exc_info()[1]),
+                              exc_info=True)
+        finally:
+            self._fetches[feature].set()
+
+    def _sync_feature(self, feature):
+        """
+        Sync a single feature, recording the content it adds to the
+        environment. An unchanged feature is not synced: the content
+        recorded when it was last synced is added again instead.
+        """
+        name = feature[0]
+        self.directory.record_feature(name, buffer=self.jobs > 1)
+        self.injections.record_feature(name, buffer=self.jobs > 1)
+        try:
+            if feature in self._unchanged_features:
+                self.logger.info("%s is unchanged, skipping..." % name)
+                env, rc, injections = self._unchanged_features[feature]
+                for content in env:
+                    self.directory.add_to_env(content)
+                for content in rc:
+                    self.directory.add_to_rc(content)
+                for filename, contents in injections.items():
+                    self.injections.inject_many(filename, contents)
+            else:
+                if feature in self._fetches:
+                    # wake up periodically to allow for interrupts
+                    while not self._fetches[feature].wait(0.5):
+                        pass
+                self._run_action(feature, 'sync')
+                if self.journal and not self._error_dict[feature]:
+                    content = self.directory.recorded_content(name)
+                    self.journal.record(feature, self._fingerprints.get(feature),
+                                        env=content.get('env', []),
+                                        rc=content.get('rc', []),
+                                        injections=self.injections.recorded_content(name))
+        finally:
+            self.directory.record_feature(None)
+            self.injections.record_feature(None)
+
+    def _feature_dependencies(self):
+        """
+        Return a dictionary of feature keys to the feature keys they
+        must wait for before syncing.
+        """
+        keys_by_name = {}
+        for key in self._feature_dict_order:
+            keys_by_name.setdefault(key[0], []).append(key)
+        removals = set(key for key in self._feature_dict_order
+                       if not self.__in_manifest(self.target, key))
+        dependency_dict = {}
+        for key in self._feature_dict_order:
+            name = key[0]
+            # a feature that changed formulas is removed before it is installed again
+            dependencies = keys_by_name[name][:keys_by_name[name].index(key)]
+            if key not in removals:
+                for dependency in self.target.dependencies(name):
+                    dependencies += keys_by_name.get(dependency, [])
+            elif self.source:
+                # a feature is removed after the features that depend on it
+                for dependent in self.source.dtree.dependents(name):
+                    dependencies += [k for k in keys_by_name.get(dependent, []) if k in removals]
+            dependency_dict[key] = dependencies
+        return dependency_dict
+
+    def __in_manifest(self, manifest, feature_key):
+        """ Return true if the feature key is part of the manifest """
+        name, formula = feature_key
+        return bool(manifest and manifest.has_option(name, 'formula')
+                    and manifest.get(name, 'formula') == formula)
+
+    def __manifest_feature_keys(self):
+        """ Return the keys of every feature with a formula in the target and source """
+        keys = []
+        for manifest in [self.target, self.source]:
+            if manifest:
+                for name in manifest.formula_sections():
+                    if manifest.has_option(name, 'formula'):
+                        key = (name, manifest.get(name, 'formula'))
+                        if key not in keys:
+                            keys.append(key)
+        return keys
+
+    def _plan_feature(self, feature, manifest_unchanged=False):
+        """ Return the planned action for an instantiated feature """
+        if not self.__in_manifest(self.target, feature):
+            action = PHASE.REMOVE.name
+        elif not self.__in_manifest(self.source, feature):
+            action = PHASE.INSTALL.name
+        elif manifest_unchanged or feature in self._unchanged_features:
+            action = 'unchanged'
+        else:
+            action = PHASE.UPDATE.name
+        downloads, commands = [], []
+        formula_class = feature[1].split(":", 1)[0]
+        if formula_class in self._missing_formulas:
+            downloads.append(self._missing_formulas[formula_class])
+        if action != 'unchanged' and not self._error_dict[feature]:
+            instance = self._feature_dict[feature]
+            try:
+                downloads += instance.downloads()
+                commands += instance.commands()
+            except Exception:
+                self.logger.debug("Exception", exc_info=sys.exc_info())
+                self.log_feature_error(feature, str(sys.exc_info()[1]))
+        return self._plan_entry(feature, action, downloads=downloads, commands=commands)
+
+    def _plan_entry(self, feature, action, downloads=[], commands=[]):
+        """ Return a planned action """
+        return {'feature': feature[0],
+                'formula': feature[1],
+                'action': action,
+                'downloads': list(downloads),
+                'commands': list(commands),
+                'errors': list(self._error_dict.get(feature, []))}
+
+    def _load_fingerprints(self):
+        """ Return the fingerprint store of the environment """
+        return FingerprintStore(self.directory.fingerprint_path if self.write_files else None)
+
+    def _fingerprint_features(self, skip_unchanged=False):
+        """
+        Fingerprint the specialized target features. If skip_unchanged
+        is set, features updated with the fingerprint they were
+        installed with are marked as unchanged.
+        """
+        self._fingerprints = {}
+        self._unchanged_features = {}
+        for key in self._feature_dict_order:
+            if not self.__in_manifest(self.target, key):
+                continue
+            name, formula = key
+            fingerprint = fingerprint_feature(self.target.get_feature_config(name), formula,
+                                              self._get_formula_class(formula))
+            self._fingerprints[key] = fingerprint
+            if (skip_unchanged and self.__in_manifest(self.source, key)
+               and not self._error_dict[key]
+               and self.fingerprint_store.unchanged(name, formula, fingerprint)):
+                self._unchanged_features[key] = self.fingerprint_store.content(name)
+
+    def _resume_features(self):
+        """
+        Mark the features the journal records as synced, with their
+        current fingerprint, as unchanged.
+        """
+        for key, fingerprint in self._fingerprints.items():
+            if not self._error_dict[key] and self.journal.completed(key, fingerprint):
+                self._unchanged_features[key] = self.journal.content(key)
+
+    def _load_journal(self):
+        """ Return the progress journal of the environment """
+        return Journal(self.directory.journal_path if self.write_files else None)
+
+    def _write_fingerprints(self):
+        """ Store the fingerprints and recorded content of the synced features """
+        store = self.fingerprint_store
+        for name in list(store.features):
+            if not self.target.has_section(name):
+                store.remove(name)
+        for key, fingerprint in self._fingerprints.items():
+            name, formula = key
+            if self._error_dict[key]:
+                store.remove(name)
+                continue
+            content = self.directory.recorded_content(name)
+            store.set(name, formula, fingerprint,
+                      env=content.get('env', []),
+                      rc=content.get('rc', []),
+                      injections=self.injections.recorded_content(name))
+        store.manifest_fingerprint = None if self.error_occured else self._manifest_fingerprint
+        store.write()
+
+    @traced('specialize')
     def _specialize(self, reconfigure=False):
         """ Add variables and specialize contexts """
-        # add in the 'root_dir' directories to the context dictionaries
+        self._add_context()
+        self.grab_inputs()
+        for feature in self._feature_dict_order:
+            self._run_action(feature, 'validate', run_if_error=True)
+            if not reconfigure:
+                self._run_action(feature, 'resolve')
+            self._run_action(feature, 'prompt')
+
+    def _add_context(self):
+        """ add in the 'root_dir' directories to the context dictionaries """
         for manifest in [self.source, self.target]:
             context_dict = {}
             if manifest:
@@ -558,23 +1073,44 @@ class Environment(object):
                     context_dict["%s:root_dir" % s] = self.directory.install_directory(s)
                     context_dict['config:root_dir'] = self.directory.root_dir
                     context_dict['config:node'] = self.system.node
+                manifest.quiet = False
                 manifest.add_additional_context(context_dict)
-        self.grab_inputs()
-        for feature in self._feature_dict_order:
-            self._run_action(feature, 'validate', run_if_error=True)
-            if not reconfigure:
-                self._run_action(feature, 'resolve')
-            self._run_action(feature, 'prompt')
 
     def grab_inputs(self, reconfigure=False):
         """ Resolve the source and target config section """
+        self._inherit_config()
+        if self.target:
+            self.target.grab_inputs(force_prompt=reconfigure)
+
+    def _inherit_config(self):
+        """ Copy the config values of the source missing from the target """
         if self.source:
             if self.target:
                 for k, v in self.source.items('config'):
                     if not self.target.has_option('config', k):
                         self.target.set('config', k, v)
-        if self.target:
-            self.target.grab_inputs(force_prompt=reconfigure)
+
+    def _cache_max_size(self):
+        """ Return the maximum size of the download cache in bytes, from the global config in megabytes """
+        if self.global_config.has_option('global', 'cache_max_size'):
+            try:
+                return int(self.global_config.get('global', 'cache_max_size')) * 1024 * 1024
+            except ValueError:
+                self.logger.warn("cache_max_size in the global config must be a number of megabytes!")
+        return downloadcache.DEFAULT_MAX_SIZE
+
+    def _transport_options(self):
+        """ Return the http timeouts (in seconds) and retries set in the global config """
+        options = {}
+        for option, key, type_ in (('http_connect_timeout', 'connect_timeout', float),
+                                   ('http_read_timeout', 'read_timeout', float),
+                                   ('http_retries', 'retries', int)):
+            if self.global_config.has_option('global', option):
+                try:
+                    options[key] = type_(self.global_config.get('global', option))
+                except ValueError:
+                    self.logger.warn("%s in the global config must be a number!" % option)
+        return options
 
     def load_global_config(self, global_config_string):
         if self.global_config:
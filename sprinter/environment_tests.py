@@ -9,8 +9,12 @@ from sprinter.testtools import (create_mock_environment,
                                 create_mock_formulabase)
 from sprinter.exceptions import SprinterException
 from sprinter.environment import Environment
+from sprinter.fingerprint import FingerprintStore, fingerprint_feature, fingerprint_manifest
 from sprinter.formulabase import FormulaBase
+from sprinter.journal import Journal
+from sprinter.pippuppet import PipException
 from sprinter.templates import source_template
+from sprinter.tracing import TRACER
 
 source_config = """
 [config]
@@ -155,6 +159,340 @@ class TestEnvironment(object):
                                                   call.prompt(),
                                                   call.activate()])
 
+    def test_activate_toggles_marker(self):
+        """
+        Activate and deactivate should toggle the marker, and skip the
+        formulas that do nothing on them. Deactivate should still clear
+        the injections of the namespace.
+        """
+        environment = create_mock_environment(
+            source_config=test_dependency_source,
+            installed=True
+        )
+        instantiated = []
+
+        class PlainFormula(FormulaBase):
+
+            def __init__(self, *args, **kwargs):
+                instantiated.append(args[1])
+                super(PlainFormula, self).__init__(*args, **kwargs)
+
+        environment.formula_dict['sprinter.formulabase'] = PlainFormula
+        environment.deactivate()
+        environment.directory.set_active.assert_called_once_with(False)
+        assert environment.injections.clear_all.called
+        environment.injections.clear_all.reset_mock()
+        environment.activate()
+        environment.directory.set_active.assert_called_with(True)
+        tools.eq_(instantiated, [])
+        assert not environment.injections.clear_all.called
+
+    @patch('sprinter.pippuppet.Pip')
+    def test_activate_does_not_download(self, pip):
+        """ Activate should not download the formulas that can not be imported """
+        environment = create_mock_environment(
+            source_config=download_source,
+            installed=True
+        )
+        environment.formula_registry = Mock(resolve=Mock(side_effect=ImportError))
+        environment.activate()
+        environment.directory.set_active.assert_called_once_with(True)
+        assert not pip.called
+        tools.eq_(environment.formula_registry.resolve.call_count, 1)
+        assert not environment.error_occured
+
+    def test_write_manifest_keeps_mode(self):
+        """ Writing the manifest should keep the mode of the manifest file """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            environment = create_mock_environment(target_config=test_target)
+            environment.write_files = True
+            environment.directory.root_dir = temp_dir
+            environment.directory.manifest_path = os.path.join(temp_dir, "manifest.cfg")
+            with open(environment.directory.manifest_path, 'w+') as fh:
+                fh.write("[config]\n")
+            os.chmod(environment.directory.manifest_path, 0o644)
+            Environment.write_manifest(environment)
+            tools.eq_(os.stat(environment.directory.manifest_path).st_mode & 0o777, 0o644)
+            with open(environment.directory.manifest_path) as fh:
+                assert "testfeature" in fh.read()
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_root_dir_reference_is_not_reported(self):
+        """ A value referencing root_dir, read before the context is added, should not be reported """
+        environment = create_mock_environment(target_config=root_dir_target)
+        environment.target.specializer.logger = Mock()
+        installs = []
+
+        class RootDirFormula(FormulaBase):
+
+            valid_options = FormulaBase.valid_options + ['install']
+
+            def should_run(self):
+                self.target.get('install')
+                return super(RootDirFormula, self).should_run()
+
+            def install(self):
+                installs.append(self.target.get('install'))
+
+        environment.formula_dict['sprinter.formulabase'] = RootDirFormula
+        environment.install()
+        tools.eq_(installs, ['/tmp/', '/tmp//bin'])
+        assert not environment.target.specializer.logger.warn.called
+
+    def test_feature_dependencies(self):
+        """ Feature dependencies should map each feature key to the keys it waits for """
+        environment = create_mock_environment(
+            source_config=test_dependency_source,
+            target_config=test_dependency_target,
+            installed=True
+        )
+        environment.formula_dict['sprinter.formulabase'] = Mock(return_value=create_mock_formulabase())
+        environment.instantiate_features()
+        dependency_dict = environment._feature_dependencies()
+        tools.eq_(dependency_dict[('child', 'sprinter.formulabase')],
+                  [('parent', 'sprinter.formulabase')])
+        tools.eq_(dependency_dict[('parent', 'sprinter.formulabase')], [])
+        # removed features wait for the removal of the features depending on them
+        tools.eq_(dependency_dict[('oldparent', 'sprinter.formulabase')],
+                  [('oldchild', 'sprinter.formulabase')])
+
+    def test_concurrent_install(self):
+        """ An install with multiple jobs should sync every feature, and write their content in order """
+        environment = create_mock_environment(
+            target_config=test_dependency_target
+        )
+        environment.jobs = 4
+        mock_formulabase = create_mock_formulabase()
+        environment.formula_dict['sprinter.formulabase'] = Mock(return_value=mock_formulabase)
+        environment.install()
+        tools.eq_(mock_formulabase.sync.call_count, 2)
+        names = [name for name, _ in environment._feature_dict_order]
+        tools.eq_([c[0][0] for c in environment.directory.write_recorded.call_args_list], names)
+        tools.eq_([c[0][0] for c in environment.injections.stage_recorded.call_args_list], names)
+        environment.directory.record_feature.assert_any_call(names[0], buffer=True)
+
+    def test_fetch_before_sync(self):
+        """ Features with a fetch stage should be fetched ahead of their sync """
+        environment = create_mock_environment(
+            target_config=test_dependency_target
+        )
+        events = []
+
+        class FetchingFormula(FormulaBase):
+
+            def fetch(self):
+                events.append(('fetch', self.feature_name))
+
+            def install(self):
+                events.append(('install', self.feature_name))
+
+        environment.formula_dict['sprinter.formulabase'] = FetchingFormula
+        environment.install()
+        for name in ('parent', 'child'):
+            assert events.index(('fetch', name)) < events.index(('install', name))
+
+    def test_failed_fetch_still_syncs(self):
+        """ A feature whose fetch failed should still be synced """
+        environment = create_mock_environment(
+            target_config=test_dependency_target
+        )
+        installed = []
+
+        class FailingFetchFormula(FormulaBase):
+
+            def fetch(self):
+                raise Exception("unreachable")
+
+            def install(self):
+                installed.append(self.feature_name)
+
+        environment.formula_dict['sprinter.formulabase'] = FailingFetchFormula
+        environment.install()
+        tools.eq_(sorted(installed), ['child', 'parent'])
+        assert not environment.error_occured
+
+    def test_update_skips_unchanged_manifest(self):
+        """ An update should do nothing if the target manifest is unchanged """
+        environment = create_mock_environment(
+            source_config=test_source,
+            target_config=test_target,
+            installed=True
+        )
+        store = FingerprintStore()
+        store.manifest_fingerprint = fingerprint_manifest(environment.target)
+        environment._load_fingerprints = Mock(return_value=store)
+        mock_formulabase = create_mock_formulabase()
+        environment.formula_dict['sprinter.formulabase'] = Mock(return_value=mock_formulabase)
+        environment.update()
+        assert not mock_formulabase.sync.called
+
+    def test_update_skips_unchanged_feature(self):
+        """ An update should replay the content of an unchanged feature instead of syncing it """
+        environment = create_mock_environment(
+            source_config=test_source,
+            target_config=test_target,
+            installed=True
+        )
+        mock_formulabase = create_mock_formulabase()
+        environment.formula_dict['sprinter.formulabase'] = Mock(return_value=mock_formulabase)
+        fingerprint = fingerprint_feature(environment.target.get_feature_config('testfeature'),
+                                          'sprinter.formulabase',
+                                          environment.formula_dict['sprinter.formulabase'])
+        store = FingerprintStore()
+        store.set('testfeature', 'sprinter.formulabase', fingerprint, env=['export A=b'])
+        environment._load_fingerprints = Mock(return_value=store)
+        environment.update()
+        assert not mock_formulabase.sync.called
+        environment.directory.add_to_env.assert_any_call('export A=b')
+
+    def test_update_force_syncs_unchanged_feature(self):
+        """ A forced update should sync every feature """
+        environment = create_mock_environment(
+            source_config=test_source,
+            target_config=test_target,
+            installed=True
+        )
+        store = FingerprintStore()
+        store.manifest_fingerprint = fingerprint_manifest(environment.target)
+        environment._load_fingerprints = Mock(return_value=store)
+        mock_formulabase = create_mock_formulabase()
+        environment.formula_dict['sprinter.formulabase'] = Mock(return_value=mock_formulabase)
+        environment.update(force=True)
+        assert mock_formulabase.sync.called
+
+    def test_plan(self):
+        """ A plan should list the action of every feature, without syncing any """
+        environment = create_mock_environment(
+            source_config=test_plan_source,
+            target_config=test_plan_target,
+            installed=True
+        )
+        mock_formulabase = create_mock_formulabase()
+        mock_formulabase.should_run.return_value = True
+        mock_formulabase.downloads.return_value = ['http://example.com/package.tar.gz']
+        mock_formulabase.commands.return_value = ['make install']
+        environment.formula_dict['sprinter.formulabase'] = Mock(return_value=mock_formulabase)
+        fingerprint = fingerprint_feature(environment.target.get_feature_config('unchanged'),
+                                          'sprinter.formulabase',
+                                          environment.formula_dict['sprinter.formulabase'])
+        store = FingerprintStore()
+        store.set('unchanged', 'sprinter.formulabase', fingerprint)
+        environment._load_fingerprints = Mock(return_value=store)
+        plan = environment.plan()
+        tools.eq_([(a['feature'], a['action']) for a in plan],
+                  [('removed', 'remove'), ('unchanged', 'unchanged'),
+                   ('updated', 'update'), ('installed', 'install')])
+        tools.eq_(plan[3]['downloads'], ['http://example.com/package.tar.gz'])
+        tools.eq_(plan[3]['commands'], ['make install'])
+        tools.eq_(plan[1]['commands'], [])
+        assert not mock_formulabase.sync.called
+        assert not mock_formulabase.prompt.called
+
+    @patch('sprinter.pippuppet.Pip')
+    def test_missing_formulas_are_downloaded_together(self, pip):
+        """ The formulas of both manifests that can not be imported should be downloaded in one pip run """
+        environment = create_mock_environment(
+            source_config=download_source,
+            target_config=download_target,
+            installed=True
+        )
+        downloaded = set()
+
+        def resolve(formula_class):
+            if formula_class not in downloaded:
+                raise ImportError(formula_class)
+            return Mock(return_value=create_mock_formulabase())
+
+        def install_eggs(eggs):
+            downloaded.add('formula.one')
+            raise PipException(['http://example.com/two.tar.gz'])
+        environment.formula_registry = Mock(resolve=Mock(side_effect=resolve))
+        pip.return_value.install_eggs.side_effect = install_eggs
+        environment.instantiate_features()
+        pip.return_value.install_eggs.assert_called_once_with(['formula.one', 'http://example.com/two.tar.gz'])
+        tools.eq_(environment._failed_formulas, set(['formula.two']))
+        tools.eq_(environment._feature_dict_order, [('one', 'formula.one')])
+        assert environment.error_occured
+
+    def test_install_is_traced(self):
+        """ Each phase and feature action of an install should be recorded when tracing """
+        environment = create_mock_environment(target_config=test_target)
+        environment.formula_dict['sprinter.formulabase'] = Mock(return_value=create_mock_formulabase())
+        TRACER.enable()
+        try:
+            environment.install()
+            names = [e['name'] for e in TRACER.events]
+        finally:
+            TRACER.disable()
+            TRACER.clear()
+        for name in ['warmup', 'specialize', 'validate testfeature', 'sync testfeature',
+                     'inject_environment_config', 'finalize']:
+            assert name in names, "%s was not traced!" % name
+
+    def test_failed_install_is_kept(self):
+        """ A failed install should be kept to resume, unless rollback is set """
+        environment = create_mock_environment(target_config=test_target)
+        mock_formulabase = create_mock_formulabase()
+        mock_formulabase.sync.side_effect = Exception("sync failed")
+        environment.formula_dict['sprinter.formulabase'] = Mock(return_value=mock_formulabase)
+        tools.assert_raises(SprinterException, environment.install)
+        assert not environment.directory.remove.called
+
+    def test_failed_install_rollback(self):
+        """ A failed install should be removed if rollback is set """
+        environment = create_mock_environment(target_config=test_target)
+        environment.rollback = True
+        mock_formulabase = create_mock_formulabase()
+        mock_formulabase.sync.side_effect = Exception("sync failed")
+        environment.formula_dict['sprinter.formulabase'] = Mock(return_value=mock_formulabase)
+        tools.assert_raises(SprinterException, environment.install)
+        assert environment.directory.remove.called
+
+    def test_resume_install(self):
+        """ A resumed install should replay the features the journal records, instead of syncing them """
+        environment = create_mock_environment(
+            target_config=test_dependency_target,
+            installed=True
+        )
+        mock_formulabase = create_mock_formulabase()
+        environment.formula_dict['sprinter.formulabase'] = Mock(return_value=mock_formulabase)
+        fingerprint = fingerprint_feature(environment.target.get_feature_config('parent'),
+                                          'sprinter.formulabase',
+                                          environment.formula_dict['sprinter.formulabase'])
+        journal = Journal()
+        journal.start()
+        journal.record(('parent', 'sprinter.formulabase'), fingerprint, env=['export A=b'])
+        environment._load_journal = Mock(return_value=journal)
+        environment.directory.recorded_content.return_value = {}
+        environment.injections.recorded_content.return_value = {}
+        environment.install(resume=True)
+        tools.eq_(mock_formulabase.sync.call_count, 1)
+        environment.directory.add_to_env.assert_any_call('export A=b')
+        assert journal.finished
+        assert journal.completed(('child', 'sprinter.formulabase'),
+                                 environment._fingerprints[('child', 'sprinter.formulabase')])
+
+    def test_install_incomplete_without_resume(self):
+        """ Installing over an incomplete install without resume should neither update nor finish it """
+        environment = create_mock_environment(
+            target_config=test_target,
+            installed=True
+        )
+        mock_formulabase = create_mock_formulabase()
+        environment.formula_dict['sprinter.formulabase'] = Mock(return_value=mock_formulabase)
+        journal = Journal()
+        journal.start()
+        environment._load_journal = Mock(return_value=journal)
+        environment.update = Mock()
+        tools.assert_raises(SprinterException, environment.install)
+        assert not environment.update.called
+        assert not mock_formulabase.sync.called
+        assert journal.incomplete
+        environment.install(resume=True)
+        assert journal.finished
+
     def test_global_shell_configuration_bash(self):
         """ The global shell should dictate what files are injected (bash, gui, no zsh)"""
         # test bash, gui, no zshell
@@ -169,19 +507,21 @@ env_source_rc = False
         environment = create_mock_environment(
             target_config=test_target,
             global_config=global_shell_configuration_bash,
-            mock_injections=False)
+            mock_injections=False,
+            mock_global_injections=False)
         environment.warmup()
         environment.injections.commit = Mock()
+        environment.global_injections.commit = Mock()
         environment.formula_dict['sprinter.formulabase'] = Mock(return_value=create_mock_formulabase())
         environment.install()
-        assert [x for x in environment.injections.inject_dict.keys() if x.endswith('.bashrc')]
+        assert [x for x in environment.global_injections.inject_dict.keys() if x.endswith('.bashrc')]
         env_injected = False
         for profile in ['.bash_profile', '.bash_login', '.profile']:
-            env_injected = env_injected or filter(lambda x: x.endswith(profile), environment.injections.inject_dict.keys())
+            env_injected = env_injected or filter(lambda x: x.endswith(profile), environment.global_injections.inject_dict.keys())
         assert env_injected
-        assert not [x for x in environment.injections.inject_dict.keys() if x.endswith('.zshrc')]
+        assert not [x for x in environment.global_injections.inject_dict.keys() if x.endswith('.zshrc')]
         for profile in ['.zprofile', '.zlogin']:
-            assert not [x for x in environment.injections.inject_dict.keys() if x.endswith(profile)]
+            assert not [x for x in environment.global_injections.inject_dict.keys() if x.endswith(profile)]
 
     def test_env_to_rc_injection(self):
         """ If env_source_rc is set to true, the env environments should source the rc """
@@ -243,19 +583,21 @@ env_source_rc = False
         environment = create_mock_environment(
             target_config=test_target,
             global_config=global_shell_configuration_zshell,
-            mock_injections=False)
+            mock_injections=False,
+            mock_global_injections=False)
         environment.warmup()
         environment.injections.commit = Mock()
+        environment.global_injections.commit = Mock()
         environment.formula_dict['sprinter.formulabase'] = Mock(return_value=create_mock_formulabase())
         environment.install()
-        assert [x for x in environment.injections.inject_dict.keys() if x.endswith('.zshrc')]
+        assert [x for x in environment.global_injections.inject_dict.keys() if x.endswith('.zshrc')]
         env_injected = False
         for profile in ['.zprofile', '.zlogin']:
-            env_injected = env_injected or filter(lambda x: x.endswith(profile), environment.injections.inject_dict.keys())
+            env_injected = env_injected or filter(lambda x: x.endswith(profile), environment.global_injections.inject_dict.keys())
         assert env_injected
-        assert not [x for x in environment.injections.inject_dict.keys() if x.endswith('.bashrc')]
+        assert not [x for x in environment.global_injections.inject_dict.keys() if x.endswith('.bashrc')]
         for profile in ['.bash_profile', '.bash_login']:
-            assert not [x for x in environment.injections.inject_dict.keys() if x.endswith(profile)]
+            assert not [x for x in environment.global_injections.inject_dict.keys() if x.endswith(profile)]
 
     def test_global_config(self):
         """ Global config should accept a file-like object, or default to ROOT/.sprinter/.global/config.cfg """
@@ -346,11 +688,83 @@ missing_formula_config = """
 formula = sprinter.formulabase
 """
 
+root_dir_target = """
+[a]
+formula = sprinter.formulabase
+install = %(a:root_dir)s
+
+[b]
+formula = sprinter.formulabase
+depends = a
+install = %(a:root_dir)s/bin
+"""
+
+download_source = """
+[two]
+formula = formula.two:http://example.com/two.tar.gz
+"""
+
+download_target = """
+[one]
+formula = formula.one
+
+[two]
+formula = formula.two:http://example.com/two.tar.gz
+"""
+
 test_source = """
 [testfeature]
 formula = sprinter.formulabase
 """
 
+test_dependency_source = """
+[oldparent]
+formula = sprinter.formulabase
+
+[oldchild]
+formula = sprinter.formulabase
+depends = oldparent
+"""
+
+test_dependency_target = """
+[config]
+namespace = testsprinter
+
+[child]
+formula = sprinter.formulabase
+depends = parent
+
+[parent]
+formula = sprinter.formulabase
+"""
+
+test_plan_source = """
+[removed]
+formula = sprinter.formulabase
+
+[unchanged]
+formula = sprinter.formulabase
+
+[updated]
+formula = sprinter.formulabase
+"""
+
+test_plan_target = """
+[config]
+namespace = testsprinter
+
+[unchanged]
+formula = sprinter.formulabase
+
+[updated]
+formula = sprinter.formulabase
+command = echo updated
+
+[installed]
+formula = sprinter.formulabase
+depends = updated
+"""
+
 test_target = """
 [config]
 namespace = testsprinter
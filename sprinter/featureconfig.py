@@ -1,4 +1,3 @@
-import copy
 import sys
 
 from sprinter.core import LOGGER
@@ -30,15 +29,15 @@ class FeatureConfig(object):
             if default is not None:
                 return default
             raise ParamNotFoundException("value for %s not found" % param)
-        context_dict = copy.deepcopy(self.manifest.get_context_dict())
-        for k, v in self.raw_dict.items():
-            context_dict["%s:%s" % (self.feature_name, k)] = v
-        try:
-            return str(self.raw_dict[param]) % context_dict
-        except KeyError:
-            e = sys.exc_info()[1]
-            self.logger.warn("Could not specialize %s! Error: %s" % (self.raw_dict[param], e))
+        if '%' not in str(self.raw_dict[param]):
+            # nothing to specialize
             return self.raw_dict[param]
+        resolved = self.manifest.resolved()
+        key = "%s:%s" % (self.feature_name, param)
+        if resolved.raw(key) == self.raw_dict[param]:
+            return resolved[key]
+        # the value was not set through the manifest, so it is specialized on its own
+        return self.manifest.specializer.specialize(self.raw_dict[param], resolved)
 
     def has(self, param):
         """ return true if the param exists """
@@ -0,0 +1,132 @@
+"""
+fingerprint.py computes fingerprints of manifests and their features.
+
+The fingerprints of an installed environment are stored alongside its
+manifest, with the shell and injection content each feature produced,
+so an update can skip the features whose configuration and formula are
+unchanged while still regenerating the environment's files. The
+formula includes the version of the distribution it was installed
+with, so upgrading a formula syncs its features again.
+"""
+from __future__ import unicode_literals
+import hashlib
+import json
+import os
+
+FORMAT_VERSION = 1
+
+_versions = {}  # the distribution version of each top level package, looked up once
+
+
+def _hash(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def fingerprint_feature(feature_config, formula, formula_class=None):
+    """
+    Return a fingerprint of a fully specialized feature config and the
+    formula that installs it.
+    """
+    formula_name = "%s.%s" % (getattr(formula_class, '__module__', ''),
+                              getattr(formula_class, '__name__', ''))
+    return _hash([feature_config.feature_name, formula, formula_name, formula_version(formula_class),
+                  sorted(feature_config.to_dict().items())])
+
+
+def formula_version(formula_class):
+    """
+    Return the version of the distribution formula_class was installed
+    with, or None if it can not be found.
+    """
+    package = (getattr(formula_class, '__module__', None) or '').split('.')[0]
+    if not package:
+        return None
+    if package not in _versions:
+        _versions[package] = _distribution_version(package)
+    return _versions[package]
+
+
+def _distribution_version(package):
+    """ Return the version of the distribution that installs package, or None """
+    try:
+        from importlib import metadata
+    except ImportError:
+        import pkg_resources
+        try:
+            return pkg_resources.get_distribution(package).version
+        except pkg_resources.DistributionNotFound:
+            return None
+    try:
+        # a distribution is usually named after its package, and finding it by name is fast
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        pass
+    if hasattr(metadata, 'packages_distributions'):
+        for name in metadata.packages_distributions().get(package, []):
+            return metadata.version(name)
+    return None
+
+
+def fingerprint_manifest(manifest):
+    """ Return a fingerprint of the raw (unspecialized) content of a manifest """
+    return _hash([manifest.namespace] +
+                 [[s, sorted((k, str(v)) for k, v in manifest.items(s))]
+                  for s in sorted(manifest.sections())])
+
+
+class FingerprintStore(object):
+    """
+    The fingerprints of an installed environment. If path is None,
+    fingerprints are kept in memory only.
+    """
+
+    path = None  # the path to the fingerprint file
+    manifest_fingerprint = None  # the fingerprint of the installed target manifest
+
+    def __init__(self, path=None):
+        self.path = path
+        self.features = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as fh:
+                    content = json.load(fh)
+                if content.get('version') == FORMAT_VERSION:
+                    self.manifest_fingerprint = content.get('manifest')
+                    self.features = content.get('features', {})
+            except ValueError:
+                # a corrupt store is the same as no store: every feature is synced
+                pass
+
+    def unchanged(self, feature_name, formula, fingerprint):
+        """ Return true if the feature was installed with the same fingerprint """
+        stored = self.features.get(feature_name)
+        return (stored is not None and stored['formula'] == formula
+                and stored['fingerprint'] == fingerprint)
+
+    def content(self, feature_name):
+        """ Return the env, rc, and injection content stored for the feature """
+        stored = self.features.get(feature_name, {})
+        return (stored.get('env', []), stored.get('rc', []), stored.get('injections', {}))
+
+    def set(self, feature_name, formula, fingerprint, env=[], rc=[], injections={}):
+        """ store the fingerprint and the content of a feature """
+        self.features[feature_name] = {
+            'formula': formula,
+            'fingerprint': fingerprint,
+            'env': list(env),
+            'rc': list(rc),
+            'injections': dict((k, list(v)) for k, v in injections.items())
+        }
+
+    def remove(self, feature_name):
+        """ forget a feature, so it is synced on the next run """
+        self.features.pop(feature_name, None)
+
+    def write(self):
+        """ write the store to its path """
+        if not self.path:
+            return
+        with open(self.path, 'w+') as fh:
+            json.dump({'version': FORMAT_VERSION,
+                       'manifest': self.manifest_fingerprint,
+                       'features': self.features}, fh, sort_keys=True)
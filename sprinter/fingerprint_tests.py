@@ -0,0 +1,89 @@
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from mock import patch
+from nose import tools
+
+from sprinter.fingerprint import FingerprintStore, fingerprint_feature, fingerprint_manifest, formula_version
+from sprinter.formula.git import GitFormula
+from sprinter.manifest import Manifest
+
+test_manifest = """
+[config]
+namespace = fingerprint
+
+[sub]
+formula = sprinter.formula.git
+url = git://github.com/Toumorokoshi/sub.git
+rc = . %(sub:url)s
+"""
+
+
+class TestFingerprint(object):
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.manifest = Manifest(StringIO(test_manifest))
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_feature_fingerprint_is_stable(self):
+        """ The same feature config should always have the same fingerprint """
+        tools.eq_(fingerprint_feature(self.manifest.get_feature_config('sub'), 'sprinter.formula.git'),
+                  fingerprint_feature(Manifest(StringIO(test_manifest)).get_feature_config('sub'),
+                                      'sprinter.formula.git'))
+
+    def test_feature_fingerprint_changes(self):
+        """ A change in a specialized value or the formula should change the fingerprint """
+        feature_config = self.manifest.get_feature_config('sub')
+        original = fingerprint_feature(feature_config, 'sprinter.formula.git')
+        assert original != fingerprint_feature(feature_config, 'sprinter.formulabase')
+        feature_config.set('url', 'git://github.com/Toumorokoshi/other.git')
+        assert original != fingerprint_feature(feature_config, 'sprinter.formula.git')
+
+    def test_feature_fingerprint_formula_version(self):
+        """ Upgrading the distribution of a formula should change the fingerprint """
+        feature_config = self.manifest.get_feature_config('sub')
+        with patch('sprinter.fingerprint._versions', {}):
+            with patch('sprinter.fingerprint._distribution_version', return_value='1.0') as lookup:
+                original = fingerprint_feature(feature_config, 'sprinter.formula.git', GitFormula)
+                tools.eq_(formula_version(GitFormula), '1.0')
+            lookup.assert_called_once_with('sprinter')
+        with patch('sprinter.fingerprint._versions', {}):
+            with patch('sprinter.fingerprint._distribution_version', return_value='1.1'):
+                assert original != fingerprint_feature(feature_config, 'sprinter.formula.git', GitFormula)
+
+    def test_manifest_fingerprint_changes(self):
+        """ A change in the manifest should change the manifest fingerprint """
+        original = fingerprint_manifest(self.manifest)
+        tools.eq_(original, fingerprint_manifest(Manifest(StringIO(test_manifest))))
+        self.manifest.set('sub', 'branch', 'develop')
+        assert original != fingerprint_manifest(self.manifest)
+
+    def test_store_roundtrip(self):
+        """ A written store should be read back with the same fingerprints and content """
+        path = os.path.join(self.temp_dir, 'fingerprints.json')
+        store = FingerprintStore(path)
+        store.manifest_fingerprint = 'abc'
+        store.set('sub', 'sprinter.formula.git', '123', env=['export A=b'],
+                  injections={'~/.ssh/config': ['Host sub']})
+        store.write()
+        store = FingerprintStore(path)
+        tools.eq_(store.manifest_fingerprint, 'abc')
+        assert store.unchanged('sub', 'sprinter.formula.git', '123')
+        assert not store.unchanged('sub', 'sprinter.formula.git', '456')
+        assert not store.unchanged('sub', 'sprinter.formulabase', '123')
+        tools.eq_(store.content('sub'), (['export A=b'], [], {'~/.ssh/config': ['Host sub']}))
+
+    def test_corrupt_store(self):
+        """ A corrupt store should be treated as empty """
+        path = os.path.join(self.temp_dir, 'fingerprints.json')
+        with open(path, 'w+') as fh:
+            fh.write("{not json")
+        store = FingerprintStore(path)
+        tools.eq_(store.features, {})
+        tools.eq_(store.manifest_fingerprint, None)
@@ -12,6 +12,7 @@ activate=echo 'activating...'
 deactivate=echo 'deactivating...'
 """
 from __future__ import unicode_literals
+from sprinter.core import PHASE
 from sprinter.formulabase import FormulaBase
 import sprinter.lib as lib
 
@@ -42,6 +43,12 @@ class CommandFormula(FormulaBase):
         self.__run_command('deactivate', 'source')
         FormulaBase.deactivate(self)
 
+    def commands(self):
+        phase = self.sync_phase()
+        config = self.source if phase == PHASE.REMOVE else self.target
+        commands = [config.get(phase.name)] if config.has(phase.name) else []
+        return commands + FormulaBase.commands(self)
+
     def __run_command(self, command_type, manifest_type):
         config = getattr(self, manifest_type)
         if config.has(command_type):
@@ -13,8 +13,8 @@ import os
 import re
 
 import sprinter.lib as lib
+from sprinter.core import PHASE
 from sprinter.formulabase import FormulaBase
-from sprinter.virtualenv import create_environment as create_virtualenv
 
 # a list of regex's that should no be symlinked to the bin path
 BLACKLISTED_EXECUTABLES = [
@@ -29,6 +29,8 @@ class EggscriptFormula(FormulaBase):
     valid_options = FormulaBase.valid_options + ['egg', 'eggs', 'redownload']
 
     def install(self):
+        # the vendored virtualenv is large: it is only imported by an install
+        from sprinter.virtualenv import create_environment as create_virtualenv
         create_virtualenv(self.directory.install_directory(self.feature_name))
         self.__install_eggs(self.target)
         self.__add_paths(self.target)
@@ -48,6 +50,17 @@ class EggscriptFormula(FormulaBase):
                 self.logger.warn("No eggs will be installed! 'egg' or 'eggs' parameter not set!")
         return FormulaBase.validate(self)
                 
+    def commands(self):
+        phase = self.sync_phase()
+        commands = []
+        if (phase == PHASE.INSTALL or
+           (phase == PHASE.UPDATE and
+            (self.source.get('egg', '') != self.target.get('egg', '') or
+             self.source.get('eggs', '') != self.target.get('eggs', '') or
+             self.target.is_affirmative('redownload', False)))):
+            commands += ["bin/pip install -r requirements.txt --upgrade"]
+        return commands + FormulaBase.commands(self)
+
     def __install_eggs(self, config):
         """ Install eggs for a particular configuration """
         eggs = []
@@ -11,6 +11,7 @@ from __future__ import unicode_literals
 import logging
 import os
 
+from sprinter.core import PHASE
 from sprinter.formulabase import FormulaBase
 import sprinter.lib as lib
 
@@ -57,21 +58,63 @@ class GitFormula(FormulaBase):
                 self.__clone_repo(self.target.get('url'),
                                   target_directory,
                                   branch=target_branch)
-            os.chdir(target_directory)
             error, output = lib.call("git pull origin %s" % target_branch,
+                                     cwd=target_directory,
                                      output_log_level=logging.DEBUG)
             if error:
                 self.logger.info(output)
                 raise GitException("An error occurred when pulling!")
         FormulaBase.update(self)
 
+    def commands(self):
+        phase = self.sync_phase()
+        target_directory = self.directory.install_directory(self.feature_name)
+        commands = []
+        if phase == PHASE.INSTALL:
+            commands += self.__clone_commands(self.target.get('url'), target_directory,
+                                              self.target.get('branch', 'master'))
+        elif phase == PHASE.UPDATE:
+            target_branch = self.target.get('branch', 'master')
+            if (self.target.get('url') != self.source.get('url') or
+               not os.path.exists(target_directory)):
+                commands += self.__clone_commands(self.target.get('url'), target_directory,
+                                                  target_branch)
+            elif self.source.get('branch', 'master') != target_branch:
+                commands += ["git fetch origin %s" % target_branch,
+                             "git checkout %s" % target_branch]
+            else:
+                commands += ["git pull origin %s" % target_branch]
+        return commands + FormulaBase.commands(self)
+
+    def fetch(self):
+        """
+        Fetch the target branch into an existing clone, so the update
+        only has to merge it. The working tree is not modified.
+        """
+        if self.sync_phase() != PHASE.UPDATE or not lib.which('git'):
+            return
+        target_directory = self.directory.install_directory(self.feature_name)
+        if self.target.get('url') == self.source.get('url') and os.path.exists(target_directory):
+            error, output = lib.call("git fetch origin %s" % self.target.get('branch', 'master'),
+                                     cwd=target_directory,
+                                     output_log_level=logging.DEBUG)
+            if error:
+                self.logger.debug("Unable to fetch %s ahead of its update: %s" % (self.feature_name, output))
+
+    def __clone_commands(self, repo_url, target_directory, branch):
+        commands = ["git clone %s %s" % (repo_url, target_directory)]
+        if branch != "master":
+            commands += ["git fetch origin %s" % branch, "git checkout %s" % branch]
+        return commands
+
     def __checkout_branch(self, target_directory, branch):
         self.logger.debug("Checking out branch %s..." % branch)
-        os.chdir(target_directory)
         error, output = lib.call("git fetch origin %s" % branch,
+                                 cwd=target_directory,
                                  output_log_level=logging.DEBUG)
         if not error:
             error, output = lib.call("git checkout %s" % branch,
+                                     cwd=target_directory,
                                      output_log_level=logging.DEBUG)
         if error:
             self.logger.info(output)
@@ -52,5 +52,18 @@ class TestGitFormula(FormulaTest):
         """ The git formula should call a clone to a git repo """
         call_mock.return_value = (0, '')
         self.environment.run_feature('update', 'sync')
-        call_mock.assert_any_call("git fetch origin develop", output_log_level=logging.DEBUG)
-        call_mock.assert_any_call("git checkout develop", output_log_level=logging.DEBUG)
+        target_directory = self.directory.install_directory('update')
+        call_mock.assert_any_call("git fetch origin develop", cwd=target_directory,
+                                  output_log_level=logging.DEBUG)
+        call_mock.assert_any_call("git checkout develop", cwd=target_directory,
+                                  output_log_level=logging.DEBUG)
+
+    @patch.object(lib, 'call')
+    def test_commands(self, call_mock):
+        """ The git formula should plan the commands it would run, without running them """
+        target_directory = self.directory.install_directory('update')
+        simple_example = self.environment._feature_dict[('simple_example', 'sprinter.formula.git')]
+        update = self.environment._feature_dict[('update', 'sprinter.formula.git')]
+        assert simple_example.commands() == ["git clone %s %s" % (vals['repoA'], target_directory)]
+        assert update.commands() == ["git fetch origin develop", "git checkout develop"]
+        assert not call_mock.called
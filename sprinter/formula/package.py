@@ -6,6 +6,7 @@ formula = sprinter.formula.package
 apt-get = git
 brew = git
 """
+from sprinter.core import PHASE
 from sprinter.formulabase import FormulaBase
 import sprinter.lib as lib
 import logging
@@ -36,18 +37,35 @@ class PackageFormula(FormulaBase):
             self.__install_package(self.target)
         FormulaBase.update(self)
 
+    def commands(self):
+        phase = self.sync_phase()
+        commands = []
+        if phase in (PHASE.INSTALL, PHASE.UPDATE):
+            self.__get_package_manager()
+            if (self.package_manager and self.target.has(self.package_manager) and
+               (phase == PHASE.INSTALL or
+                self.source.get(self.package_manager) != self.target.get(self.package_manager))):
+                commands += [self.__install_command(self.target)]
+        return commands + FormulaBase.commands(self)
+
     def __install_package(self, config):
         if self.package_manager and config.has(self.package_manager):
             package = config.get(self.package_manager)
             self.logger.info("Installing %s..." % package)
-            call_command = "%s%s install %s" % (self.package_manager, self.args, package)
-            if self.sudo_required:
-                call_command = "sudo " + call_command
+            call_command = self.__install_command(config)
             self.logger.debug("Calling command: %s" % call_command)
             # it's not possible to retain remember sudo privileges across shells unless they pipe
             # to STDOUT. Nothing we can do about that for now.
             lib.call(call_command, output_log_level=logging.DEBUG, stdout=None)
 
+    def __install_command(self, config):
+        """ Return the command that installs the package in config """
+        call_command = "%s%s install %s" % (self.package_manager, self.args,
+                                            config.get(self.package_manager))
+        if self.sudo_required:
+            call_command = "sudo " + call_command
+        return call_command
+
     def __get_package_manager(self):
         """
         Installs and verifies package manager
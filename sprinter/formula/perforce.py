@@ -20,6 +20,7 @@ import os
 import re
 import shutil
 import sprinter.lib as lib
+from sprinter import downloadcache
 from sprinter.core import PHASE
 from sprinter.formulabase import FormulaBase
 
@@ -137,6 +138,21 @@ class PerforceFormula(FormulaBase):
             raise PerforceFormulaException("Version %s in not supported by perforce formula!\n" % version +
                                            "Supported versions are: %s" % ", ".join(package_dict.keys()))
         
+    def downloads(self):
+        phase = self.sync_phase()
+        if (self.system.is64bit() and
+           (phase == PHASE.INSTALL or
+            (phase == PHASE.UPDATE and
+             self.source.get('version', 'r13.2') != self.target.get('version', 'r13.2')))):
+            key = 'osx' if self.system.isOSX() else 'linux'
+            perforce_packages = package_dict[self.target.get('version', 'r13.2')][key]
+            return [url_prefix + perforce_packages['p4'], url_prefix + perforce_packages['p4v']]
+        return []
+
+    def fetch(self):
+        for url in self.downloads():
+            downloadcache.prefetch(url)
+
     def __install_perforce(self, config):
         """ install perforce binary """
         if not self.system.is64bit():
@@ -150,7 +166,8 @@ class PerforceFormula(FormulaBase):
             os.makedirs(d)
         self.logger.info("Downloading p4 executable...")
         with open(os.path.join(d, "p4"), 'wb+') as fh:
-            fh.write(lib.cleaned_request('get', url_prefix + perforce_packages['p4']).content)
+            with downloadcache.open_url(url_prefix + perforce_packages['p4']) as source:
+                shutil.copyfileobj(source, fh)
         self.directory.symlink_to_bin("p4", os.path.join(d, "p4"))
         self.p4_command = os.path.join(d, "p4")
         self.logger.info("Installing p4v...")
@@ -206,7 +223,6 @@ class PerforceFormula(FormulaBase):
         self.logger.info("Configuring p4 client...")
         client_dict = config.to_dict()
         client_dict['root_path'] = os.path.expanduser(config.get('root_path'))
-        os.chdir(client_dict['root_path'])
         client_dict['hostname'] = self.system.node
         client_dict['p4view'] = config['p4view'] % self.environment.target.get_context_dict()
         client = re.sub('//depot', '    //depot', p4client_template % client_dict)
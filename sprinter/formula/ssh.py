@@ -10,6 +10,10 @@ hostname = github.com
 user = toumorokoshi
 create = false
 install_command = echo 'hello'
+
+The host configs of every ssh feature are staged into the
+environment's single ~/.ssh/config block, which is written once when
+the environment is finalized.
 """
 import os
 import logging
@@ -69,6 +73,19 @@ class SSHFormula(FormulaBase):
     def activate(self):
         self.__install_ssh_config(self.source)
 
+    def commands(self):
+        phase = self.sync_phase()
+        commands = []
+        if phase in (PHASE.INSTALL, PHASE.UPDATE):
+            config = self.target
+            cwd = config.get('ssh_path', self.directory.install_directory(self.feature_name))
+            if ((not config.has('create') or config.is_affirmative('create')) and
+               not os.path.exists(os.path.join(cwd, config.get('keyname')))):
+                commands += ["ssh-keygen -t %(type)s -f %(keyname)s -N  " % config.to_dict()]
+            if phase == PHASE.INSTALL and config.has('install_command'):
+                commands += [config.get('install_command')]
+        return commands
+
     def __generate_key(self, config):
         """
         Generate the ssh key, and return the ssh config location
@@ -98,7 +115,6 @@ class SSHFormula(FormulaBase):
                     self.injections.inject(ssh_config_path, ssh_config_injection)
             else:
                 self.injections.inject(ssh_config_path, ssh_config_injection)
-            self.injections.commit()
 
     def __call_command(self, command, ssh_path):
         ssh_path += ".pub"  # make this the public key
@@ -5,6 +5,7 @@ inputs = username
          password
 formula = sprinter.formulas.template
 source = http://mywebsite.com/.gitignore
+sha256 = (optional) the sha256 the source must match
 target = ~/.gitignore
 username = %(config:username)s
 password = %(config:mywebsitepassword)s
@@ -14,12 +15,14 @@ import os
 
 from sprinter.formulabase import FormulaBase
 import sprinter.lib as lib
+from sprinter import downloadcache
 from sprinter.core import PHASE
 
 
 class TemplateFormula(FormulaBase):
 
     required_options = FormulaBase.required_options + ['source', 'target']
+    valid_options = FormulaBase.valid_options + ['sha256']
 
     def prompt(self):
         if self.environment.phase == PHASE.REMOVE:
@@ -50,6 +53,21 @@ class TemplateFormula(FormulaBase):
                                  "both required to authenticate to a source!")
         FormulaBase.validate(self)
 
+    def downloads(self):
+        phase = self.sync_phase()
+        if (phase == PHASE.INSTALL or
+           (phase == PHASE.UPDATE and self.target.is_affirmative('on_update', False))):
+            if self.target.get('source').startswith("http"):
+                return [self.target.get('source')]
+        return []
+
+    def fetch(self):
+        # authenticated sources are not cached
+        if not (self.target.has('username') and self.target.has('password')):
+            sha256 = self.target.get('sha256') if self.target.has('sha256') else None
+            for url in self.downloads():
+                downloadcache.prefetch(url, sha256=sha256)
+
     def __install_file(self, config):
         source = config.get('source')
         if source.startswith("http"):
@@ -58,7 +76,9 @@ class TemplateFormula(FormulaBase):
                                                             config.get('password'),
                                                             source).decode("utf-8")
             else:
-                source_content = lib.cleaned_request('get', source).text
+                sha256 = config.get('sha256') if config.has('sha256') else None
+                with downloadcache.open_url(source, sha256=sha256) as fh:
+                    source_content = fh.read().decode('utf-8')
         else:
             source_content = open(os.path.expanduser(source)).read()
         target_file = os.path.expanduser(config.get('target'))
@@ -7,11 +7,14 @@ executable = bin/go
 symlink = go
 remove_common_prefix = true
 url = https://go.googlecode.com/files/go1.1.linux-amd64.tar.gz
+sha256 = (optional) the sha256 the archive must match
 target = /tmp/
 """
 
 import os
 
+from sprinter import downloadcache
+from sprinter.core import PHASE
 from sprinter.formulabase import FormulaBase
 from sprinter.exceptions import ExtractException
 from sprinter.directory import DirectoryException
@@ -26,7 +29,7 @@ class UnpackFormula(FormulaBase):
     """ A sprinter formula for unpacking a compressed package and extracting it"""
 
     valid_options = FormulaBase.valid_options + ['executable', 'symlink', 'target',
-                                                 'remove_common_prefix', 'type']
+                                                 'remove_common_prefix', 'type', 'sha256']
     required_options = FormulaBase.required_options + ['url']
 
     def install(self):
@@ -72,25 +75,37 @@ class UnpackFormula(FormulaBase):
                     pass
         FormulaBase.remove(self)
 
+    def downloads(self):
+        phase = self.sync_phase()
+        if (phase == PHASE.INSTALL or
+           (phase == PHASE.UPDATE and self.source.get('url') != self.target.get('url'))):
+            return [self.target.get('url')]
+        return []
+
+    def fetch(self):
+        sha256 = self.target.get('sha256') if self.target.has('sha256') else None
+        for url in self.downloads():
+            downloadcache.prefetch(url, sha256=sha256)
+
     def __install(self, config):
         remove_common_prefix = (config.has('remove_common_prefix') and
                                 config.is_affirmative('remove_common_prefix'))
         destination = config.get('target', self.directory.install_directory(self.feature_name))
+        kwargs = {'remove_common_prefix': remove_common_prefix}
+        if config.has('sha256'):
+            kwargs['sha256'] = config.get('sha256')
         try:
             if config.get('type', config.get('url')).endswith("tar.gz"):
-                lib.extract_targz(config.get('url'), destination,
-                                  remove_common_prefix=remove_common_prefix)
+                lib.extract_targz(config.get('url'), destination, **kwargs)
 
             elif config.get('type', config.get('url')).endswith("zip"):
-                lib.extract_zip(config.get('url'), destination,
-                                remove_common_prefix=remove_common_prefix)
+                lib.extract_zip(config.get('url'), destination, **kwargs)
 
             elif config.get('type', config.get('url')).endswith("dmg"):
                 if not self.system.isOSX():
                     self.logger.warn("Non OSX based distributions can not install a dmg!")
                 else:
-                    lib.extract_dmg(config.get('url'), destination,
-                                    remove_common_prefix=remove_common_prefix)
+                    lib.extract_dmg(config.get('url'), destination, **kwargs)
         except ExtractException:
             self.logger.warn("Unable to extract file for feature %s" % self.feature_name)
 
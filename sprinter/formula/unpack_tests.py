@@ -2,6 +2,7 @@ from __future__ import unicode_literals
 from mock import Mock, patch
 from sprinter.testtools import FormulaTest
 import sprinter.lib as lib
+from sprinter import downloadcache
 
 TEST_TARGZ = "http://github.com/toumorokoshi/sprinter/tarball/master"
 TEST_ZIP = "http://iterm2.com/downloads/stable/iTerm2_v1_0_0.zip"
@@ -56,3 +57,15 @@ class TestUnpackFormula(FormulaTest):
         """ Test the targz extracting to a specific target """
         self.environment.run_feature("targz_with_target", 'sync')
         extract_targz.assert_called_with(TEST_TARGZ, '/testpath', remove_common_prefix=False)
+
+    def test_downloads(self):
+        """ An unpack install should plan to download the url """
+        instance = self.environment._feature_dict[('targz_with_target', 'sprinter.formula.unpack')]
+        assert instance.downloads() == [TEST_TARGZ]
+
+    @patch.object(downloadcache, 'prefetch')
+    def test_fetch(self, prefetch):
+        """ An unpack install should prefetch the url into the download cache """
+        instance = self.environment._feature_dict[('targz_with_target', 'sprinter.formula.unpack')]
+        instance.fetch()
+        prefetch.assert_called_with(TEST_TARGZ, sha256=None)
@@ -3,16 +3,42 @@
 Formula base is an abstract base class outlining the method required
 and some documentation on what they should provide.
 """
+import inspect
 import os
 
+from six import with_metaclass
+
 from sprinter.core import LOGGER, PHASE
 from sprinter.exceptions import FormulaException
 import sprinter.lib as lib
 
+# the methods FormulaBase implements as a no-op: a feature whose formula
+# does not override one of them is skipped when it would be run.
+NOOP_METHODS = ('prompt', 'fetch', 'activate', 'deactivate')
+
+
+class FormulaMeta(type):
+    """
+    Records which of the public FormulaBase methods a formula class
+    overrides when the class is created, in overridden_methods.
+    """
 
-class FormulaBase(object):
+    def __init__(cls, name, bases, namespace):
+        super(FormulaMeta, cls).__init__(name, bases, namespace)
+        base = globals().get('FormulaBase')
+        if base is None:
+            # FormulaBase itself
+            cls.overridden_methods = frozenset()
+        else:
+            cls.overridden_methods = frozenset(
+                method for method, value in vars(base).items()
+                if inspect.isfunction(value) and not method.startswith('_')
+                and getattr(cls, method) != getattr(base, method))
 
-    valid_options = ['rc', 'env', 'command', 'systems', 'depends', 'inputs']
+
+class FormulaBase(with_metaclass(FormulaMeta, object)):
+
+    valid_options = ['rc', 'lazy_rc', 'env', 'command', 'systems', 'depends', 'inputs']
     required_options = ['formula']
 
     def __init__(self, environment, feature_name, source=None, target=None, logger=LOGGER):
@@ -59,7 +85,11 @@ class FormulaBase(object):
         if self.target.has('env'):
             self.directory.add_to_env(self.target.get('env'))
         if self.target.has('rc'):
-            self.directory.add_to_rc(self.target.get('rc'))
+            lazy_commands = self._lazy_rc_commands()
+            if lazy_commands:
+                self.directory.add_to_rc(self.target.get('rc'), lazy_commands=lazy_commands)
+            else:
+                self.directory.add_to_rc(self.target.get('rc'))
         if self.target.has('command'):
             lib.call(self.target.get('command'), shell=True, cwd=cwd)
 
@@ -164,7 +194,68 @@ class FormulaBase(object):
             for k in (k for k in self.source.keys() if not self.target.has(k)):
                 self.target.set(k, self.source.get(k))
 
+    def fetch(self):
+        """
+        Fetch is called ahead of sync, to download what the sync
+        needs while other features are synced.
+
+        fetch is run concurrently with the fetches and syncs of other
+        features, regardless of their dependencies, so it must not
+        have any side effects beyond filling a cache, such as the
+        download cache. If it fails, the sync downloads on its own.
+        """
+
+    def downloads(self):
+        """
+        Return a list of the urls the sync would download.
+
+        downloads is called when planning a sync, so it must not
+        modify the filesystem or the feature configuration.
+        """
+        return []
+
+    def commands(self):
+        """
+        Return a list of the commands the sync would run.
+
+        commands is called when planning a sync, so it must not
+        modify the filesystem or the feature configuration.
+        """
+        if self.sync_phase() in (PHASE.INSTALL, PHASE.UPDATE) and self.target.has('command'):
+            return [self.target.get('command')]
+        return []
+
+    def _lazy_rc_commands(self):
+        """
+        Return the commands whose first use should load the rc, or an
+        empty list to load it on every shell start. lazy_rc is either a
+        list of commands, or true for the executables of the feature.
+        """
+        if not self.target.has('lazy_rc'):
+            return []
+        lazy_rc = self.target.get('lazy_rc').strip()
+        if lazy_rc.lower() in ('true', 'yes'):
+            commands = self.directory.feature_symlinks(self.feature_name)
+            if not commands:
+                self.logger.warn("%s has no executables to load its rc lazily!" % self.feature_name)
+            return commands
+        if lazy_rc.lower() in ('false', 'no', ''):
+            return []
+        return lazy_rc.replace(",", " ").split()
+
     def _log_error(self, message):
         """ Log an error for the feature """
         key = (self.feature_name, self.target.get('formula'))
         self.environment.log_feature_error(key, "ERROR: " + message)
+
+
+def overrides(formula, name):
+    """
+    Return true if formula, a formula class or instance, overrides the
+    FormulaBase method name.
+    """
+    formula_class = formula if isinstance(formula, type) else type(formula)
+    if isinstance(formula_class, FormulaMeta):
+        return name in formula_class.overridden_methods
+    default = getattr(FormulaBase, name)
+    return getattr(formula, name, default) != default
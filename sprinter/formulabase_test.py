@@ -1,7 +1,8 @@
 from __future__ import unicode_literals
 from mock import Mock, patch
+from nose import tools
 from sprinter.testtools import FormulaTest
-from sprinter.formulabase import FormulaBase
+from sprinter.formulabase import FormulaBase, overrides
 import sprinter.lib as lib
 
 source_config = """
@@ -12,6 +13,11 @@ target_config = """
 formula = sprinter.formulabase
 rc = teststring
 
+[install_with_lazy_rc]
+formula = sprinter.formulabase
+rc = teststring
+lazy_rc = tool, other-tool
+
 [install_with_command]
 formula = sprinter.formulabase
 command = echo 'helloworld'
@@ -44,6 +50,12 @@ class TestFormulaBase(FormulaTest):
         self.directory.add_to_rc.assert_called_once_with('teststring')
         call.called, "lib call was called when it was not specified"
 
+    @patch.object(lib, 'call')
+    def test_install_with_lazy_rc(self, call):
+        """ Test install with an rc loaded by commands """
+        self.environment.run_feature("install_with_lazy_rc", 'sync')
+        self.directory.add_to_rc.assert_called_once_with('teststring', lazy_commands=['tool', 'other-tool'])
+
     @patch.object(lib, 'call')
     def test_install_with_command(self, call):
         """ Test install with command """
@@ -72,3 +84,23 @@ class TestFormulaBase(FormulaTest):
         assert fb.should_run()
         self.system.isDebianBased = Mock(return_value=False)
         assert not fb.should_run()
+
+    def test_overridden_methods(self):
+        """ The methods a formula overrides should be recorded when the class is created """
+
+        class ParentFormula(FormulaBase):
+
+            def activate(self):
+                pass
+
+        class ChildFormula(ParentFormula):
+
+            def prompt(self):
+                pass
+
+        tools.eq_(FormulaBase.overridden_methods, frozenset())
+        tools.eq_(ParentFormula.overridden_methods, frozenset(['activate']))
+        tools.eq_(ChildFormula.overridden_methods, frozenset(['activate', 'prompt']))
+        assert overrides(ChildFormula, 'activate')
+        assert not overrides(ChildFormula, 'deactivate')
+        assert overrides(Mock(spec=FormulaBase), 'deactivate')
@@ -5,11 +5,24 @@ throughout files on the file system.
 These operations are batched and applied together with the commit
 command, or applied separately with the destructive_inject and
 destructive_clear..
+
+Committing several Injections together reads each file once, applies
+the operations of every Injections to it in memory, and only writes
+the file (atomically, through a temporary file) if its content
+changed, so an unchanged file keeps its mtime.
+
+The sprinter blocks of the files read during a run are indexed once,
+and the index is reused until the mtime or size of the file changes.
 """
 
 import logging
 import os
-import re
+import shutil
+import tempfile
+import threading
+
+from sprinter.structures import FeatureRecorder
+from sprinter.tracing import span
 
 
 class Injections(object):
@@ -25,23 +38,56 @@ class Injections(object):
     clear_set = set()  # list holding the filenames to clear injection from
 
     def __init__(self, wrapper, override=None, logger='sprinter'):
-        if override:
-            self.override_match = re.compile("(\n?#%s\n.*#%s\n)" % (override, override), re.DOTALL)
-        else:
-            self.override_match = None
+        self.override = "#%s" % override if override else None
         self.wrapper = "#%s" % wrapper
-        self.wrapper_match = re.compile("\n?#%s\n.*#%s\n" % (wrapper, wrapper), re.DOTALL)
         self.logger = logging.getLogger(logger)
         self.inject_dict = {}
         self.clear_set = set()
+        # features may stage injections from several threads at once
+        self._lock = threading.Lock()
+        self.recorder = FeatureRecorder()
 
     def inject(self, filename, content):
         """ add the injection content to the dictionary """
+        self.inject_many(filename, [content])
+
+    def inject_many(self, filename, contents):
+        """
+        add several injection contents for the same file to the dictionary,
+        in order. They are all written within the file's single block on commit.
+        """
         # ensure content always has one trailing newline
-        content = content.rstrip() + "\n"
-        if not filename in self.inject_dict:
-            self.inject_dict[filename] = ""
-        self.inject_dict[filename] += content
+        contents = [content.rstrip() + "\n" for content in contents]
+        for content in contents:
+            self.recorder.record(filename, content)
+        if not self.recorder.buffering():
+            self.__stage(filename, contents)
+
+    def record_feature(self, feature_name, buffer=False):
+        """
+        Record the injections staged from this thread as belonging to
+        feature_name. Pass None to stop recording. If buffer is set,
+        the injections are only staged by stage_recorded.
+        """
+        if feature_name is None:
+            self.recorder.stop()
+        else:
+            self.recorder.start(feature_name, buffer=buffer)
+
+    def recorded_content(self, feature_name):
+        """ Return a dictionary of filename to the content staged for feature_name """
+        return self.recorder.get(feature_name)
+
+    def stage_recorded(self, feature_name):
+        """ stage the injections recorded for feature_name """
+        for filename, contents in self.recorded_content(feature_name).items():
+            self.__stage(filename, contents)
+
+    def __stage(self, filename, contents):
+        with self._lock:
+            if not filename in self.inject_dict:
+                self.inject_dict[filename] = ""
+            self.inject_dict[filename] += "".join(contents)
 
     def clear(self, filename):
         """ add the file to the list of files to clear """
@@ -52,28 +98,26 @@ class Injections(object):
         for filename in self.inject_dict:
             self.clear_set.add(filename)
 
-    def commit(self):
-        """ commit the injections desired, overwriting any previous injections in the file. """
-        self.logger.debug("Starting injections...")
-        self.logger.debug("Injections dict is:")
-        self.logger.debug(self.inject_dict)
-        self.logger.debug("Clear list is:")
-        self.logger.debug(self.clear_set)
-        for filename, content in self.inject_dict.items():
-            self.logger.info("Injecting values into %s..." % filename)
-            self.destructive_inject(filename, content)
-        for filename in self.clear_set:
-            self.logger.info("Clearing injection from %s..." % filename)
-            self.destructive_clear(filename)
+    def commit(self, *others):
+        """
+        commit the injections desired, overwriting any previous injections in the file.
+        The injections of others are committed along with them, in order.
+        """
+        commit_all([self] + list(others), logger=self.logger)
+
+    def operations(self):
+        """ Return the staged operations, as (filename, content) to inject and (filename, None) to clear """
+        return list(self.inject_dict.items()) + [(filename, None) for filename in self.clear_set]
+
+    def apply(self, content, inject_string=None):
+        """ Return the content with inject_string injected, or the injection cleared if it is None """
+        if inject_string is None:
+            return self.clear_content(content)
+        return self.inject_content(content, inject_string)
 
     def injected(self, filename):
         """ Return true if the file has already been injected before. """
-        full_path = os.path.expanduser(filename)
-        if not os.path.exists(full_path):
-            return False
-        with open(full_path, 'r+') as fh:
-            contents = fh.read()
-        return self.wrapper_match.search(contents) is not None
+        return index_file(os.path.expanduser(filename)).has(self.wrapper)
 
     def destructive_inject(self, filename, content):
         """
@@ -81,39 +125,16 @@ class Injections(object):
         generally be run only during the commit phase, when no future
         injections will be done.
         """
-        full_path = self.__generate_file(filename)
-        with open(full_path, 'r') as f:
-            new_content = self.inject_content(f.read(), content)
-        with open(full_path, 'w+') as f:
-            f.write(new_content)
+        full_path = os.path.expanduser(filename)
+        _write_if_changed(full_path, self.inject_content(_read(full_path), content))
 
     def destructive_clear(self, filename):
-        full_path = self.__generate_file(filename)
-        with open(full_path, 'r') as f:
-            new_content = self.clear_content(f.read())
-        with open(full_path, 'w+') as f:
-            f.write(new_content)
-
-    def __generate_file(self, file_path):
-        """
-        Generate the file at the file_path desired. Creates any needed
-        directories on the way. returns the absolute path of the file.
-        """
-        file_path = os.path.expanduser(file_path)
-        if not os.path.exists(os.path.dirname(file_path)):
-            self.logger.debug("Directories missing! Creating directories for %s..." % file_path)
-            os.makedirs(os.path.dirname(file_path))
-        if not os.path.exists(file_path):
-            open(file_path, "w+").close()
-        return file_path
+        full_path = os.path.expanduser(filename)
+        _write_if_changed(full_path, self.clear_content(_read(full_path)))
 
     def in_noninjected_file(self, file_path, content):
         """ Checks if a string exists in the file, sans the injected """
-        if os.path.exists(file_path):
-            file_content = open(file_path).read()
-            file_content = self.wrapper_match.sub("", file_content)
-        else:
-            file_content = ""
+        file_content = index_file(os.path.expanduser(file_path)).without(self.wrapper)
         return file_content.find(content) != -1
 
     def inject_content(self, content, inject_string):
@@ -123,20 +144,17 @@ class Injections(object):
         satisfied or is None. Remove old instances of injects if they
         exist.
         """
-        content = self.wrapper_match.sub("", content)
-        if self.override_match:
-            sprinter_overrides = self.override_match.search(content)
-            if sprinter_overrides:
-                content = self.override_match.sub("", content)
-                sprinter_overrides = sprinter_overrides.groups()[0]
-            else:
-                sprinter_overrides = ""
+        content = BlockIndex(content).without(self.wrapper)
+        if self.override:
+            index = BlockIndex(content)
+            sprinter_overrides = index.first(self.override)
+            content = index.without(self.override)
         content += """
 %s
 %s
 %s
 """ % (self.wrapper, inject_string.rstrip(), self.wrapper)
-        if self.override_match:
+        if self.override:
             content += sprinter_overrides.rstrip() + "\n"
         return content
 
@@ -144,4 +162,158 @@ class Injections(object):
         """
         Clear the injected content from the content buffer, and return the results
         """
-        return self.wrapper_match.sub("", content)
+        return BlockIndex(content).without(self.wrapper)
+
+
+class BlockIndex(object):
+    """
+    The blocks of a text buffer, found with a single scan of its lines.
+    A block starts and ends with the same marker line (e.g. #WRAPPER),
+    and includes the blank line or final newline before its opening
+    marker. Each block ends at the first closing marker, so several
+    blocks of the same marker keep the text between them.
+    """
+
+    content = None  # the indexed text buffer
+    blocks = []  # (marker, start, end) offsets of every block, in order
+
+    def __init__(self, content):
+        self.content = content
+        self.blocks = []
+        self._without = {}
+        opened = {}
+        offset = 0
+        for line in content.splitlines(True):
+            marker = line.rstrip("\n")
+            if line.endswith("\n") and marker.startswith("#") and len(marker.split()) == 1:
+                if marker in opened:
+                    start, end = opened.pop(marker), offset + len(line)
+                    # the newline before a block separates it from the content
+                    # above, unless that would join two lines of content
+                    if start > 0 and (end == len(content) or start < 2 or content[start - 2] == "\n"):
+                        start -= 1
+                    self.blocks.append((marker, start, end))
+                else:
+                    opened[marker] = offset
+            offset += len(line)
+
+    def has(self, marker):
+        """ Return true if the buffer holds a block of marker """
+        return any(m == marker for m, _, _ in self.blocks)
+
+    def first(self, marker):
+        """ Return the first block of marker, or an empty string """
+        for m, start, end in self.blocks:
+            if m == marker:
+                return self.content[start:end]
+        return ""
+
+    def without(self, marker):
+        """ Return the buffer with every block of marker removed """
+        if marker not in self._without:
+            parts = []
+            position = 0
+            for m, start, end in self.blocks:
+                if m == marker:
+                    parts.append(self.content[position:start])
+                    position = end
+            parts.append(self.content[position:])
+            self._without[marker] = "".join(parts)
+        return self._without[marker]
+
+
+_indexes = {}  # full path -> ((mtime, size), BlockIndex) of the files read this run
+_indexes_lock = threading.Lock()
+
+
+def index_file(full_path):
+    """
+    Return the BlockIndex of the file at full_path. The index is reused
+    for as long as the mtime and size of the file are unchanged.
+    """
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        return BlockIndex("")
+    key = (getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_size)
+    with _indexes_lock:
+        cached = _indexes.get(full_path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    index = BlockIndex(_read(full_path))
+    with _indexes_lock:
+        _indexes[full_path] = (key, index)
+    return index
+
+
+def commit_all(injections_list, logger=logging.getLogger('sprinter')):
+    """
+    Commit the staged operations of every Injections in the list, in
+    order. Each file is read once, and only written if it changed.
+    """
+    operations = {}
+    order = []
+    for injections in injections_list:
+        for filename, inject_string in injections.operations():
+            full_path = os.path.expanduser(filename)
+            if full_path not in operations:
+                operations[full_path] = []
+                order.append(full_path)
+            operations[full_path].append((injections, inject_string))
+    with span('commit injections', wrappers=[i.wrapper for i in injections_list]) as args:
+        written = 0
+        for full_path in order:
+            original = index_file(full_path).content
+            content = original
+            for injections, inject_string in operations[full_path]:
+                if inject_string is None:
+                    logger.info("Clearing injection from %s..." % full_path)
+                else:
+                    logger.info("Injecting values into %s..." % full_path)
+                content = injections.apply(content, inject_string)
+            if _write_if_changed(full_path, content, original):
+                written += 1
+        args['files'] = len(order)
+        args['written'] = written
+
+
+def _read(full_path):
+    """ Return the content of the file at full_path, or an empty string if it does not exist """
+    if not os.path.exists(full_path):
+        return ""
+    with open(full_path, 'r') as fh:
+        return fh.read()
+
+
+def _write_if_changed(full_path, content, original=None):
+    """
+    Write content to the file at full_path through a temporary file,
+    unless it is unchanged. Symlinks are followed, and the mode of the
+    file is kept. Return true if the file was written.
+    """
+    if original is None:
+        original = _read(full_path)
+    if content == original:
+        return False
+    with _indexes_lock:
+        _indexes.pop(full_path, None)
+        _indexes.pop(os.path.realpath(full_path), None)
+    full_path = os.path.realpath(full_path)
+    directory = os.path.dirname(full_path)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".%s." % os.path.basename(full_path))
+    try:
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(content)
+        if os.path.exists(full_path):
+            shutil.copymode(full_path, temp_path)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(temp_path, 0o666 & ~umask)
+        os.rename(temp_path, full_path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+    return True
@@ -2,7 +2,9 @@ import os
 import shutil
 import tempfile
 
-from sprinter.injections import Injections
+from nose import tools
+
+from sprinter.injections import Injections, index_file
 
 TEST_CONTENT = """
 Testing abc.
@@ -99,6 +101,53 @@ class TestInjections(object):
         assert i.in_noninjected_file(self.temp_file_path, self.permanent_string)
         assert not i.in_noninjected_file(self.temp_file_path, self.test_injection)
 
+    def test_multiple_blocks(self):
+        """ Content between several blocks of the same wrapper should be kept """
+        i = Injections("testinjection")
+        content = "a\n#testinjection\nb\n#testinjection\nuser\n#testinjection\nc\n#testinjection\n"
+        tools.eq_(i.clear_content(content), "a\nuser")
+        with open(self.temp_file_path, 'w+') as fh:
+            fh.write(content)
+        assert i.in_noninjected_file(self.temp_file_path, "user")
+        assert not i.in_noninjected_file(self.temp_file_path, "b\n")
+
+    def test_index_is_reused_until_the_file_changes(self):
+        """ A file's index should be reused until the file is modified """
+        i = Injections("testinjection")
+        index = index_file(self.temp_file_path)
+        assert index_file(self.temp_file_path) is index
+        i.inject(self.temp_file_path, self.test_injection)
+        i.commit()
+        assert index_file(self.temp_file_path) is not index
+        assert i.injected(self.temp_file_path)
+        with open(self.temp_file_path, 'a') as fh:
+            fh.write("appended")
+        assert i.in_noninjected_file(self.temp_file_path, "appended")
+
+    def test_inject_many(self):
+        """ Several contents injected at once should be written in a single block """
+        i = Injections("testinjection")
+        i.record_feature("hosts")
+        i.inject_many(self.temp_file_path, ["Host a\n", "Host b"])
+        i.record_feature(None)
+        tools.eq_(i.recorded_content("hosts"), {self.temp_file_path: ["Host a\n", "Host b\n"]})
+        i.commit()
+        l = open(self.temp_file_path, 'r').read()
+        assert l.count("#testinjection") == 2
+        assert l.find("Host a\nHost b\n") != -1
+
+    def test_stage_recorded(self):
+        """ Buffered injections should only be staged by stage_recorded """
+        i = Injections("testinjection")
+        for name in ('second', 'first'):
+            i.record_feature(name, buffer=True)
+            i.inject(self.temp_file_path, "Host %s" % name)
+            i.record_feature(None)
+        tools.eq_(i.inject_dict, {})
+        i.stage_recorded('first')
+        i.stage_recorded('second')
+        tools.eq_(i.inject_dict, {self.temp_file_path: "Host first\nHost second\n"})
+
     def test_created(self):
         """ Test the injection creates a file if it does not exist """
         i = Injections("testinjection")
@@ -106,3 +155,44 @@ class TestInjections(object):
         i.inject(new_file, self.test_injection)
         i.commit()
         assert os.path.exists(new_file), "File was not generated on injection!"
+
+    def test_commit_together(self):
+        """ Injections committed together should all be applied to a file """
+        i = Injections("testinjection")
+        i_global = Injections("testglobals")
+        i.inject(self.temp_file_path, self.test_injection)
+        i_global.inject(self.temp_file_path, "global injection")
+        i.commit(i_global)
+        l = open(self.temp_file_path, 'r').read()
+        assert l.count(self.test_injection) == 1
+        assert l.count("global injection") == 1
+        assert l.find(self.permanent_string) != -1
+
+    def test_unchanged_file_is_not_written(self):
+        """ A file whose content is unchanged by a commit should not be written """
+        i = Injections("testinjection")
+        i.inject(self.temp_file_path, self.test_injection)
+        i.commit()
+        os.utime(self.temp_file_path, (0, 0))
+        i.commit()
+        assert os.path.getmtime(self.temp_file_path) == 0, "Unchanged file was written!"
+
+    def test_clear_does_not_create(self):
+        """ Clearing a file that does not exist should not create it """
+        i = Injections("testinjection")
+        new_file = os.path.join(self.temp_dir, "testnotcreated")
+        i.clear(new_file)
+        i.commit()
+        assert not os.path.exists(new_file), "File was generated on clear!"
+
+    def test_symlink_and_mode_are_kept(self):
+        """ A commit should write through symlinks, and keep the file's mode """
+        os.chmod(self.temp_file_path, 0o640)
+        link_path = os.path.join(self.temp_dir, "link")
+        os.symlink(self.temp_file_path, link_path)
+        i = Injections("testinjection")
+        i.inject(link_path, self.test_injection)
+        i.commit()
+        assert os.path.islink(link_path), "Symlink was replaced!"
+        assert open(self.temp_file_path).read().count(self.test_injection) == 1
+        assert os.stat(self.temp_file_path).st_mode & 0o777 == 0o640
@@ -1,10 +1,13 @@
 """Sprinter, an environment installation and management tool.
 Usage:
-  sprinter install <environment_source> [-avi -n <namespace> -u <username> -p <password> --allow-bad-certificate]
-  sprinter update <environment_name> [-ravi -u <username> -p <password> --allow-bad-certificate]
-  sprinter (remove | deactivate | activate) <environment_name> [-v]
+  sprinter install <environment_source> [-avi -n <namespace> -u <username> -p <password> -j <jobs> --allow-bad-certificate --trace <file> --resume --rollback]
+  sprinter update <environment_name> [-ravif -u <username> -p <password> -j <jobs> --allow-bad-certificate --trace <file>]
+  sprinter remove <environment_name> [-v -j <jobs> --trace <file>]
+  sprinter (deactivate | activate) <environment_name> [-v --trace <file>]
+  sprinter plan <environment_source> [-av -u <username> -p <password> --allow-bad-certificate --trace <file>]
   sprinter validate <environment_source> [-avi -u <username> -p <password> --allow-bad-certificate]
   sprinter environments
+  sprinter cache [--prune | --clear]
   sprinter (-h | --help)
 
 Options:
@@ -12,24 +15,31 @@ Options:
   -v, --verbose                             Sprinter output is verbose
   -n <namespace>, --namespace <namespace>   Explicitely specify a namespace to name the environment, on install
   -r, --reconfigure                         During an update, ask the user again for customization parameters
+  -f, --force                               During an update, sync every feature, even if it is unchanged
   -a, --auth                                When pulling environment configurations, attempt basic authentication
   -u <username>, --username <username>      When using basic authentication, this is the username used
   -p <password>, --password <password>      When using basic authentication, this is the password used
   --allow-bad-certificate                   Do not verify ssl certificates when pulling environment configurations
   -i, --ignore-errors                       Ignore errors in a formula
+  --resume                                  Continue a failed or interrupted install, without syncing the features it completed
+  --rollback                                Remove the environment if the install fails or is interrupted
+  -j <jobs>, --jobs <jobs>                  The number of features to sync at once [default: 1]
+  --prune                                   Remove the least recently used downloads until the cache fits its maximum size
+  --clear                                   Remove every cached download
+  --trace <file>                            Write a trace of the time spent in each phase, feature, command and download
+                                            to a file, in the Chrome trace event format (chrome://tracing)
 """
 
 import logging
 import os
 import signal
 import sys
+import time
 from docopt import docopt
 
 import sprinter.lib as lib
+from sprinter import tracing
 from sprinter.core import PHASE
-from sprinter.environment import Environment
-from sprinter.manifest import Manifest, ManifestException
-from sprinter.directory import Directory
 from sprinter.exceptions import SprinterException, BadCredentialsException
 
 
@@ -57,20 +67,37 @@ def error(message):
     exit()
 
 
-def parse_args(argv, Environment=Environment):
+def parse_args(argv, Environment=None):
     options = docopt(__doc__, argv=argv, version="Sprinter 1.0")
+    if options['environments']:
+        print_environments()
+        return
+    # the environment, manifest and their dependencies are only loaded
+    # by the commands that use them
+    from sprinter.directory import Directory
+    from sprinter.journal import Journal
+    from sprinter.manifest import Manifest, ManifestException
+    if Environment is None:
+        from sprinter.environment import Environment
     logging_level = logging.DEBUG if options['--verbose'] else logging.INFO
     # start processing commands
     env = Environment(logging_level=logging_level, ignore_errors=options['--ignore-errors'])
+    if options['--trace']:
+        tracing.TRACER.enable()
     try:
+        if options['--jobs']:
+            env.jobs = parse_jobs(options['--jobs'])
         if options['install']:
             target = options['<environment_source>']
 
             def handle_install_shutdown(signal, frame):
                 if env.phase == PHASE.INSTALL:
-                    print("Removing install...")
-                    env.directory.remove()
-                    env.clear_all()
+                    if env.rollback:
+                        print("Removing install...")
+                        env.directory.remove()
+                        env.clear_all()
+                    else:
+                        print("Run sprinter install with --resume to continue the install.")
                 signal_handler(signal, frame)
             signal.signal(signal.SIGINT, handle_install_shutdown)
             if options['--username'] or options['--auth']:
@@ -82,13 +109,21 @@ def parse_args(argv, Environment=Environment):
             env.target = target
             if options['--namespace']:
                 env.namespace = options['<namespace>']
-            env.install()
+            env.rollback = options['--rollback']
+            env.install(resume=options['--resume'])
 
         elif options['update']:
             target = options['<environment_name>']
             env.directory = Directory(target,
                                       sprinter_root=env.root,
                                       shell_util_path=env.shell_util_path)
+            # the manifest is only written once an installation finishes
+            manifest_path = env.directory.manifest_path
+            if (Journal(env.directory.journal_path).incomplete or
+               (os.path.exists(manifest_path) and not os.path.getsize(manifest_path))):
+                raise SprinterException("Environment %s was not fully installed! " % target +
+                                        "Run sprinter install with --resume to continue the installation, " +
+                                        "or sprinter remove %s to remove it." % target)
             env.source = Manifest(env.directory.manifest_path)
             use_auth = options['--username'] or options['--auth']
             if use_auth:
@@ -96,35 +131,71 @@ def parse_args(argv, Environment=Environment):
             env.target = Manifest(env.source.source(),
                                   username=options['<username>'] if use_auth else None,
                                   password=options['<password>'] if use_auth else None,
-                                  verify_certificate=(not options['--allow-bad-certificate']))
-            env.update(reconfigure=options['--reconfigure'])
+                                  verify_certificate=(not options['--allow-bad-certificate']),
+                                  cache_path=env.directory.remote_manifest_path)
+            env.update(reconfigure=options['--reconfigure'], force=options['--force'])
 
         elif options["remove"]:
             env.directory = Directory(options['<environment_name>'],
                                       sprinter_root=env.root,
                                       shell_util_path=env.shell_util_path)
-            env.source = Manifest(env.directory.manifest_path, namespace=options['<environment_name>'])
+            env.source = Manifest(env.directory.manifest_path, namespace=options['<environment_name>'],
+                                  snapshot_path=env.directory.snapshot_path)
             env.remove()
 
         elif options['deactivate']:
             env.directory = Directory(options['<environment_name>'],
                                       sprinter_root=env.root,
                                       shell_util_path=env.shell_util_path)
-            env.source = Manifest(env.directory.manifest_path, namespace=options['<environment_name>'])
+            env.source = Manifest(env.directory.manifest_path, namespace=options['<environment_name>'],
+                                  snapshot_path=env.directory.snapshot_path)
             env.deactivate()
 
         elif options['activate']:
             env.directory = Directory(options['<environment_name>'],
                                       sprinter_root=env.root,
                                       shell_util_path=env.shell_util_path)
-            env.source = Manifest(env.directory.manifest_path, namespace=options['<environment_name>'])
+            env.source = Manifest(env.directory.manifest_path, namespace=options['<environment_name>'],
+                                  snapshot_path=env.directory.snapshot_path)
             env.activate()
 
-        elif options['environments']:
-            SPRINTER_ROOT = os.path.expanduser(os.path.join("~", ".sprinter"))
-            for env in os.listdir(SPRINTER_ROOT):
-                if env != ".global":
-                    print(env)
+        elif options['plan']:
+            source = options['<environment_source>']
+            # a manifest path or url is planned as is, anything else may be an installed namespace
+            directory = None
+            if not os.path.exists(source) and '://' not in source:
+                directory = Directory(source,
+                                      sprinter_root=env.root,
+                                      shell_util_path=env.shell_util_path)
+            if directory and not directory.new:
+                # an installed environment is planned against its source
+                env.directory = directory
+                env.source = Manifest(directory.manifest_path)
+                source = env.source.source()
+            use_auth = options['--username'] or options['--auth']
+            if use_auth:
+                options = get_credentials(options, parse_domain(source) or source)
+            env.target = Manifest(source,
+                                  username=options['<username>'] if use_auth else None,
+                                  password=options['<password>'] if use_auth else None,
+                                  verify_certificate=(not options['--allow-bad-certificate']))
+            if env.target.namespace and not (directory and not directory.new):
+                # a manifest of an installed namespace is planned against its installed manifest
+                directory = Directory(env.target.namespace,
+                                      sprinter_root=env.root,
+                                      shell_util_path=env.shell_util_path)
+                if not directory.new:
+                    env.directory = directory
+                    env.source = Manifest(directory.manifest_path)
+            print_plan(env.plan())
+
+        elif options['cache']:
+            cache = env.download_cache
+            if options['--clear']:
+                cache.clear()
+            elif options['--prune']:
+                cache.prune()
+            print_cache(cache)
 
         elif options['validate']:
             if options['--username'] or options['--auth']:
@@ -155,6 +226,18 @@ def parse_args(argv, Environment=Environment):
         env.write_debug_log("/tmp/sprinter.log")
         if env.message_failure():
             env.logger.info(env.message_failure())
+    finally:
+        if options['--trace']:
+            tracing.TRACER.write(options['--trace'])
+            env.logger.info("Trace written to %s" % options['--trace'])
+
+
+def print_environments():
+    """ print the name of every installed environment """
+    SPRINTER_ROOT = os.path.expanduser(os.path.join("~", ".sprinter"))
+    for env in os.listdir(SPRINTER_ROOT):
+        if env != ".global":
+            print(env)
 
 
 def parse_domain(url):
@@ -164,6 +247,44 @@ def parse_domain(url):
         return domain_match.group()
 
 
+def parse_jobs(jobs):
+    """ parse the number of jobs, which must be a positive integer """
+    try:
+        jobs = int(jobs)
+    except ValueError:
+        jobs = 0
+    if jobs < 1:
+        raise SprinterException("--jobs must be a positive integer!")
+    return jobs
+
+
+def print_plan(plan):
+    """ print the actions of a plan, and a summary of them """
+    for index, action in enumerate(plan, start=1):
+        print("%d. %s %s (%s)" % (index, action['action'], action['feature'], action['formula']))
+        for url in action['downloads']:
+            print("     download: %s" % url)
+        for command in action['commands']:
+            print("     command: %s" % command)
+        for error in action['errors']:
+            print("     %s" % error)
+    changes = len([a for a in plan if a['action'] not in ('unchanged', 'skip')])
+    if changes:
+        print("%d feature(s) to install, update or remove." % changes)
+    else:
+        print("No changes.")
+
+
+def print_cache(cache):
+    """ print the entries of the download cache, most recently used first """
+    megabyte = 1024.0 * 1024
+    for url, entry in cache.entries():
+        print("%8.1f MB  %s  %s" % (entry['size'] / megabyte,
+                                   time.strftime("%Y-%m-%d %H:%M", time.localtime(entry['accessed'])),
+                                   url))
+    print("%.1f MB of %.1f MB used in %s" % (cache.size() / megabyte, cache.max_size / megabyte, cache.path))
+
+
 def get_credentials(options, environment):
     """ Get credentials or prompt for them from options """
     if options['--username'] or options['--auth']:
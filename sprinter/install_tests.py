@@ -6,6 +6,8 @@ import logging
 import tempfile
 import shutil
 import os
+import subprocess
+import sys
 from mock import call, patch
 
 from sprinter.install import parse_args, parse_domain
@@ -53,7 +55,7 @@ class TestInstall(unittest.TestCase):
         """ Test if install calls the proper methods """
         args = ['install', 'http://www.google.com']
         calls = [call(logging_level=logging.INFO, ignore_errors=False),
-                 call().install()]
+                 call().install(resume=False)]
         parse_args(args, Environment=environment)
         environment.assert_has_calls(calls)
 
@@ -68,6 +70,44 @@ class TestInstall(unittest.TestCase):
         parse_args(args, Environment=environment)
         environment.assert_has_calls(calls)
 
+    @patch('sprinter.environment.Environment')
+    def test_plan_manifest_path(self, environment):
+        """ Planning from the absolute path of a manifest should plan that manifest """
+        environment.return_value.root = self.temp_dir
+        environment.return_value.plan.return_value = []
+        parse_args(['plan', self.temp_file_path], Environment=environment)
+        assert not environment.return_value.log_error.called
+        env = environment.return_value
+        self.assertEqual(env.target.source(), self.temp_file_path)
+        self.assertTrue(env.plan.called)
+
+    @patch('sprinter.environment.Environment')
+    def test_plan_manifest_path_installed(self, environment):
+        """ Planning a manifest whose namespace is installed should plan against the installed manifest """
+        environment.return_value.root = self.temp_dir
+        environment.return_value.plan.return_value = []
+        os.makedirs(os.path.join(self.temp_dir, "installed"))
+        with open(os.path.join(self.temp_dir, "installed", "manifest.cfg"), 'w+') as fh:
+            fh.write("[config]\nnamespace = installed\n")
+        with open(self.temp_file_path, 'w+') as fh:
+            fh.write("[config]\nnamespace = installed\n")
+        parse_args(['plan', self.temp_file_path], Environment=environment)
+        env = environment.return_value
+        self.assertEqual(env.target.source(), self.temp_file_path)
+        self.assertEqual(env.directory.root_dir, os.path.join(self.temp_dir, "installed"))
+        self.assertEqual(env.source.namespace, "installed")
+        self.assertTrue(env.plan.called)
+
+    @patch('sprinter.environment.Environment')
+    def test_update_partial_install(self, environment):
+        """ Updating an environment whose install did not finish should point to --resume """
+        environment.return_value.root = self.temp_dir
+        os.makedirs(os.path.join(self.temp_dir, "partial"))
+        open(os.path.join(self.temp_dir, "partial", "manifest.cfg"), 'w+').close()
+        parse_args(['update', 'partial'], Environment=environment)
+        assert not environment.return_value.update.called
+        assert '--resume' in environment.return_value.log_error.call_args[0][0]
+
     def test_parse_domain(self):
         """ Test if domains are properly parsed """
         match_tuples = [
@@ -78,3 +118,12 @@ class TestInstall(unittest.TestCase):
             self.assertEqual(parse_domain(in_string), out_string,
                              "%s did not result in %s! Resulted in %s instead."
                              % (in_string, out_string, parse_domain(in_string)))
+
+    def test_startup_imports(self):
+        """ Importing the cli or lib should not load requests, pip, virtualenv, the transport or the environment """
+        script = ("import sys, sprinter.install, sprinter.lib; "
+                  "print(' '.join(m for m in ('requests', 'pip', 'sprinter.virtualenv', 'sprinter.environment',"
+                  " 'sprinter.transport', 'sprinter.downloadcache')"
+                  " if m in sys.modules))")
+        output = subprocess.check_output([sys.executable, "-c", script])
+        self.assertEqual(output.decode('utf-8').strip(), "")
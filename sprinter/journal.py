@@ -0,0 +1,96 @@
+"""
+journal.py keeps a progress journal of an installation.
+
+Each feature synced by an install is appended to the journal as a
+line of json, along with its fingerprint and the env, rc and injection
+content it produced. If the install does not complete, the journal is
+left in the namespace directory, and the install can be resumed: the
+features the journal records as complete are not synced again.
+"""
+from __future__ import unicode_literals
+import json
+import os
+import threading
+
+
+class Journal(object):
+    """
+    The progress journal of an installation. If path is None, the
+    journal is kept in memory only.
+    """
+
+    path = None  # the path to the journal file
+    started = False  # true if an installation was started
+    finished = False  # true if the installation finished
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.__read(path)
+
+    @property
+    def incomplete(self):
+        """ Return true if an installation was started, but did not finish """
+        return self.started and not self.finished
+
+    def start(self):
+        """ start a new journal, forgetting every recorded feature """
+        with self._lock:
+            self.entries = {}
+            self.started, self.finished = True, False
+            self.__write({'event': 'start'}, mode='w+')
+
+    def record(self, feature_key, fingerprint, env=[], rc=[], injections={}):
+        """ record that a feature was synced """
+        name, formula = feature_key
+        entry = {'event': 'feature',
+                 'feature': name,
+                 'formula': formula,
+                 'fingerprint': fingerprint,
+                 'env': env,
+                 'rc': rc,
+                 'injections': injections}
+        with self._lock:
+            self.entries[feature_key] = entry
+            self.__write(entry)
+
+    def finish(self):
+        """ record that the installation finished """
+        with self._lock:
+            self.finished = True
+            self.__write({'event': 'finish'})
+
+    def completed(self, feature_key, fingerprint):
+        """ Return true if the feature was synced with the same fingerprint """
+        entry = self.entries.get(feature_key)
+        return entry is not None and entry['fingerprint'] == fingerprint
+
+    def content(self, feature_key):
+        """ Return the env, rc, and injection content recorded for the feature """
+        entry = self.entries.get(feature_key, {})
+        return (entry.get('env', []), entry.get('rc', []), entry.get('injections', {}))
+
+    def __write(self, entry, mode='a'):
+        if not self.path:
+            return
+        with open(self.path, mode) as fh:
+            fh.write(json.dumps(entry, sort_keys=True) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def __read(self, path):
+        with open(path) as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line may be partially written if sprinter was killed
+                    break
+                if entry['event'] == 'start':
+                    self.started = True
+                elif entry['event'] == 'finish':
+                    self.finished = True
+                elif entry['event'] == 'feature':
+                    self.entries[(entry['feature'], entry['formula'])] = entry
@@ -0,0 +1,61 @@
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+
+from nose import tools
+
+from sprinter.journal import Journal
+
+
+class TestJournal(object):
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'journal')
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_new_journal(self):
+        """ A journal that does not exist should not be incomplete """
+        journal = Journal(self.path)
+        assert not journal.incomplete
+        assert not journal.completed(('sub', 'sprinter.formula.git'), '123')
+
+    def test_incomplete_journal(self):
+        """ A journal that was started but not finished should be incomplete, with its features """
+        journal = Journal(self.path)
+        journal.start()
+        journal.record(('sub', 'sprinter.formula.git'), '123', env=['export A=b'])
+        journal = Journal(self.path)
+        assert journal.incomplete
+        assert journal.completed(('sub', 'sprinter.formula.git'), '123')
+        assert not journal.completed(('sub', 'sprinter.formula.git'), '456')
+        tools.eq_(journal.content(('sub', 'sprinter.formula.git')), (['export A=b'], [], {}))
+
+    def test_finished_journal(self):
+        """ A finished journal should not be incomplete """
+        journal = Journal(self.path)
+        journal.start()
+        journal.finish()
+        assert not Journal(self.path).incomplete
+
+    def test_start_forgets_features(self):
+        """ Starting a journal should forget the features of the previous install """
+        journal = Journal(self.path)
+        journal.start()
+        journal.record(('sub', 'sprinter.formula.git'), '123')
+        journal.start()
+        assert not Journal(self.path).completed(('sub', 'sprinter.formula.git'), '123')
+
+    def test_partial_line(self):
+        """ A partially written last line should be ignored """
+        journal = Journal(self.path)
+        journal.start()
+        journal.record(('sub', 'sprinter.formula.git'), '123')
+        with open(self.path, 'a') as fh:
+            fh.write('{"event": "feat')
+        journal = Journal(self.path)
+        assert journal.incomplete
+        assert journal.completed(('sub', 'sprinter.formula.git'), '123')
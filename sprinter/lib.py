@@ -4,11 +4,9 @@ features of the library.
 
 """
 import zipfile
-import gzip
 import logging
 import inspect
-import imp
-import io
+import importlib
 import os
 import re
 import shutil
@@ -16,7 +14,6 @@ import subprocess
 import sys
 import tarfile
 import tempfile
-import requests
 from io import StringIO
 
 from getpass import getpass
@@ -63,6 +60,7 @@ def get_subclass_from_module(module, parent_class):
 def call(command, stdin=None, stdout=PIPE, env=os.environ, cwd=None, shell=False,
          output_log_level=logging.INFO, logger=LOGGER, sensitive_info=False):
     """ Better, smarter call logic """
+    from sprinter.tracing import span
     logger.debug("calling command: %s" % command)
     try:
         args = command if shell else whitespace_smart_split(command)
@@ -71,9 +69,13 @@ def call(command, stdin=None, stdout=PIPE, env=os.environ, cwd=None, shell=False
             raise CommandMissingException(args[0])
         if shell:
             kw['shell'] = True
-        process = subprocess.Popen(args, stdin=PIPE, stdout=stdout, stderr=STDOUT,
-                                   env=env, cwd=cwd, **kw)
-        output = process.communicate(input=stdin)[0]
+        with span('call', category='subprocess',
+                  command="<sensitive>" if sensitive_info else command, cwd=cwd) as trace_args:
+            process = subprocess.Popen(args, stdin=PIPE, stdout=stdout, stderr=STDOUT,
+                                       env=env, cwd=cwd, **kw)
+            output = process.communicate(input=stdin)[0]
+            trace_args['returncode'] = process.returncode
+            trace_args['bytes'] = len(output) if output is not None else 0
         if output is not None:
             try:
                 logger.log(output_log_level, output.decode('utf-8'))
@@ -160,22 +162,43 @@ def authenticated_get(username, password, url, verify=True):
     """
     Perform an authorized query to the url, and return the result
     """
+    return authenticated_request(username, password, url, verify=verify).content
+
+
+def authenticated_request(username, password, url, verify=True, headers=None):
+    """
+    Perform an authorized get request to the url, and return the response
+    """
+    # requests is imported by the first request anyway: importing it here keeps it off startup
+    import requests
+    from sprinter import transport
+    from sprinter.tracing import span
     try:
-        response = requests.get(url, auth=(username, password), verify=verify)
+        with span('authenticated_get', category='http', url=url) as args:
+            response = transport.request('get', url, auth=(username, password),
+                                         verify=verify, headers=headers)
+            args['status'] = response.status_code
+            args['bytes'] = len(response.content)
         if response.status_code == 401:
             raise BadCredentialsException(
                 "Unable to authenticate user %s to %s with password provided!"
                 % (username, url))
     except requests.exceptions.SSLError:
         raise CertificateException("Unable to verify certificate at %s!" % url)
-    return response.content
+    return response
 
 def cleaned_request(request_type, *args, **kwargs):
-    """ Perform a cleaned requests request """
-    s = requests.Session()
-    # this removes netrc checking
-    s.trust_env = False
-    return s.request(request_type, *args, **kwargs)
+    """ Perform a request with the shared transport, which ignores netrc files """
+    # the transport and tracing are only imported by the commands that make requests
+    from sprinter import transport
+    from sprinter.tracing import span
+    with span('request', category='http', method=request_type,
+              url=args[0] if args else kwargs.get('url')) as trace_args:
+        response = transport.request(request_type, *args, **kwargs)
+        trace_args['status'] = response.status_code
+        if not kwargs.get('stream'):
+            trace_args['bytes'] = len(response.content)
+    return response
 
 
 def prompt(prompt_string, default=None, secret=False, boolean=False):
@@ -198,24 +221,12 @@ def prompt(prompt_string, default=None, secret=False, boolean=False):
 
 def __recursive_import(module_name):
     """
-    Recursively looks for and imports the names, returning the
-    module desired
-
-    >>> __recursive_import("sprinter.formulas.unpack") # doctest: +ELLIPSIS
-    <module 'unpack' from '...'>
+    Imports the module desired, and the packages containing it
 
-    currently module with relative imports don't work.
+    >>> __recursive_import("sprinter.formula.unpack") # doctest: +ELLIPSIS
+    <module 'sprinter.formula.unpack' from '...'>
     """
-    names = module_name.split(".")
-    path = None
-    module = None
-    while len(names) > 0:
-        if module:
-            path = module.__path__
-        name = names.pop(0)
-        (module_file, pathname, description) = imp.find_module(name, path)
-        module = imp.load_module(name, module_file, pathname, description)
-    return module
+    return importlib.import_module(module_name)
 
 
 def is_affirmative(phrase):
@@ -252,63 +263,101 @@ def which(program, cwd=None):
     return None
 
 
-def extract_targz(url, target_dir, remove_common_prefix=False, overwrite=False):
-    """ extract a targz and install to the target directory """
+def extract_targz(url, target_dir, remove_common_prefix=False, overwrite=False, sha256=None):
+    """
+    extract a targz and install to the target directory. If sha256 is
+    set, the downloaded file must match it.
+
+    The archive is extracted while it is downloaded, into a staging
+    directory that is moved into place once the archive is complete.
+    """
+    # the download cache is only imported by the commands that extract archives
+    from sprinter import downloadcache
+    from sprinter.tracing import span
     try:
         if not os.path.exists(target_dir):
             os.makedirs(target_dir)
-        gz = gzip.GzipFile(fileobj=io.BytesIO(requests.get(url).content))
-        tf = tarfile.TarFile(fileobj=gz)
-        if not os.path.exists(target_dir):
-            os.makedirs(target_dir)
-        common_prefix = os.path.commonprefix(tf.getnames())
-        if not common_prefix.endswith('/'):
-            common_prefix += "/"
-        for tfile in tf.getmembers():
+        stage_dir = tempfile.mkdtemp(prefix=".sprinter-extract-", dir=target_dir)
+        try:
+            names = []
+            with span('extract', category='extract', url=url, target=target_dir) as args:
+                args['bytes'] = 0
+                with downloadcache.stream_url(url, sha256=sha256) as fh:
+                    tf = tarfile.open(fileobj=fh, mode='r|*')
+                    for tfile in tf:
+                        names.append(tfile.name)
+                        tf.extract(tfile, stage_dir)
+                        args['bytes'] += tfile.size
+                    tf.close()
+            source_dir = stage_dir
             if remove_common_prefix:
-                tfile.name = tfile.name.replace(common_prefix, "", 1)
-            if tfile.name != "":
-                target_path = os.path.join(tfile, target_dir)
-                if target_path != target_dir and os.path.exists(target_path):
-                    if overwrite:
-                        remove_path(target_path)
-                    else:
-                        return
-                tf.extract(tfile, target_dir)
-    except OSError:
-        e = sys.exc_info()[1]
-        raise ExtractException(str(e))
-    except IOError:
+                common_prefix = os.path.commonprefix(names)
+                if os.path.isdir(os.path.join(stage_dir, common_prefix)):
+                    source_dir = os.path.join(stage_dir, common_prefix)
+            __move_contents(source_dir, target_dir, overwrite=overwrite,
+                            ignore=os.path.basename(stage_dir))
+        finally:
+            shutil.rmtree(stage_dir, ignore_errors=True)
+    except (OSError, IOError, tarfile.TarError):
         e = sys.exc_info()[1]
         raise ExtractException(str(e))
 
 
-def extract_zip(url, target_dir, remove_common_prefix=False, overwrite=False):
+def __move_contents(source_dir, target_dir, overwrite=False, ignore=None):
+    """
+    Move the contents of source_dir into target_dir. If a path
+    already exists in target_dir, nothing is moved unless overwrite
+    is set, in which case the existing path is replaced.
+    """
+    names = [name for name in os.listdir(source_dir) if name != ignore]
+    existing = [name for name in names if os.path.exists(os.path.join(target_dir, name))]
+    if existing and not overwrite:
+        return
+    for name in names:
+        target_path = os.path.join(target_dir, name)
+        if name in existing:
+            remove_path(target_path)
+        os.rename(os.path.join(source_dir, name), target_path)
+
+
+def extract_zip(url, target_dir, remove_common_prefix=False, overwrite=False, sha256=None):
+    """
+    extract a zip and install to the target directory. If sha256 is
+    set, the downloaded file must match it.
+    """
+    from sprinter import downloadcache
+    from sprinter.tracing import span
     try:
         if not os.path.exists(target_dir):
             os.makedirs(target_dir)
-        memory_file = io.BytesIO(requests.get(url).content)
-        zip_file = zipfile.ZipFile(memory_file)
-        common_prefix = os.path.commonprefix(zip_file.namelist())
-        for zip_file_info in zip_file.infolist():
-            target_path = zip_file_info.filename
-            if remove_common_prefix:
-                target_path = target_path.replace(common_prefix, "", 1)
-            if target_path != "":
-                target_path = os.path.join(target_dir, target_path)
-                if target_path != target_dir and os.path.exists(target_path):
-                    if overwrite:
-                        remove_path(target_path)
-                    else:
-                        return
-                zip_file.extract(zip_file_info, target_path)
+        # a zip is read from a file on disk rather than streamed, as its index is at its end
+        with downloadcache.open_url(url, sha256=sha256) as fh:
+            zip_file = zipfile.ZipFile(fh)
+            with span('extract', category='extract', url=url, target=target_dir) as args:
+                args['bytes'] = 0
+                common_prefix = os.path.commonprefix(zip_file.namelist())
+                for zip_file_info in zip_file.infolist():
+                    target_path = zip_file_info.filename
+                    if remove_common_prefix:
+                        target_path = target_path.replace(common_prefix, "", 1)
+                    if target_path != "":
+                        target_path = os.path.join(target_dir, target_path)
+                        if target_path != target_dir and os.path.exists(target_path):
+                            if overwrite:
+                                remove_path(target_path)
+                            else:
+                                return
+                        zip_file.extract(zip_file_info, target_path)
+                        args['bytes'] += zip_file_info.file_size
     except OSError:
         raise ExtractException()
     except IOError:
         raise ExtractException()
 
 
-def extract_dmg(url, target_dir, remove_common_prefix=False, overwrite=False):
+def extract_dmg(url, target_dir, remove_common_prefix=False, overwrite=False, sha256=None):
+    from sprinter import downloadcache
+    from sprinter.tracing import span
     if remove_common_prefix:
         raise Exception("Remove common prefix for zip not implemented yet!")
     tmpdir = tempfile.mkdtemp()
@@ -317,21 +366,23 @@ def extract_dmg(url, target_dir, remove_common_prefix=False, overwrite=False):
             os.makedirs(target_dir)
         temp_file = os.path.join(tmpdir, "temp.dmg")
         with open(temp_file, 'wb+') as fh:
-            fh.write(cleaned_request('get', url).content)
+            with downloadcache.open_url(url, sha256=sha256) as source:
+                shutil.copyfileobj(source, fh)
         call("hdiutil attach %s -mountpoint /Volumes/a/" % temp_file)
-        for f in os.listdir("/Volumes/a/"):
-            if not f.startswith(".") and f != ' ':
-                source_path = os.path.join("/Volumes/a", f)
-                target_path = os.path.join(target_dir, f)
-                if target_path != target_dir and os.path.exists(target_path):
-                    if overwrite:
-                        remove_path(target_path)
+        with span('extract', category='extract', url=url, target=target_dir):
+            for f in os.listdir("/Volumes/a/"):
+                if not f.startswith(".") and f != ' ':
+                    source_path = os.path.join("/Volumes/a", f)
+                    target_path = os.path.join(target_dir, f)
+                    if target_path != target_dir and os.path.exists(target_path):
+                        if overwrite:
+                            remove_path(target_path)
+                        else:
+                            return
+                    if os.path.isdir(source_path):
+                        shutil.copytree(source_path, target_path)
                     else:
-                        return
-                if os.path.isdir(source_path):
-                    shutil.copytree(source_path, target_path)
-                else:
-                    shutil.copy(source_path, target_path)
+                        shutil.copy(source_path, target_path)
     except OSError:
         raise ExtractException()
     except IOError:
@@ -0,0 +1,95 @@
+"""
+loader.py writes the global shell loaders, the only files sourced by
+the user's shell config files.
+
+loader.env holds utils.sh and the env content of every installed
+namespace, and loader.rc sources loader.env then holds the rc content
+of every installed namespace. A new shell reads one or two files
+however many namespaces are installed. Namespaces are loaded in the
+order of their names; the content of each one is already in the
+dependency order of its features.
+
+The content of a namespace is only run while its directory holds no
+.inactive marker, so activating or deactivating a namespace only
+toggles the marker, and does not regenerate the loaders.
+"""
+from __future__ import unicode_literals
+import os
+
+from sprinter.directory import INACTIVE_MARKER
+from sprinter.templates import loader_section_template, shell_utils_template, source_template
+
+LOADER_ENV = "loader.env"
+LOADER_RC = "loader.rc"
+
+
+def installed_namespaces(root):
+    """ Return the names of the namespaces installed under root """
+    if not os.path.isdir(root):
+        return []
+    return [namespace for namespace in sorted(os.listdir(root))
+            if not namespace.startswith('.')
+            and os.path.exists(os.path.join(root, namespace, "manifest.cfg"))]
+
+
+def _section(root, namespace, content):
+    """ Return the content of a namespace, only run while the namespace is active """
+    return loader_section_template % {'namespace': namespace,
+                                      'marker': os.path.join(root, namespace, INACTIVE_MARKER),
+                                      'content': content.rstrip() or ":"}
+
+
+def _script_content(path, header):
+    """ Return the content of the script at path without its header, or None if it does not exist """
+    if not os.path.exists(path):
+        return None
+    with open(path) as fh:
+        content = fh.read()
+    if content.startswith(header):
+        content = content[len(header):]
+    return content
+
+
+def loader_content(root, shell_util_path, loader_env_path):
+    """ Return the content of loader.env and loader.rc for the namespaces installed under root """
+    env = [shell_utils_template]
+    rc = [source_template % (loader_env_path, loader_env_path)]
+    for namespace in installed_namespaces(root):
+        env_path = os.path.join(root, namespace, ".env")
+        env_content = _script_content(env_path, source_template % (shell_util_path, shell_util_path))
+        if env_content is not None:
+            env.append(_section(root, namespace, env_content))
+        rc_content = _script_content(os.path.join(root, namespace, ".rc"),
+                                     source_template % (env_path, env_path))
+        if rc_content is not None:
+            rc.append(_section(root, namespace, rc_content))
+    return ("".join(env), "".join(rc))
+
+
+def _write_if_changed(path, content):
+    """ Write content to the file at path unless it already holds it. Return true if it was written. """
+    if os.path.exists(path):
+        with open(path) as fh:
+            if fh.read() == content:
+                return False
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w+') as fh:
+        fh.write(content)
+    os.rename(temp_path, path)
+    return True
+
+
+def write_loaders(root, global_path, shell_util_path):
+    """
+    Regenerate the loaders in global_path for the namespaces installed
+    under root. A loader whose content is unchanged is not written.
+    Return the paths of loader.env and loader.rc.
+    """
+    loader_env_path = os.path.join(global_path, LOADER_ENV)
+    loader_rc_path = os.path.join(global_path, LOADER_RC)
+    env, rc = loader_content(root, shell_util_path, loader_env_path)
+    if not os.path.exists(global_path):
+        os.makedirs(global_path)
+    _write_if_changed(loader_env_path, env)
+    _write_if_changed(loader_rc_path, rc)
+    return (loader_env_path, loader_rc_path)
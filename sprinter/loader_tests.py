@@ -0,0 +1,63 @@
+from __future__ import unicode_literals
+import os
+import shutil
+import subprocess
+import tempfile
+
+from nose import tools
+
+from sprinter.directory import Directory
+from sprinter.loader import installed_namespaces, write_loaders
+from sprinter.templates import source_template
+
+
+class TestLoader(object):
+
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.global_path = os.path.join(self.root, ".global")
+        self.shell_util_path = os.path.join(self.global_path, "utils.sh")
+        for namespace in ("b", "a"):
+            directory = Directory(namespace, sprinter_root=self.root, shell_util_path=self.shell_util_path)
+            directory.initialize()
+            directory.add_to_env("export %s_ENV=1" % namespace.upper())
+            directory.add_to_rc("%s_rc" % namespace)
+            directory.flush()
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def read(self, path):
+        with open(path) as fh:
+            return fh.read()
+
+    def test_loaders(self):
+        """ The loaders should hold the content of every namespace, without sourcing their scripts """
+        env_path, rc_path = write_loaders(self.root, self.global_path, self.shell_util_path)
+        env = self.read(env_path)
+        assert "__sprinter_prepend_path()" in env
+        assert env.index("export A_ENV=1") < env.index("export B_ENV=1")
+        assert self.shell_util_path not in env
+        rc = self.read(rc_path)
+        assert rc.startswith(source_template % (env_path, env_path))
+        assert rc.index("a_rc") < rc.index("b_rc")
+        assert ".env" not in rc.replace(env_path, "")
+
+    def test_inactive_namespace(self):
+        """ A deactivated namespace should not be loaded, without regenerating the loaders """
+        tools.eq_(installed_namespaces(self.root), ["a", "b"])
+        env_path, rc_path = write_loaders(self.root, self.global_path, self.shell_util_path)
+        script = ". %s; echo $A_ENV$B_ENV" % env_path
+        tools.eq_(subprocess.check_output(["sh", "-c", script]).decode('utf-8'), "11\n")
+        directory = Directory("a", sprinter_root=self.root)
+        directory.set_active(False)
+        tools.eq_(subprocess.check_output(["sh", "-c", script]).decode('utf-8'), "1\n")
+        directory.set_active(True)
+        tools.eq_(subprocess.check_output(["sh", "-c", script]).decode('utf-8'), "11\n")
+
+    def test_unchanged_loader_is_not_written(self):
+        """ A loader whose content is unchanged should not be written again """
+        env_path, rc_path = write_loaders(self.root, self.global_path, self.shell_util_path)
+        os.utime(rc_path, (0, 0))
+        write_loaders(self.root, self.global_path, self.shell_util_path)
+        tools.eq_(os.path.getmtime(rc_path), 0)
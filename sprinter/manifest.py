@@ -10,18 +10,22 @@ The manifest can take a source and/or a target manifest
 """
 from __future__ import unicode_literals
 
+import json
 import os
 import re
 import sys
+import tempfile
+import threading
 from io import StringIO
 
 from six.moves import configparser
 from six import string_types
-import requests
 import sprinter.lib as lib
 from sprinter.dependencytree import DependencyTree, DependencyTreeException
 from sprinter.system import System
 from sprinter.featureconfig import FeatureConfig
+from sprinter.snapshot import load_snapshot
+from sprinter.specializer import ContextDict, ResolvedView, Specializer
 from sprinter.core import LOGGER
 
 CONFIG_RESERVED = ['source', 'inputs']
@@ -48,18 +52,87 @@ class Manifest(object):
     dtree = None  # dependency tree object to ascertain order
     additional_context_variables = {}  # a list of the additional context variables available
     temporary_config_variables = []  # a list of the temporary keys, such as password
+    version = 0  # incremented every time the manifest is modified
+    additional_context_version = 0  # incremented every time additional context is added
+    remote = None  # the url, validators and content of a manifest retrieved from a url
+    not_modified = False  # true if a remote manifest was unchanged since it was cached
+    from_snapshot = False  # true if the manifest was loaded from a snapshot
+    # true while values may reference context that is not added yet, e.g. root_dir:
+    # the problems resolving them are only reported once this is unset
+    quiet = False
 
     def __init__(self, raw_manifest, namespace=None,
                  logger=LOGGER, username=None, password=None,
-                 verify_certificate=True):
+                 verify_certificate=True, cache_path=None, snapshot_path=None):
+        """
+        If cache_path is set, and the manifest is a url, the manifest
+        is only downloaded again if it changed since it was cached there.
+
+        If snapshot_path is set, and the manifest is a filepath, the
+        manifest is loaded from the snapshot there if it matches the file.
+        """
         self.logger = logger
-        self.manifest = self.__load_manifest(raw_manifest,
-                                             username=username,
-                                             password=password,
-                                             verify_certificate=verify_certificate)
+        # formulas syncing on several threads may set values while others resolve them
+        self._lock = threading.RLock()
+        self._system = None
+        self.specializer = Specializer(logger=self.logger)
+        self._context_dict = None
+        self._context_dict_version = None
+        self._resolved = None
+        self._resolved_version = None
+        self._resolved_quiet = False
+        snapshot = None
+        if snapshot_path and isinstance(raw_manifest, string_types) and not raw_manifest.startswith("http"):
+            snapshot = load_snapshot(snapshot_path, raw_manifest)
+        if snapshot:
+            self.manifest = self.__load_snapshot(snapshot, raw_manifest)
+        else:
+            self.manifest = self.__load_manifest(raw_manifest,
+                                                 username=username,
+                                                 password=password,
+                                                 verify_certificate=verify_certificate,
+                                                 cache_path=cache_path)
         self.namespace = namespace or self.__parse_namespace()
-        self.dtree = self.__generate_dependency_tree()
-        self.system = System(logger=self.logger)
+        if snapshot:
+            self.dtree = DependencyTree(snapshot['dependencies'], levels=snapshot['levels'])
+        else:
+            self.dtree = self.__generate_dependency_tree()
+
+    @property
+    def system(self):
+        """ Return the system, which is only inspected once it is needed """
+        if self._system is None:
+            self._system = System(logger=self.logger)
+        return self._system
+
+    @property
+    def context_version(self):
+        """ Return a version that changes whenever the context dict does """
+        return (self.version, Manifest.additional_context_version)
+
+    def set(self, section, option, value=None):
+        """ Set the option of a section """
+        with self._lock:
+            self.version += 1
+            self.manifest.set(section, option, value)
+
+    def remove_option(self, section, option):
+        """ Remove the option of a section """
+        with self._lock:
+            self.version += 1
+            return self.manifest.remove_option(section, option)
+
+    def add_section(self, section):
+        """ Add a section """
+        with self._lock:
+            self.version += 1
+            self.manifest.add_section(section)
+
+    def remove_section(self, section):
+        """ Remove a section and its options """
+        with self._lock:
+            self.version += 1
+            return self.manifest.remove_section(section)
 
     def formula_sections(self):
         """
@@ -100,15 +173,16 @@ class Manifest(object):
     
     def write(self, file_handle):
         """ write the current state to a file manifest """
-        temp_variables = {}
-        for k, v in self.items('config'):
-            if k in self.temporary_config_variables:
-                temp_variables[k] = v
-                self.remove_option('config', k)
-        self.set('config', 'namespace', self.namespace)
-        self.manifest.write(file_handle)
-        for k, v in temp_variables.items():
-            self.set('config', k, v)
+        with self._lock:
+            temp_variables = {}
+            for k, v in self.items('config'):
+                if k in self.temporary_config_variables:
+                    temp_variables[k] = v
+                    self.remove_option('config', k)
+            self.set('config', 'namespace', self.namespace)
+            self.manifest.write(file_handle)
+            for k, v in temp_variables.items():
+                self.set('config', k, v)
 
     def get_config(self, param_name, default=None, secret=False, force_prompt=False):
         """
@@ -122,40 +196,90 @@ class Manifest(object):
             self.temporary_config_variables.append(param_name)
         return self.get('config', param_name)
 
+    def dependencies(self, section):
+        """ Return the list of features the section depends on """
+        if self.manifest.has_option(section, 'depends'):
+            return [d.strip() for d in re.split('\n|,', self.manifest.get(section, 'depends'))]
+        return []
+
     def get_feature_config(self, feature_name):
         """ Return a FeatureConfig for the feature name provided """
         return FeatureConfig(self, feature_name)
 
     def get_context_dict(self):
-        """ return a context dict of the desired state """
-        context_dict = {}
-        for s in self.sections():
-            for k, v in self.manifest.items(s):
-                context_dict["%s:%s" % (s, k)] = v
-        context_dict.update(self.additional_context_variables.items())
-        context_dict.update(dict([("%s|escaped" % k, re.escape(str(v) or "")) for k, v in context_dict.items()]))
-        return context_dict
+        """
+        return a context dict of the desired state. The dict is cached
+        until the manifest is modified, so it should not be modified.
+        """
+        with self._lock:
+            if self._context_dict is None or self._context_dict_version != self.context_version:
+                context_dict = ContextDict()
+                for s in self.sections():
+                    for k, v in self.manifest.items(s):
+                        context_dict["%s:%s" % (s, k)] = v
+                context_dict.update(self.additional_context_variables.items())
+                self._context_dict, self._context_dict_version = context_dict, self.context_version
+            return self._context_dict
+
+    def resolved(self):
+        """
+        Return a ResolvedView of every value of the manifest, fully
+        specialized. The view is cached until the manifest is modified.
+        """
+        with self._lock:
+            if (self._resolved is None or self._resolved_version != self.context_version
+               or (self._resolved_quiet and not self.quiet)):
+                version, quiet = self.context_version, self.quiet
+                values = {}
+                for s in self.sections():
+                    for k, v in self.manifest.items(s):
+                        values["%s:%s" % (s, k)] = v
+                # like the context dict, the additional context takes precedence
+                for k in self.additional_context_variables:
+                    values.pop(k, None)
+                self._resolved = self.specializer.resolve(values, literals=self.additional_context_variables,
+                                                          report=not quiet)
+                self._resolved_version, self._resolved_quiet = version, quiet
+            return self._resolved
 
     def add_additional_context(self, additional_context):
         """ Add additional context variable """
-        self.additional_context_variables.update(additional_context)
+        with self._lock:
+            # the values of a snapshot were specialized with the context of its install
+            keep_resolved = (self.from_snapshot and self._resolved is not None
+                             and self._resolved_version == self.context_version
+                             and all(k in self._resolved and self._resolved[k] == v
+                                     for k, v in additional_context.items()))
+            self.additional_context_variables.update(additional_context)
+            # the additional context variables are shared by every manifest
+            Manifest.additional_context_version += 1
+            if keep_resolved:
+                self._resolved_version = self.context_version
 
-    def __load_manifest(self, raw_manifest, username=None, password=None, verify_certificate=True):
+    def write_remote_cache(self, cache_path):
+        """ Cache the content of a remote manifest, and the validators it was served with """
+        if not self.remote:
+            return
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix='.json')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(self.remote, fh, sort_keys=True)
+        os.rename(temp_path, cache_path)
+
+    def __load_manifest(self, raw_manifest, username=None, password=None, verify_certificate=True,
+                        cache_path=None):
         manifest = configparser.RawConfigParser()
         manifest.add_section('config')
         try:
             if isinstance(raw_manifest, string_types):
                 if raw_manifest.startswith("http"):
                     # raw_manifest is a url
+                    import requests
                     try:
-                        if username and password:
-                            manifest_file_handler = StringIO(lib.authenticated_get(username,
-                                                                                   password,
-                                                                                   raw_manifest,
-                                                                                   verify=verify_certificate).decode("utf-8"))
-                        else:
-                            manifest_file_handler = StringIO(lib.cleaned_request('get', raw_manifest).text)
-                        manifest.readfp(manifest_file_handler)
+                        manifest.readfp(StringIO(self.__download_manifest(raw_manifest,
+                                                                          username=username,
+                                                                          password=password,
+                                                                          verify_certificate=verify_certificate,
+                                                                          cache_path=cache_path)))
                     except requests.exceptions.RequestException:
                         self.logger.debug("", exc_info=True)
                         error_message = sys.exc_info()[1]
@@ -177,6 +301,66 @@ class Manifest(object):
             raise ManifestException("Unable to parse manifest!: {0}".format(error_message))
         return manifest
 
+    def __download_manifest(self, url, username=None, password=None, verify_certificate=True,
+                            cache_path=None):
+        """
+        Return the content of the manifest at url. If it is cached at
+        cache_path, it is requested with the validators it was cached
+        with, and the cached content is returned if it is unchanged.
+        """
+        cached = self.__read_remote_cache(cache_path, url)
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+        if username and password:
+            response = lib.authenticated_request(username, password, url,
+                                                 verify=verify_certificate, headers=headers)
+        else:
+            response = lib.cleaned_request('get', url, headers=headers)
+        if cached and response.status_code == 304:
+            self.logger.debug("Manifest %s is unchanged, using the cached copy..." % url)
+            self.not_modified = True
+            self.remote = cached
+            return cached['content']
+        content = response.content.decode("utf-8") if username and password else response.text
+        self.remote = {'url': url,
+                       'etag': response.headers.get('ETag'),
+                       'last_modified': response.headers.get('Last-Modified'),
+                       'content': content}
+        return content
+
+    def __read_remote_cache(self, cache_path, url):
+        """ Return the cached manifest of url, or None """
+        if not cache_path or not os.path.exists(cache_path):
+            return None
+        try:
+            with open(cache_path) as fh:
+                cached = json.load(fh)
+        except ValueError:
+            return None
+        return cached if cached.get('url') == url and 'content' in cached else None
+
+    def __load_snapshot(self, snapshot, raw_manifest):
+        """ Return the manifest of a snapshot, with its specialized values """
+        manifest = configparser.RawConfigParser()
+        values = {}
+        for section, items in snapshot['sections']:
+            manifest.add_section(section)
+            for k, v in items:
+                manifest.set(section, k, v)
+                values["%s:%s" % (section, k)] = v
+        if not manifest.has_section('config'):
+            manifest.add_section('config')
+        if not manifest.has_option('config', 'source'):
+            manifest.set('config', 'source', str(raw_manifest))
+        self._resolved = ResolvedView(ContextDict(snapshot['resolved']), values)
+        self._resolved_version = self.context_version
+        self.from_snapshot = True
+        return manifest
+
     def __parse_namespace(self):
         """
         Parse the namespace from various sources
@@ -196,33 +380,13 @@ class Manifest(object):
         dependency_dict = {}
         for s in self.manifest.sections():
             if s != "config":
-                if self.manifest.has_option(s, 'depends'):
-                    dependency_list = [d.strip() for d in re.split('\n|,', self.manifest.get(s, 'depends'))]
-                    dependency_dict[s] = dependency_list
-                else:
-                    dependency_dict[s] = []
+                dependency_dict[s] = self.dependencies(s)
         try:
             return DependencyTree(dependency_dict)
         except DependencyTreeException:
             dte = sys.exc_info()[1]
             raise ManifestException("Dependency tree for manifest is invalid! %s" % str(dte))
 
-    def __substitute_objects(self, value, context_dict):
-        """
-        recursively substitute value with the context_dict
-        """
-        if type(value) == dict:
-            return dict([(k, self.__substitute_objects(v, context_dict)) for k, v in value.items()])
-        elif type(value) == str:
-            try:
-                return value % context_dict
-            except KeyError:
-                e = sys.exc_info()[1]
-                self.logger.warn("Could not specialize %s! Error: %s" % (value, e))
-                return value
-        else:
-            return value
-
     # custom equality method
     def __eq__(self, other):
         if not isinstance(other, Manifest):
@@ -2,8 +2,12 @@ from __future__ import unicode_literals
 from six import StringIO
 
 import os
+import re
+import shutil
+import sys
 import httpretty
 import tempfile
+import threading
 from nose import tools
 from mock import Mock, call, patch
 
@@ -121,6 +125,35 @@ class TestManifest(object):
         assert 'testme' in self.old_manifest.additional_context_variables
         assert 'testhim' in self.old_manifest.additional_context_variables
 
+    def test_context_dict_is_cached(self):
+        """ The context dict should only be rebuilt when the manifest is modified """
+        context_dict = self.old_manifest.get_context_dict()
+        assert self.old_manifest.get_context_dict() is context_dict
+        self.old_manifest.set('maven', 'specific_version', '3.0')
+        tools.eq_(self.old_manifest.get_context_dict()['maven:specific_version'], '3.0')
+        self.old_manifest.remove_option('maven', 'specific_version')
+        assert 'maven:specific_version' not in self.old_manifest.get_context_dict()
+        self.old_manifest.add_additional_context({'config:cached': 'no'})
+        tools.eq_(self.old_manifest.get_context_dict()['config:cached'], 'no')
+
+    def test_context_dict_escaped_is_lazy(self):
+        """ The escaped variants should only be computed when they are asked for """
+        context_dict = self.old_manifest.get_context_dict()
+        assert 'maven:specific_version|escaped' in context_dict
+        assert 'maven:specific_version|escaped' not in dict(context_dict)
+        tools.eq_(context_dict['maven:specific_version|escaped'], re.escape("2.10"))
+        assert 'maven:missing|escaped' not in context_dict
+
+    def test_feature_config_follows_manifest(self):
+        """ A feature config should be specialized against the current manifest """
+        feature_config = self.old_manifest.get_feature_config('sub')
+        self.old_manifest.set('sub', 'root_dir', '/tmp')
+        tools.eq_(feature_config.get('rc'),
+                  'temp=`pwd`; cd /tmp/libexec && . sub-init2 && cd $tmp')
+        feature_config.set('root_dir', '/opt')
+        tools.eq_(feature_config.get('rc'),
+                  'temp=`pwd`; cd /opt/libexec && . sub-init2 && cd $tmp')
+
     @httpretty.activate
     def test_source_from_url(self):
         """ When the manifest is sourced from a url, the source should be the url. """
@@ -130,6 +163,40 @@ class TestManifest(object):
         m = Manifest(TEST_URI)
         assert m.source() == TEST_URI
 
+    @httpretty.activate
+    def test_remote_manifest_is_cached(self):
+        """ A cached remote manifest should be requested conditionally, and reused if it is unchanged """
+        TEST_URI = "http://testme.com/test.cfg"
+        temp_dir = tempfile.mkdtemp()
+        try:
+            cache_path = os.path.join(temp_dir, "manifest.remote.json")
+            httpretty.register_uri(httpretty.GET, TEST_URI, body=http_manifest,
+                                   adding_headers={'ETag': '"abc"'})
+            Manifest(TEST_URI, cache_path=cache_path).write_remote_cache(cache_path)
+            httpretty.register_uri(httpretty.GET, TEST_URI, body="", status=304)
+            m = Manifest(TEST_URI, cache_path=cache_path)
+            tools.eq_(httpretty.last_request().headers['If-None-Match'], '"abc"')
+            assert m.not_modified
+            assert m.has_section('sub')
+        finally:
+            shutil.rmtree(temp_dir)
+
+    @httpretty.activate
+    def test_remote_manifest_cache_other_url(self):
+        """ A manifest cached for another url should not be used """
+        TEST_URI = "http://testme.com/test.cfg"
+        temp_dir = tempfile.mkdtemp()
+        try:
+            cache_path = os.path.join(temp_dir, "manifest.remote.json")
+            httpretty.register_uri(httpretty.GET, "http://testme.com/other.cfg", body=http_manifest)
+            Manifest("http://testme.com/other.cfg", cache_path=cache_path).write_remote_cache(cache_path)
+            httpretty.register_uri(httpretty.GET, TEST_URI, body=http_manifest)
+            m = Manifest(TEST_URI, cache_path=cache_path)
+            assert 'If-None-Match' not in httpretty.last_request().headers
+            assert not m.not_modified
+        finally:
+            shutil.rmtree(temp_dir)
+
     @patch.object(lib, 'prompt')
     def test_get_config(self, prompt):
         """ Test the get config """
@@ -194,6 +261,34 @@ class TestManifest(object):
         """ The manifest should throw an exception on an invalid manifest path """
         Manifest("./ehiiehaiehnatheita")
 
+    def test_concurrent_set_and_resolve(self):
+        """ Setting values while other threads resolve the manifest should be safe """
+        manifest = Manifest(StringIO(manifest_correct_dependency))
+        errors = []
+
+        def write(thread):
+            try:
+                for i in range(200):
+                    manifest.set('sub', 'key%s_%s' % (thread, i), '%%(sub:url)s/%s' % i)
+            except Exception:
+                errors.append(sys.exc_info()[1])
+
+        def read():
+            try:
+                for i in range(200):
+                    manifest.resolved()
+                    manifest.get_context_dict()
+            except Exception:
+                errors.append(sys.exc_info()[1])
+        threads = ([threading.Thread(target=write, args=(t,)) for t in range(2)] +
+                   [threading.Thread(target=read) for t in range(2)])
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        tools.eq_(errors, [])
+        tools.eq_(manifest.resolved()['sub:key1_199'], 'git://github.com/Toumorokoshi/sub.git/199')
+
 old_manifest = """
 [config]
 namespace = sprinter
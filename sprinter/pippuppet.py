@@ -1,6 +1,6 @@
 import os
 import sys
- 
+
 from pip.index import PackageFinder
 from pip.req import InstallRequirement, RequirementSet
 from pip.locations import build_prefix, src_prefix
@@ -8,41 +8,71 @@ from pip.exceptions import DistributionNotFound
 
 
 class PipException(Exception):
-    """ Pip exception """
+    """ Pip exception, listing the eggs that could not be installed """
+
+    def __init__(self, eggs=[]):
+        super(PipException, self).__init__("Unable to install %s!" % ", ".join(eggs))
+        self.eggs = list(eggs)
 
 
 class Pip(object):
     """
     A class to puppet PIP to install new eggs
     """
-    requirement_set = None  # the requirement set
     # the package finder
     finder = PackageFinder(find_links=[], index_urls=["http://pypi.python.org/simple/"])
     install_options = []  # the install options with pip
     global_options = []  # the global options with pip
+    download_cache = None  # the directory caching the archives pip downloads
 
     def __init__(self, egg_directory, install_options=[], global_options=[]):
         self.egg_directory = egg_directory = os.path.abspath(os.path.expanduser(egg_directory))
-        self.install_options += ["--home=%s" % egg_directory]
-        sys.path += [os.path.join(egg_directory, "lib", "python")]
-        self.requirement_set = RequirementSet(
-            build_dir=build_prefix,
-            src_dir=src_prefix,
-            download_dir=None,
-            upgrade=True)
-    
+        self.install_options = install_options + ["--home=%s" % egg_directory]
+        self.global_options = list(global_options)
+        self.download_cache = os.path.join(egg_directory, "pip-cache")
+        egg_path = os.path.join(egg_directory, "lib", "python")
+        if egg_path not in sys.path:
+            sys.path.append(egg_path)
+
     def install_egg(self, egg_name):
         """ Install an egg into the egg directory """
-        if not os.path.exists(self.egg_directory):
-            os.makedirs(self.egg_directory)
-        self.requirement_set.add_requirement(
-            InstallRequirement.from_line(egg_name, None))
+        self.install_eggs([egg_name])
+
+    def install_eggs(self, egg_names):
+        """
+        Install several eggs into the egg directory, resolved and
+        installed in a single pass. Requirements that are already
+        satisfied are not installed again. If any egg can not be
+        found, each egg is installed on its own, and a PipException
+        listing every egg that failed is raised.
+        """
+        for directory in (self.egg_directory, self.download_cache):
+            if not os.path.exists(directory):
+                os.makedirs(directory)
         try:
-            self.requirement_set.prepare_files(self.finder,
-                                               force_root_egg_info=False,
-                                               bundle=False)
-            self.requirement_set.install(self.install_options,
-                                         self.global_options)
+            self.__install(egg_names)
         except DistributionNotFound:
-            self.requirement_set.requirements._keys.remove(egg_name)
-            raise PipException()
+            if len(egg_names) == 1:
+                raise PipException(egg_names)
+            failed = []
+            for egg_name in egg_names:
+                try:
+                    self.__install([egg_name])
+                except DistributionNotFound:
+                    failed.append(egg_name)
+            if failed:
+                raise PipException(failed)
+
+    def __install(self, egg_names):
+        requirement_set = RequirementSet(
+            build_dir=build_prefix,
+            src_dir=src_prefix,
+            download_dir=None,
+            download_cache=self.download_cache,
+            upgrade=False)
+        for egg_name in egg_names:
+            requirement_set.add_requirement(InstallRequirement.from_line(egg_name, None))
+        requirement_set.prepare_files(self.finder,
+                                      force_root_egg_info=False,
+                                      bundle=False)
+        requirement_set.install(self.install_options, self.global_options)
@@ -0,0 +1,132 @@
+"""
+registry.py maps the formula names used in manifests to their classes.
+
+A formula name is resolved, in order, through:
+
+* the formulas shipped with sprinter
+* the formulas resolved by earlier runs, cached in .global/formulas.json
+* the entry points of the sprinter.formulas group, which packages use
+  to register their formulas by name:
+
+    entry_points={'sprinter.formulas': ['mine = mypackage.formula:MyFormula']}
+
+* a scan of the module of that name for a FormulaBase subclass
+
+The formulas found by entry point or scan are cached, so later runs
+resolve them with a dictionary lookup and a normal import. Entry
+points are only read when a formula is not found otherwise, as reading
+them is slower than importing most formulas.
+"""
+from __future__ import unicode_literals
+import importlib
+import json
+import os
+import tempfile
+
+import sprinter.lib as lib
+from sprinter.formulabase import FormulaBase
+
+ENTRY_POINT_GROUP = "sprinter.formulas"
+REGISTRY_FILE = "formulas.json"
+FORMAT_VERSION = 1
+
+# the formulas shipped with sprinter, as name: module:class
+BUILTIN_FORMULAS = {
+    'sprinter.formulabase': 'sprinter.formulabase:FormulaBase',
+    'sprinter.formula.command': 'sprinter.formula.command:CommandFormula',
+    'sprinter.formula.eggscript': 'sprinter.formula.eggscript:EggscriptFormula',
+    'sprinter.formula.env': 'sprinter.formula.env:EnvFormula',
+    'sprinter.formula.git': 'sprinter.formula.git:GitFormula',
+    'sprinter.formula.package': 'sprinter.formula.package:PackageFormula',
+    'sprinter.formula.perforce': 'sprinter.formula.perforce:PerforceFormula',
+    'sprinter.formula.ssh': 'sprinter.formula.ssh:SSHFormula',
+    'sprinter.formula.template': 'sprinter.formula.template:TemplateFormula',
+    'sprinter.formula.unpack': 'sprinter.formula.unpack:UnpackFormula',
+}
+
+
+def load_class(target):
+    """ Import and return the class at target, a module:class string """
+    module_name, _, class_name = target.partition(':')
+    module = importlib.import_module(module_name)
+    if not hasattr(module, class_name):
+        raise ImportError("No class %s exists in %s!" % (class_name, module_name))
+    return getattr(module, class_name)
+
+
+def entry_points(group=ENTRY_POINT_GROUP):
+    """ Return a dictionary of the name to the module:class of every entry point of group """
+    try:
+        from importlib.metadata import entry_points as find_entry_points
+    except ImportError:
+        import pkg_resources
+        return dict((ep.name, "%s:%s" % (ep.module_name, ".".join(ep.attrs)))
+                    for ep in pkg_resources.iter_entry_points(group))
+    found = find_entry_points()
+    if hasattr(found, 'select'):
+        found = found.select(group=group)
+    else:
+        found = found.get(group, [])
+    return dict((ep.name, ep.value) for ep in found)
+
+
+class FormulaRegistry(object):
+    """
+    The formula classes of every formula name. If path is None, the
+    formulas found are kept in memory only.
+    """
+
+    path = None  # the path to the cache of formulas resolved by earlier runs
+    formulas = {}  # the cached formulas, as name: module:class
+
+    def __init__(self, path=None):
+        self.path = path
+        self.formulas = {}
+        self._entry_points = None
+        self._changed = False
+        if path and os.path.exists(path):
+            try:
+                with open(path) as fh:
+                    content = json.load(fh)
+                if content.get('version') == FORMAT_VERSION:
+                    self.formulas = content.get('formulas', {})
+            except ValueError:
+                # a corrupt cache is the same as no cache: formulas are looked up again
+                pass
+
+    def resolve(self, name):
+        """
+        Return the formula class of name. Raise an ImportError or a
+        SprinterException if no formula of that name can be found.
+        """
+        if name in BUILTIN_FORMULAS:
+            return load_class(BUILTIN_FORMULAS[name])
+        if name in self.formulas:
+            try:
+                return load_class(self.formulas[name])
+            except ImportError:
+                # the formula was uninstalled or moved since it was cached
+                del self.formulas[name]
+                self._changed = True
+        if self._entry_points is None:
+            self._entry_points = entry_points()
+        if name in self._entry_points:
+            formula_class = load_class(self._entry_points[name])
+        else:
+            formula_class = lib.get_subclass_from_module(name, FormulaBase)
+        self.formulas[name] = "%s:%s" % (formula_class.__module__, formula_class.__name__)
+        self._changed = True
+        return formula_class
+
+    def write(self):
+        """ write the cache to its path, if formulas were found or dropped since it was read """
+        if not self.path or not self._changed:
+            return
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.json')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump({'version': FORMAT_VERSION, 'formulas': self.formulas}, fh, sort_keys=True)
+        os.rename(temp_path, self.path)
+        self._changed = False
@@ -0,0 +1,93 @@
+from __future__ import unicode_literals
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from mock import patch
+from nose import tools
+
+from sprinter.formula.git import GitFormula
+from sprinter.formula.unpack import UnpackFormula
+from sprinter.formulabase import FormulaBase
+from sprinter.registry import BUILTIN_FORMULAS, FormulaRegistry, load_class
+
+scanned_formula = """
+from sprinter.formulabase import FormulaBase
+
+
+class ScannedFormula(FormulaBase):
+    pass
+"""
+
+
+class TestFormulaRegistry(object):
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "formulas.json")
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_builtin_formulas(self):
+        """ Every built-in formula should resolve without scanning its module """
+        for name, target in BUILTIN_FORMULAS.items():
+            assert issubclass(load_class(target), FormulaBase), name
+        registry = FormulaRegistry(self.path)
+        with patch('sprinter.lib.get_subclass_from_module') as scan:
+            tools.eq_(registry.resolve('sprinter.formula.git'), GitFormula)
+            tools.eq_(registry.resolve('sprinter.formulabase'), FormulaBase)
+        assert not scan.called
+        registry.write()
+        assert not os.path.exists(self.path)
+
+    def test_entry_point(self):
+        """ A formula registered by entry point should be resolved and cached """
+        registry = FormulaRegistry(self.path)
+        with patch('sprinter.registry.entry_points',
+                   return_value={'unpack': 'sprinter.formula.unpack:UnpackFormula'}):
+            tools.eq_(registry.resolve('unpack'), UnpackFormula)
+        registry.write()
+        with open(self.path) as fh:
+            tools.eq_(json.load(fh)['formulas'], {'unpack': 'sprinter.formula.unpack:UnpackFormula'})
+        with patch('sprinter.registry.entry_points') as entry_points:
+            tools.eq_(FormulaRegistry(self.path).resolve('unpack'), UnpackFormula)
+        assert not entry_points.called
+
+    def test_scanned_formula_is_cached(self):
+        """ A formula found by scanning its module should be cached by its class """
+        with open(os.path.join(self.temp_dir, "scanned_formula.py"), 'w+') as fh:
+            fh.write(scanned_formula)
+        sys.path.insert(0, self.temp_dir)
+        try:
+            registry = FormulaRegistry(self.path)
+            with patch('sprinter.registry.entry_points', return_value={}):
+                tools.eq_(registry.resolve('scanned_formula').__name__, 'ScannedFormula')
+            tools.eq_(registry.formulas, {'scanned_formula': 'scanned_formula:ScannedFormula'})
+        finally:
+            sys.path.remove(self.temp_dir)
+            sys.modules.pop('scanned_formula', None)
+
+    def test_stale_entry_is_dropped(self):
+        """ A cached formula that no longer imports should be looked up again """
+        with open(self.path, 'w+') as fh:
+            json.dump({'version': 1, 'formulas': {'unpack': 'missing.module:Formula'}}, fh)
+        registry = FormulaRegistry(self.path)
+        with patch('sprinter.registry.entry_points',
+                   return_value={'unpack': 'sprinter.formula.unpack:UnpackFormula'}):
+            tools.eq_(registry.resolve('unpack'), UnpackFormula)
+        tools.eq_(registry.formulas, {'unpack': 'sprinter.formula.unpack:UnpackFormula'})
+
+    def test_missing_formula(self):
+        """ A formula that can not be found should raise an ImportError """
+        registry = FormulaRegistry(self.path)
+        with patch('sprinter.registry.entry_points', return_value={}):
+            tools.assert_raises(ImportError, registry.resolve, 'sprinter.formula.missing')
+
+    def test_corrupt_cache(self):
+        """ A corrupt cache should be ignored """
+        with open(self.path, 'w+') as fh:
+            fh.write("{")
+        tools.eq_(FormulaRegistry(self.path).formulas, {})
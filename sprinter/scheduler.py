@@ -0,0 +1,88 @@
+"""
+scheduler.py runs a set of nodes with dependencies between them
+concurrently. A node is started as soon as every node it depends on
+has finished, with at most `jobs` nodes running at once.
+
+Errors are not handled by the scheduler: the callable passed to run
+is expected to catch and record its own errors (as
+Environment._run_action does). An exception escaping the callable is
+re-raised once every running node has finished.
+"""
+from __future__ import unicode_literals
+import sys
+import threading
+
+from six import reraise
+from six.moves import queue
+
+from sprinter.core import LOGGER
+from sprinter.dependencytree import DependencyTree
+
+
+class FeatureScheduler(object):
+    """
+    FeatureScheduler takes a list of nodes, in their preferred
+    order, and a dictionary of each node's dependencies.
+    """
+
+    jobs = 1  # the maximum number of nodes run at once
+
+    def __init__(self, order, dependency_dict, jobs=1, logger=LOGGER):
+        self.order = list(order)
+        self.jobs = max(1, int(jobs))
+        self.logger = logger
+        scheduled = set(self.order)
+        # dependencies on nodes that will not be run are dropped
+        self.dtree = DependencyTree(dict(
+            (node, [d for d in dependency_dict.get(node, []) if d in scheduled])
+            for node in self.order))
+
+    def run(self, callback):
+        """ call callback(node) for every node, respecting dependencies """
+        if self.jobs == 1:
+            for node in self.order:
+                callback(node)
+            return
+        position = dict([(node, i) for i, node in enumerate(self.order)])
+        remaining = dict([(node, len(set(self.dtree.dependencies(node)))) for node in self.order])
+        ready = [node for node in self.order if remaining[node] == 0]
+        finished = queue.Queue()
+        running = 0
+        exc_info = None
+        while ready or running:
+            while ready and running < self.jobs and exc_info is None:
+                node = ready.pop(0)
+                thread = threading.Thread(target=self.__run_node,
+                                          args=(callback, node, finished))
+                thread.daemon = True
+                thread.start()
+                running += 1
+            if not running:
+                break
+            node, node_exc_info = self.__wait(finished)
+            running -= 1
+            if node_exc_info and exc_info is None:
+                exc_info = node_exc_info
+            for dependent in self.dtree.dependents(node):
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+            ready.sort(key=lambda n: position[n])
+        if exc_info:
+            reraise(*exc_info)
+
+    def __wait(self, finished):
+        """ wait for a node to finish, waking up periodically to allow for interrupts """
+        while True:
+            try:
+                return finished.get(True, 0.5)
+            except queue.Empty:
+                pass
+
+    def __run_node(self, callback, node, finished):
+        try:
+            callback(node)
+            finished.put((node, None))
+        except Exception:
+            self.logger.debug("Exception in scheduled node %s" % str(node), exc_info=True)
+            finished.put((node, sys.exc_info()))
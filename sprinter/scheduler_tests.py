@@ -0,0 +1,72 @@
+from __future__ import unicode_literals
+import threading
+import time
+
+from nose import tools
+
+from sprinter.scheduler import FeatureScheduler
+
+ORDER = ['d', 'c', 'b', 'a', 'e']
+
+DEPENDENCIES = {
+    'a': ['b', 'c', 'd'],
+    'b': ['d'],
+    'c': [],
+    'd': [],
+    'e': []
+}
+
+
+class TestFeatureScheduler(object):
+
+    def setup(self):
+        self.finished = []
+        self.lock = threading.Lock()
+
+    def _record(self, node):
+        time.sleep(0.01)
+        for dependency in DEPENDENCIES[node]:
+            assert dependency in self.finished, \
+                "%s started before its dependency %s finished!" % (node, dependency)
+        with self.lock:
+            self.finished.append(node)
+
+    def test_sequential_order(self):
+        """ With a single job, nodes should be run in the order provided """
+        FeatureScheduler(ORDER, DEPENDENCIES, jobs=1).run(self.finished.append)
+        tools.eq_(self.finished, ORDER)
+
+    def test_concurrent_respects_dependencies(self):
+        """ With multiple jobs, a node should only start after its dependencies are done """
+        FeatureScheduler(ORDER, DEPENDENCIES, jobs=4).run(self._record)
+        tools.eq_(sorted(self.finished), sorted(ORDER))
+
+    def test_concurrent_runs_independent_nodes_together(self):
+        """ Independent nodes should run at the same time """
+        barrier = threading.Event()
+        started = []
+
+        def wait_for_both(node):
+            started.append(node)
+            if len(started) == 2:
+                barrier.set()
+            assert barrier.wait(5), "nodes were not run concurrently!"
+
+        FeatureScheduler(['x', 'y'], {}, jobs=2).run(wait_for_both)
+        tools.eq_(sorted(started), ['x', 'y'])
+
+    def test_missing_dependencies_are_ignored(self):
+        """ Dependencies on nodes that are not scheduled should not block a node """
+        FeatureScheduler(['a'], {'a': ['notscheduled']}, jobs=2).run(self.finished.append)
+        tools.eq_(self.finished, ['a'])
+
+    def test_exception_is_reraised(self):
+        """ An exception escaping a node should be raised after running nodes finish """
+        def fail(node):
+            if node == 'c':
+                raise ValueError("failure in c")
+        try:
+            FeatureScheduler(ORDER, DEPENDENCIES, jobs=3).run(fail)
+        except ValueError:
+            return
+        raise Exception("exception was not reraised!")
@@ -0,0 +1,60 @@
+"""
+snapshot.py stores a compiled snapshot of an installed manifest.
+
+Install and update write the snapshot next to manifest.cfg when they
+finalize: the parsed sections, the dependency order and the specialized
+values. Loading a manifest from the snapshot skips parsing and ordering
+it. The snapshot is only used while the mtime and the hash of
+manifest.cfg match the ones it was written with, so a manifest.cfg
+edited by hand is parsed again. The specialized values are kept when
+the context added to the manifest (e.g. by remove) matches the context
+they were specialized with, and specialized again otherwise.
+"""
+from __future__ import unicode_literals
+import hashlib
+import json
+import os
+import tempfile
+
+FORMAT_VERSION = 1
+
+
+def _file_hash(path):
+    with open(path, 'rb') as fh:
+        return hashlib.sha1(fh.read()).hexdigest()
+
+
+def write_snapshot(manifest, snapshot_path, manifest_path):
+    """ Write a snapshot of a manifest parsed from the file at manifest_path """
+    resolved = manifest.resolved()
+    content = {'version': FORMAT_VERSION,
+               'mtime': os.path.getmtime(manifest_path),
+               'sha1': _file_hash(manifest_path),
+               'namespace': manifest.namespace,
+               'sections': [[s, manifest.manifest.items(s)] for s in manifest.manifest.sections()],
+               'dependencies': manifest.dtree.node_dict,
+               'levels': manifest.dtree.levels,
+               'resolved': dict((k, resolved[k]) for k in resolved)}
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(snapshot_path), suffix='.json')
+    with os.fdopen(fd, 'w') as fh:
+        json.dump(content, fh, sort_keys=True)
+    os.rename(temp_path, snapshot_path)
+
+
+def load_snapshot(snapshot_path, manifest_path):
+    """
+    Return the content of the snapshot at snapshot_path, or None if it
+    does not exist or does not match the file at manifest_path.
+    """
+    if not os.path.exists(snapshot_path) or not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(snapshot_path) as fh:
+            content = json.load(fh)
+    except ValueError:
+        return None
+    if (content.get('version') != FORMAT_VERSION
+       or content.get('mtime') != os.path.getmtime(manifest_path)
+       or content.get('sha1') != _file_hash(manifest_path)):
+        return None
+    return content
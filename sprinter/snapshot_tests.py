@@ -0,0 +1,73 @@
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+
+from nose import tools
+
+from sprinter.manifest import Manifest
+from sprinter.snapshot import load_snapshot, write_snapshot
+
+test_manifest = """
+[config]
+namespace = snapshot
+
+[sub]
+formula = sprinter.formula.git
+depends = git
+url = %(git:url)s/sub.git
+
+[git]
+formula = sprinter.formula.package
+url = http://github.com
+"""
+
+
+class TestSnapshot(object):
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.temp_dir, "manifest.cfg")
+        self.snapshot_path = os.path.join(self.temp_dir, "manifest.snapshot.json")
+        with open(self.manifest_path, 'w+') as fh:
+            fh.write(test_manifest)
+        write_snapshot(Manifest(self.manifest_path), self.snapshot_path, self.manifest_path)
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_load_from_snapshot(self):
+        """ A manifest matching its snapshot should be loaded from it """
+        manifest = Manifest(self.manifest_path, snapshot_path=self.snapshot_path)
+        assert manifest.from_snapshot
+        tools.eq_(manifest, Manifest(self.manifest_path))
+        tools.eq_(manifest.namespace, 'snapshot')
+        tools.eq_(manifest.formula_sections(), ['git', 'sub'])
+        tools.eq_(manifest.get_feature_config('sub').get('url'), 'http://github.com/sub.git')
+
+    def test_modified_manifest(self):
+        """ A manifest modified since its snapshot should be parsed """
+        with open(self.manifest_path, 'a') as fh:
+            fh.write("branch = develop\n")
+        assert load_snapshot(self.snapshot_path, self.manifest_path) is None
+        manifest = Manifest(self.manifest_path, snapshot_path=self.snapshot_path)
+        assert not manifest.from_snapshot
+        tools.eq_(manifest.get('git', 'branch'), 'develop')
+
+    def test_matching_context_keeps_resolved_values(self):
+        """ Context matching the one the snapshot was specialized with should not specialize it again """
+        manifest = Manifest(self.manifest_path)
+        manifest.add_additional_context({'sub:root_dir': '/tmp/snapshot/sub'})
+        write_snapshot(manifest, self.snapshot_path, self.manifest_path)
+        manifest = Manifest(self.manifest_path, snapshot_path=self.snapshot_path)
+        resolved = manifest.resolved()
+        manifest.add_additional_context({'sub:root_dir': '/tmp/snapshot/sub'})
+        assert manifest.resolved() is resolved
+        manifest.add_additional_context({'sub:root_dir': '/tmp/other/sub'})
+        assert manifest.resolved() is not resolved
+
+    def test_corrupt_snapshot(self):
+        """ A corrupt snapshot should be ignored """
+        with open(self.snapshot_path, 'w+') as fh:
+            fh.write("{")
+        assert not Manifest(self.manifest_path, snapshot_path=self.snapshot_path).from_snapshot
@@ -0,0 +1,193 @@
+"""
+specializer.py resolves the %(section:key)s references of a manifest.
+
+The references of every value are parsed once, and the values are
+resolved in dependency order, so a value referencing another value
+with references of its own is fully expanded:
+
+[maven]
+root_dir = %(config:root_dir)s/maven
+
+[env]
+m2_home = %(maven:root_dir)s
+
+Values with a reference that is not defined, or that reference each
+other in a cycle, are left unspecialized, and reported once.
+"""
+from __future__ import unicode_literals
+import re
+import sys
+import threading
+from collections import deque
+
+from six import string_types
+
+from sprinter.core import LOGGER
+from sprinter.dependencytree import DependencyTree, DependencyTreeException
+
+# matches both escaped percent signs and references, so %%(key)s is not a reference
+REFERENCE_REGEX = re.compile(r'%(?:%|\(([^)]*)\))')
+ESCAPED_SUFFIX = "|escaped"
+
+
+class ContextDict(dict):
+    """
+    A context dict, which escapes a value when it is asked for with
+    the |escaped suffix, rather than escaping every value up front.
+    """
+
+    def __missing__(self, key):
+        if key.endswith(ESCAPED_SUFFIX) and dict.__contains__(self, key[:-len(ESCAPED_SUFFIX)]):
+            value = re.escape(str(self[key[:-len(ESCAPED_SUFFIX)]]) or "")
+            self[key] = value
+            return value
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return (dict.__contains__(self, key) or
+                (key.endswith(ESCAPED_SUFFIX) and dict.__contains__(self, key[:-len(ESCAPED_SUFFIX)])))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class ResolvedView(object):
+    """
+    An immutable mapping of every key of a manifest to its fully
+    specialized value.
+    """
+
+    def __init__(self, values, raw_values):
+        self.__values = values
+        self.__raw_values = raw_values
+
+    def raw(self, key):
+        """ Return the value of key before it was specialized, or None """
+        return self.__raw_values.get(key)
+
+    def get(self, key, default=None):
+        return self.__values.get(key, default)
+
+    def keys(self):
+        return list(self.__values.keys())
+
+    def __getitem__(self, key):
+        return self.__values[key]
+
+    def __contains__(self, key):
+        return key in self.__values
+
+    def __iter__(self):
+        return iter(self.__values)
+
+    def __len__(self):
+        return len(self.__values)
+
+
+class Specializer(object):
+    """
+    Specializer resolves the references of a context. The references
+    of a value are only parsed once, and every problem is only
+    reported once.
+    """
+
+    def __init__(self, logger=LOGGER):
+        self.logger = logger
+        self._references = {}  # a cache of the keys referenced by a raw value
+        self._reported = set()  # the problems that have already been reported
+        self._lock = threading.Lock()
+
+    def references(self, value):
+        """ Return the keys referenced by a value, without their |escaped suffix """
+        if not isinstance(value, string_types) or '%' not in value:
+            return ()
+        references = self._references.get(value)
+        if references is None:
+            references = set()
+            for match in REFERENCE_REGEX.finditer(value):
+                key = match.group(1)
+                if key is not None:
+                    references.add(key[:-len(ESCAPED_SUFFIX)] if key.endswith(ESCAPED_SUFFIX) else key)
+            references = self._references[value] = tuple(sorted(references))
+        return references
+
+    def resolve(self, values, literals={}, report=True):
+        """
+        Resolve every value in dependency order, and return a
+        ResolvedView of them. Literals can be referenced, but are not
+        specialized themselves. If report is false, problems are
+        neither reported nor remembered as reported.
+        """
+        unresolved = set()
+        dependency_dict = {}
+        for key, value in values.items():
+            missing = [r for r in self.references(value) if r not in values and r not in literals]
+            if missing:
+                unresolved.add(key)
+                self.__report(report, "Could not specialize %s! %s %s not defined."
+                              % (key, ", ".join("%%(%s)s" % m for m in missing),
+                                 "is" if len(missing) == 1 else "are"))
+            dependency_dict[key] = [r for r in self.references(value) if r in values]
+        resolved = ContextDict(literals)
+        order, cyclic = self.__order(dependency_dict, report)
+        for key in order:
+            value = values[key]
+            if key in unresolved or '%' not in str(value):
+                resolved[key] = value
+                continue
+            try:
+                resolved[key] = str(value) % resolved
+            except (KeyError, ValueError, TypeError):
+                self.__report(report, "Could not specialize %s! Error: %s" % (key, sys.exc_info()[1]))
+                resolved[key] = value
+        for key in cyclic:
+            resolved[key] = values[key]
+        return ResolvedView(resolved, values)
+
+    def specialize(self, value, resolved):
+        """ Specialize a single value against a ResolvedView """
+        try:
+            return str(value) % resolved
+        except (KeyError, ValueError, TypeError):
+            self.__report(True, "Could not specialize %s! Error: %s" % (value, sys.exc_info()[1]))
+            return value
+
+    def __order(self, dependency_dict, report=True):
+        """
+        Return the keys in dependency order, and the keys that are in
+        or depend on a cycle, reporting the cycles.
+        """
+        remaining = dict((key, len(set(dependencies))) for key, dependencies in dependency_dict.items())
+        dependent_dict = dict((key, []) for key in dependency_dict)
+        for key, dependencies in dependency_dict.items():
+            for dependency in set(dependencies):
+                dependent_dict[dependency].append(key)
+        queue = deque(key for key, count in remaining.items() if count == 0)
+        order = []
+        while queue:
+            key = queue.popleft()
+            order.append(key)
+            for dependent in dependent_dict[key]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    queue.append(dependent)
+        cyclic = [key for key, count in remaining.items() if count > 0]
+        if cyclic:
+            try:
+                DependencyTree(dict((key, [d for d in dependency_dict[key] if d in remaining and remaining[d] > 0])
+                                    for key in cyclic))
+            except DependencyTreeException:
+                self.__report(report, "Could not specialize values referencing each other! %s" % sys.exc_info()[1])
+        return order, cyclic
+
+    def __report(self, report, message):
+        if not report:
+            return
+        with self._lock:
+            if message in self._reported:
+                return
+            self._reported.add(message)
+        self.logger.warn(message)
@@ -0,0 +1,67 @@
+from __future__ import unicode_literals
+import re
+
+from mock import Mock
+from nose import tools
+
+from sprinter.specializer import Specializer
+
+
+class TestSpecializer(object):
+
+    def setup(self):
+        self.logger = Mock()
+        self.specializer = Specializer(logger=self.logger)
+
+    def test_references(self):
+        """ References should be parsed without their escaped suffix, ignoring escaped percent signs """
+        tools.eq_(self.specializer.references("%(a:b)s/%(c:d|escaped)s %%(e:f)s 100%%"),
+                  ('a:b', 'c:d'))
+        tools.eq_(self.specializer.references("no references"), ())
+
+    def test_nested_references(self):
+        """ A value referencing a specialized value should be fully expanded """
+        resolved = self.specializer.resolve({'env:m2_home': '%(maven:root_dir)s',
+                                             'maven:root_dir': '%(config:root_dir)s/maven'},
+                                            literals={'config:root_dir': '/tmp'})
+        tools.eq_(resolved['env:m2_home'], '/tmp/maven')
+        tools.eq_(resolved.raw('env:m2_home'), '%(maven:root_dir)s')
+        assert not self.logger.warn.called
+
+    def test_escaped_reference(self):
+        """ An escaped reference should escape the specialized value """
+        resolved = self.specializer.resolve({'a:regex': '^%(a:path|escaped)s$',
+                                             'a:path': '%(config:root_dir)s/a.b'},
+                                            literals={'config:root_dir': '/tmp'})
+        tools.eq_(resolved['a:regex'], '^%s$' % re.escape('/tmp/a.b'))
+
+    def test_missing_reference_is_reported_once(self):
+        """ A value with a missing reference should be left as is, and reported once """
+        values = {'a:b': '%(a:missing)s/b'}
+        tools.eq_(self.specializer.resolve(values)['a:b'], '%(a:missing)s/b')
+        self.specializer.resolve(values)
+        tools.eq_(self.logger.warn.call_count, 1)
+
+    def test_unreported_resolve(self):
+        """ A problem found while not reporting should still be reported by a later resolve """
+        values = {'a:b': '%(a:missing)s/b'}
+        self.specializer.resolve(values, report=False)
+        assert not self.logger.warn.called
+        self.specializer.resolve(values)
+        tools.eq_(self.logger.warn.call_count, 1)
+
+    def test_cycle(self):
+        """ Values referencing each other should be left as is, and the cycle reported """
+        resolved = self.specializer.resolve({'a:b': '%(a:c)s', 'a:c': '%(a:b)s', 'a:d': 'd'})
+        tools.eq_(resolved['a:b'], '%(a:c)s')
+        tools.eq_(resolved['a:d'], 'd')
+        tools.eq_(self.logger.warn.call_count, 1)
+        assert 'a:b' in self.logger.warn.call_args[0][0]
+
+    def test_resolved_view_is_immutable(self):
+        """ The resolved view should not support assignment """
+        resolved = self.specializer.resolve({'a:b': 'b'})
+
+        def assign():
+            resolved['a:b'] = 'c'
+        tools.assert_raises(TypeError, assign)
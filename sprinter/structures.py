@@ -1,6 +1,7 @@
 """
 A location for various structs/class bases
 """
+import threading
 
 
 class Singleton(type):
@@ -38,3 +39,45 @@ def Enum(*sequential, **named):
     enums['values'] = values
     enums['value'] = reverse
     return type('Enum', (), enums)
+
+
+class FeatureRecorder(object):
+    """
+    Records content added on behalf of a feature. The feature being
+    recorded is set per thread, as features may be synced concurrently.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.content = {}  # feature name -> kind -> list of content
+
+    def start(self, feature_name, buffer=False):
+        """
+        attribute content recorded from this thread to feature_name. If
+        buffer is set, the content is only recorded, to be written later.
+        """
+        self._local.feature_name = feature_name
+        self._local.buffer = buffer
+        with self._lock:
+            self.content[feature_name] = {}
+
+    def stop(self):
+        """ stop attributing content recorded from this thread """
+        self._local.feature_name = None
+        self._local.buffer = False
+
+    def buffering(self):
+        """ return true if the content recorded from this thread is not to be written yet """
+        return getattr(self._local, 'buffer', False)
+
+    def record(self, kind, content):
+        """ record content of a kind, if a feature is being recorded """
+        feature_name = getattr(self._local, 'feature_name', None)
+        if feature_name is not None:
+            with self._lock:
+                self.content[feature_name].setdefault(kind, []).append(content)
+
+    def get(self, feature_name):
+        """ return the content recorded for feature_name """
+        return self.content.get(feature_name, {})
@@ -2,20 +2,41 @@
 A storage area for templates as strings
 """
 
-# utils.sh is the same for every namespace, only sourced once
+# utils.sh is the same for every namespace, only sourced once.
+# it is sourced by every new shell, so it only uses shell builtins:
+# forking subshells or awk/sed here slows down every terminal.
 shell_utils_template = """
+# strip every occurrence of a dir from a ":" separated list
+# __sprinter_strip_path "/foo" "/foo:/bar:/foo" => sp_stripped="/bar"
+__sprinter_strip_path() {
+    sp_stripped=":$2:"
+    while :; do
+        case "$sp_stripped" in
+            *":$1:"*) sp_stripped="${sp_stripped%%:"$1":*}:${sp_stripped#*:"$1":}" ;;
+            *) break ;;
+        esac
+    done
+    sp_stripped="${sp_stripped#:}"
+    sp_stripped="${sp_stripped%:}"
+}
+
 # don't add paths repeatedly to env vars
 # __sprinter_prepend_path "/foo"         => "/foo:$PATH"
 # __sprinter_prepend_path "/foo" MANPATH => "/foo:$MANPATH"
 __sprinter_prepend_path() {
     local sp_dir="$1"
     local sp_var="${2:-PATH}"
-    local sp_list=$(eval echo '$'$sp_var)
+    local sp_list
+    eval "sp_list=\\${$sp_var}"
+    case "$sp_list" in
+        # already at the front, nothing to do
+        "$sp_dir"|"$sp_dir":*) return 0 ;;
+    esac
     if [ -d "$sp_dir" ]; then
-        # strip sp_dir from sp_list
-        sp_list=`echo -n $sp_list | awk -v RS=: -v ORS=: '$0 != "'$sp_dir'"' | sed 's/:$//'`
+        local sp_stripped
+        __sprinter_strip_path "$sp_dir" "$sp_list"
         # :+ syntax avoids dangling ":" in exported var
-        export $sp_var="${sp_dir}${sp_list:+":$sp_list"}"
+        export $sp_var="${sp_dir}${sp_stripped:+":$sp_stripped"}"
     fi
 }
 
@@ -23,14 +44,34 @@ __sprinter_prepend_path() {
 __sprinter_remove_path() {
     local sp_dir="$1"
     local sp_var="${2:-PATH}"
-    local sp_list=$(eval echo '$'$sp_var)
-    # strip sp_dir from sp_list
-    export $sp_var=$(echo -n $sp_list | awk -v RS=: -v ORS=: '$0 != "'$sp_dir'"' | sed -E 's/^:|:$//g')
+    local sp_list
+    local sp_stripped
+    eval "sp_list=\\${$sp_var}"
+    __sprinter_strip_path "$sp_dir" "$sp_list"
+    export $sp_var="$sp_stripped"
 }
 """
 
 source_template = """[ -r "%s" ] && . %s\n"""
 
+# the content of a namespace in the global loaders
+loader_section_template = """# %(namespace)s
+if [ ! -e "%(marker)s" ]; then
+%(content)s
+fi
+"""
+
+# a lazy rc only runs its content on the first use of one of its commands:
+# each command is a stub function, which loads the content in place of
+# the stubs and calls the command again.
+lazy_rc_template = """%(loader)s() {
+    unset -f %(loader)s %(commands)s
+%(content)s
+}
+%(stubs)s"""
+
+lazy_rc_stub_template = """%(command)s() { %(loader)s; %(command)s "$@"; }"""
+
 warning_template = """
 __          __     _____  _   _ _____ _   _  _____
 \ \        / /\   |  __ \| \ | |_   _| \ | |/ ____|
@@ -0,0 +1,55 @@
+from __future__ import unicode_literals
+import os
+import shutil
+import subprocess
+import tempfile
+
+from nose import tools
+
+from sprinter.templates import shell_utils_template
+
+
+class TestShellUtils(object):
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.utils_path = os.path.join(self.temp_dir, "utils.sh")
+        with open(self.utils_path, 'w+') as fh:
+            fh.write(shell_utils_template)
+        self.bin_path = os.path.join(self.temp_dir, "bin")
+        os.makedirs(self.bin_path)
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def source_and_run(self, script, **env):
+        """ source utils.sh in sh with only the given environment, and return the output of script """
+        output = subprocess.check_output(["sh", "-c", ". %s; %s" % (self.utils_path, script)], env=env)
+        return output.decode('utf-8').strip()
+
+    def test_no_external_commands(self):
+        """ utils.sh should only use shell builtins """
+        for command in ('awk', 'sed', '$(', '`'):
+            assert command not in shell_utils_template
+
+    def test_prepend_path(self):
+        """ prepend_path should move the directory to the front, once """
+        tools.eq_(self.source_and_run('__sprinter_prepend_path "$DIR" SP; echo "$SP"',
+                                      DIR=self.bin_path, SP="/a:%s:/b:%s" % (self.bin_path, self.bin_path)),
+                  "%s:/a:/b" % self.bin_path)
+        tools.eq_(self.source_and_run('__sprinter_prepend_path "$DIR" SP; echo "$SP"', DIR=self.bin_path),
+                  self.bin_path)
+
+    def test_prepend_path_at_front(self):
+        """ prepend_path should leave a variable starting with the directory as it is """
+        tools.eq_(self.source_and_run('__sprinter_prepend_path "$DIR" SP; echo "$SP"',
+                                      DIR=self.bin_path, SP="%s:/a:%s" % (self.bin_path, self.bin_path)),
+                  "%s:/a:%s" % (self.bin_path, self.bin_path))
+
+    def test_prepend_missing_path(self):
+        """ prepend_path should not add a directory that does not exist """
+        tools.eq_(self.source_and_run('__sprinter_prepend_path /missing SP; echo "$SP"', SP="/a:/b"), "/a:/b")
+
+    def test_remove_path(self):
+        """ remove_path should remove every occurrence of the directory """
+        tools.eq_(self.source_and_run('__sprinter_remove_path /a SP; echo "$SP"', SP="/a:/b:/a:/c"), "/b:/c")
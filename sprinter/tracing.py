@@ -0,0 +1,97 @@
+"""
+tracing.py records spans of time spent in sprinter: lifecycle phases,
+formula actions, subprocesses, http requests and extractions.
+
+Tracing is disabled by default, in which case a span costs a single
+attribute check. Recorded spans are written as Chrome trace events,
+which can be loaded in chrome://tracing:
+
+with tracing.span('download', category='http', url=url) as args:
+    content = requests.get(url).content
+    args['bytes'] = len(content)
+"""
+from __future__ import unicode_literals
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+
+class Tracer(object):
+    """ Tracer collects the spans recorded while it is enabled """
+
+    enabled = False  # spans are only recorded if the tracer is enabled
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def enable(self):
+        """ start recording spans """
+        self.enabled = True
+
+    def disable(self):
+        """ stop recording spans """
+        self.enabled = False
+
+    def clear(self):
+        """ forget every recorded span """
+        with self._lock:
+            self.events = []
+
+    @contextmanager
+    def span(self, name, category='sprinter', **args):
+        """
+        Record the time spent in the with block. The dictionary of
+        args is yielded, so values known only at the end of the span
+        (byte counts, return codes) can be added to it.
+        """
+        if not self.enabled:
+            yield args
+            return
+        start = time.time()
+        try:
+            yield args
+        finally:
+            end = time.time()
+            event = {'name': name,
+                     'cat': category,
+                     'ph': 'X',
+                     'ts': int(start * 1000000),
+                     'dur': int((end - start) * 1000000),
+                     'pid': os.getpid(),
+                     'tid': threading.current_thread().ident,
+                     'args': args}
+            with self._lock:
+                self.events.append(event)
+
+    def write(self, path):
+        """ write the recorded spans to path, as chrome trace event json """
+        with self._lock:
+            events = sorted(self.events, key=lambda e: e['ts'])
+        with open(path, 'w+') as fh:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fh,
+                      default=str)
+
+
+TRACER = Tracer()
+
+
+def span(name, category='sprinter', **args):
+    """ Record a span with the global tracer """
+    return TRACER.span(name, category=category, **args)
+
+
+def traced(name, category='sprinter'):
+    """ Decorator to record a span around every call of a function """
+
+    def decorator(f):
+
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            with TRACER.span(name, category=category):
+                return f(*args, **kwargs)
+        return wrapped
+    return decorator
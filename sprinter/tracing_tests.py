@@ -0,0 +1,71 @@
+from __future__ import unicode_literals
+import json
+import os
+import shutil
+import tempfile
+
+from nose import tools
+
+from sprinter.tracing import Tracer, TRACER, traced
+
+
+class TestTracing(object):
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.tracer = Tracer()
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+        TRACER.disable()
+        TRACER.clear()
+
+    def test_disabled_tracer_records_nothing(self):
+        """ A disabled tracer should not record spans """
+        with self.tracer.span('test') as args:
+            args['bytes'] = 10
+        tools.eq_(self.tracer.events, [])
+
+    def test_span(self):
+        """ A span should record its name, duration, and args """
+        self.tracer.enable()
+        with self.tracer.span('download', category='http', url='http://example.com') as args:
+            args['bytes'] = 10
+        tools.eq_(len(self.tracer.events), 1)
+        event = self.tracer.events[0]
+        tools.eq_(event['name'], 'download')
+        tools.eq_(event['cat'], 'http')
+        tools.eq_(event['ph'], 'X')
+        tools.eq_(event['args'], {'url': 'http://example.com', 'bytes': 10})
+        assert event['dur'] >= 0
+
+    def test_span_records_exceptions(self):
+        """ A span should be recorded even if the block raises """
+        self.tracer.enable()
+        try:
+            with self.tracer.span('failure'):
+                raise ValueError("failure")
+        except ValueError:
+            pass
+        tools.eq_([e['name'] for e in self.tracer.events], ['failure'])
+
+    def test_traced(self):
+        """ The traced decorator should record a span with the global tracer """
+        TRACER.enable()
+
+        @traced('decorated')
+        def decorated():
+            return 1
+        tools.eq_(decorated(), 1)
+        tools.eq_([e['name'] for e in TRACER.events], ['decorated'])
+
+    def test_write(self):
+        """ The written trace should be chrome trace event json """
+        self.tracer.enable()
+        with self.tracer.span('first'):
+            pass
+        path = os.path.join(self.temp_dir, 'trace.json')
+        self.tracer.write(path)
+        with open(path) as fh:
+            trace = json.load(fh)
+        tools.eq_([e['name'] for e in trace['traceEvents']], ['first'])
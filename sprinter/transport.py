@@ -0,0 +1,118 @@
+"""
+transport.py holds the http session shared by all of sprinter's
+network traffic: manifests, downloads and formula requests.
+
+Connections are pooled per host and kept alive between requests, so
+only the first request to a host pays for the tcp and tls handshakes.
+Every request has a connect and a read timeout, and transient errors
+(refused connections, timeouts, and 5xx responses) are retried with an
+exponential backoff. Like the requests sprinter made before, netrc
+files and proxy environment variables are ignored.
+
+requests is only imported when the first session is built, so commands
+that never touch the network do not pay for importing it. Timeout tuples
+and the Retry of its bundled urllib3 require requests 2.4 or later.
+"""
+from __future__ import unicode_literals
+import threading
+
+CONNECT_TIMEOUT = 10  # seconds to wait for a connection
+READ_TIMEOUT = 60  # seconds to wait between bytes of a response
+RETRIES = 3  # the number of times a transient error is retried
+BACKOFF_FACTOR = 0.5  # retries wait 0.5, 1, 2... seconds
+POOL_SIZE = 10  # the connections kept alive per host
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class Transport(object):
+    """ A pooled http session, with timeouts and retries """
+
+    connect_timeout = CONNECT_TIMEOUT  # seconds to wait for a connection
+    read_timeout = READ_TIMEOUT  # seconds to wait between bytes of a response
+    retries = RETRIES  # the number of times a transient error is retried
+    backoff_factor = BACKOFF_FACTOR  # the backoff between retries
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRIES, backoff_factor=BACKOFF_FACTOR, pool_size=POOL_SIZE):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def timeout(self):
+        """ Return the (connect, read) timeout passed to every request """
+        return (self.connect_timeout, self.read_timeout)
+
+    @property
+    def session(self):
+        """ Return the session, creating it on first use """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self.__build_session()
+        return self._session
+
+    def request(self, method, url, **kwargs):
+        """ Perform a request with the shared session """
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        """ close every pooled connection """
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def __build_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        # this removes netrc checking
+        session.trust_env = False
+        adapter = HTTPAdapter(pool_connections=self.pool_size,
+                              pool_maxsize=self.pool_size,
+                              max_retries=self.__retry())
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def __retry(self):
+        try:
+            from urllib3.util.retry import Retry
+        except ImportError:
+            from requests.packages.urllib3.util.retry import Retry
+        kwargs = {'total': self.retries,
+                  'connect': self.retries,
+                  'read': self.retries,
+                  'status': self.retries,
+                  'backoff_factor': self.backoff_factor,
+                  'status_forcelist': RETRY_STATUSES,
+                  # the last response is returned, so callers still see its status code
+                  'raise_on_status': False}
+        try:
+            return Retry(**kwargs)
+        except TypeError:
+            # older versions of urllib3 always return the last response
+            del kwargs['raise_on_status'], kwargs['status']
+            return Retry(**kwargs)
+
+
+TRANSPORT = Transport()
+
+
+def configure(**kwargs):
+    """ Replace the shared transport with one using the timeouts and retries passed """
+    global TRANSPORT
+    TRANSPORT.close()
+    TRANSPORT = Transport(**kwargs)
+    return TRANSPORT
+
+
+def request(method, url, **kwargs):
+    """ Perform a request with the shared transport """
+    return TRANSPORT.request(method, url, **kwargs)
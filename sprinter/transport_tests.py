@@ -0,0 +1,49 @@
+from __future__ import unicode_literals
+import httpretty
+from mock import Mock
+from nose import tools
+
+from sprinter.transport import Transport, RETRY_STATUSES
+
+TEST_URI = "http://testme.com/test"
+
+
+class TestTransport(object):
+
+    def setup(self):
+        self.transport = Transport(connect_timeout=2, read_timeout=5, retries=2, backoff_factor=0)
+
+    def teardown(self):
+        self.transport.close()
+
+    def test_session_is_shared(self):
+        """ Every request should use the same session """
+        tools.eq_(self.transport.session, self.transport.session)
+
+    def test_session_ignores_environment(self):
+        """ The session should not read netrc files or proxy variables """
+        assert not self.transport.session.trust_env
+
+    def test_retries(self):
+        """ Transient errors should be retried with a backoff """
+        retries = self.transport.session.get_adapter(TEST_URI).max_retries
+        tools.eq_(retries.total, 2)
+        tools.eq_(tuple(retries.status_forcelist), RETRY_STATUSES)
+
+    def test_default_timeout(self):
+        """ A request without a timeout should use the transport's timeouts """
+        self.transport._session = Mock()
+        self.transport.request('get', TEST_URI)
+        self.transport._session.request.assert_called_with('get', TEST_URI, timeout=(2, 5))
+        self.transport.request('get', TEST_URI, timeout=1)
+        self.transport._session.request.assert_called_with('get', TEST_URI, timeout=1)
+
+    @httpretty.activate
+    def test_retry_server_error(self):
+        """ A 5xx response should be retried """
+        httpretty.register_uri(httpretty.GET, TEST_URI,
+                               responses=[httpretty.Response(body="", status=503),
+                                          httpretty.Response(body="ok", status=200)])
+        response = self.transport.request('get', TEST_URI)
+        tools.eq_(response.status_code, 200)
+        tools.eq_(response.text, "ok")